@@ -0,0 +1,52 @@
+"""
+Microbenchmark các hash suite: throughput hash chunk và dựng cây Merkle
+
+    python src/bench_hash.py [--chunks 64] [--leaves 200000]
+"""
+import os
+import time
+import argparse
+
+from utils.constants import CHUNK_SIZE
+from utils.hash import HASH_SUITES
+from core.backup import MerkleTree
+
+
+def bench_chunk_hash(suite, chunks):
+    """MiB/s khi hash các chunk CHUNK_SIZE"""
+    start = time.perf_counter()
+    for data in chunks:
+        suite.chunk_hash(data)
+    elapsed = time.perf_counter() - start
+    return len(chunks) * CHUNK_SIZE / (1024 * 1024) / elapsed
+
+
+def bench_merkle(suite, leaves):
+    """Số leaf/s khi dựng cây Merkle (gồm cả chuyển leaf sang dạng node của suite)"""
+    start = time.perf_counter()
+    merkle = MerkleTree(suite)
+    for leaf in leaves:
+        merkle.add_leaf(leaf)
+    merkle.compute_root()
+    elapsed = time.perf_counter() - start
+    return len(leaves) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hash suite throughput benchmark")
+    parser.add_argument("--chunks", type=int, default=64)
+    parser.add_argument("--leaves", type=int, default=200000)
+    args = parser.parse_args()
+
+    chunks = [os.urandom(CHUNK_SIZE) for _ in range(args.chunks)]
+    leaves = [os.urandom(32).hex() for _ in range(args.leaves)]
+
+    print(f"{'suite':<18} {'chunk hash (MiB/s)':>20} {'merkle (leaves/s)':>20}")
+    for name, suite in sorted(HASH_SUITES.items()):
+        chunk_rate = bench_chunk_hash(suite, chunks)
+        merkle_rate = bench_merkle(suite, leaves)
+        print(f"{name:<18} {chunk_rate:>20.1f} {merkle_rate:>20.0f}")
+
+
+if __name__ == "__main__":
+    main()
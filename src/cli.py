@@ -1,119 +1,247 @@
 import argparse
 import sys
 
-from utils import STATUS_DENY, STATUS_OK, STATUS_FAIL
-from core import backup, verify, restore, list_snapshots, cleanup_incomplete_snapshots
+from utils import STATUS_DENY, STATUS_OK, STATUS_FAIL, DEFAULT_HASH_SUITE, HASH_SUITES
+from core import backup, verify, restore, list_snapshots, cleanup_incomplete_snapshots, diff_snapshots
+from core import export_snapshot, import_snapshot, ls_snapshot, cat_snapshot_file, scrub, tier
+from core import purge, delete_snapshot
 from security import get_current_user, Policy, AuditLogger
+from storage import open_backend, ThrottledBackend
+from utils.throttle import Throttle, MIB
 
-def audit_verify_command(audit_log_path):
+def audit_verify_command(audit_log_path, full=False, jobs=1):
     """
     Kiểm tra toàn vẹn của audit log chain
+    Mặc định tiếp tục từ checkpoint "verified" cuối trong audit_roots.log, chỉ đọc các entry mới;
+    full=True kiểm tra lại từ genesis. jobs > 1: kiểm tra hash từng entry song song theo vùng byte,
+    sau đó duyệt liên kết chain một lượt
     """
     from utils.hash import sha256_str
     from utils.constants import ZERO_HASH
+    from security.audit import find_audit_roots, entry_hash_at, split_ranges, check_entry_hashes
+    from concurrent.futures import ProcessPoolExecutor
     import os
     
     try:
-        with open(audit_log_path, 'r') as f:
-            lines = f.readlines()
+        size = os.path.getsize(audit_log_path)
     except FileNotFoundError:
         print("Audit log not found")
         return STATUS_FAIL
     
-    if not lines:
+    if size == 0:
         print("Empty audit log (valid)")
         return STATUS_OK
     
-    prev_hash = ZERO_HASH
+    audit_roots_path = os.path.join(os.path.dirname(audit_log_path), "audit_roots.log")
+    last_root, checkpoint = find_audit_roots(audit_roots_path)
     
-    for i, line in enumerate(lines):
-        line = line.strip()
-        if not line:
-            continue
-        
-        parts = line.split()
-        if len(parts) < 7:
-            print(f"AUDIT CORRUPTED: Line {i+1} - Invalid format")
+    # Điểm bắt đầu: genesis hoặc checkpoint đã verify (phải khớp entry kết thúc tại offset)
+    start, entries, prev_hash = 0, 0, ZERO_HASH
+    if checkpoint is not None and not full:
+        cp_count, cp_hash, cp_offset, _ = checkpoint
+        if cp_offset > size or entry_hash_at(audit_log_path, cp_offset) != cp_hash:
+            print("AUDIT CORRUPTED: Checkpoint mismatch")
+            print(f"  Entry {cp_count} at offset {cp_offset} does not match hash {cp_hash}")
             return STATUS_FAIL
+        start, entries, prev_hash = cp_offset, cp_count, cp_hash
+    
+    # Pha song song (tuỳ chọn): chỉ kiểm tra hash từng entry
+    bad_offsets = None
+    if jobs > 1 and size > start:
+        bad_offsets = set()
+        ranges = split_ranges(audit_log_path, start, size, jobs)
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = executor.map(check_entry_hashes, [audit_log_path] * len(ranges),
+                                   [r[0] for r in ranges], [r[1] for r in ranges])
+            for bad in results:
+                bad_offsets.update(bad)
+    
+    # Duyệt chain một lượt, streaming theo dòng
+    offset = start
+    line_no = entries
+    with open(audit_log_path, 'rb') as f:
+        f.seek(start)
+        for raw in f:
+            line_start = offset
+            offset += len(raw)
+            line_no += 1
+            
+            # Dòng đã qua kiểm tra song song: chỉ cần so liên kết, lấy hash theo vị trí cố định
+            # Dòng append sau khi lấy size (ngoài vùng song song) luôn đi đường kiểm tra đầy đủ
+            if bad_offsets is not None and line_start < size and line_start not in bad_offsets:
+                if not raw.strip():
+                    continue
+                entry_hash = raw[:64].decode("ascii")
+                if raw[65:129].decode("ascii") != prev_hash:
+                    print(f"AUDIT CORRUPTED: Line {line_no} - Chain broken")
+                    print(f"  Expected prev: {prev_hash}")
+                    print(f"  Got prev: {raw[65:129].decode('ascii')}")
+                    return STATUS_FAIL
+                prev_hash = entry_hash
+                entries += 1
+                continue
+            
+            line = raw.decode("utf-8", "replace").strip()
+            if not line:
+                continue
+            
+            parts = line.split()
+            if len(parts) < 7:
+                print(f"AUDIT CORRUPTED: Line {line_no} - Invalid format")
+                return STATUS_FAIL
+            
+            entry_hash = parts[0]
+            prev_in_entry = parts[1]
+            
+            # Kiểm tra chain linking
+            if prev_hash != prev_in_entry:
+                print(f"AUDIT CORRUPTED: Line {line_no} - Chain broken")
+                print(f"  Expected prev: {prev_hash}")
+                print(f"  Got prev: {prev_in_entry}")
+                return STATUS_FAIL
+            
+            # Kiểm tra entry hash
+            computed_hash = sha256_str(' '.join(parts[1:]))
+            if computed_hash != entry_hash:
+                print(f"AUDIT CORRUPTED: Line {line_no} - Hash mismatch")
+                print(f"  Expected hash: {entry_hash}")
+                print(f"  Computed hash: {computed_hash}")
+                return STATUS_FAIL
+            
+            prev_hash = entry_hash
+            entries += 1
+    
+    # Kiểm tra truncation bằng audit_roots.log
+    expected = last_root or checkpoint
+    if expected is not None:
+        expected_count, expected_hash = expected[0], expected[1]
         
-        entry_hash = parts[0]
-        prev_in_entry = parts[1]
-        
-        # Kiểm tra chain linking
-        if prev_hash != prev_in_entry:
-            print(f"AUDIT CORRUPTED: Line {i+1} - Chain broken")
-            print(f"  Expected prev: {prev_hash}")
-            print(f"  Got prev: {prev_in_entry}")
+        if entries < expected_count:
+            print(f"AUDIT CORRUPTED: Truncation detected")
+            print(f"  Expected {expected_count} entries, found {entries}")
             return STATUS_FAIL
         
-        # Kiểm tra entry hash
-        raw = ' '.join(parts[1:])
-        computed_hash = sha256_str(raw)
-        
-        if computed_hash != entry_hash:
-            print(f"AUDIT CORRUPTED: Line {i+1} - Hash mismatch")
-            print(f"  Expected hash: {entry_hash}")
-            print(f"  Computed hash: {computed_hash}")
+        if entries == expected_count and prev_hash != expected_hash:
+            print(f"AUDIT CORRUPTED: Last entry hash mismatch")
+            print(f"  Expected: {expected_hash}")
+            print(f"  Got: {prev_hash}")
             return STATUS_FAIL
-        
-        prev_hash = entry_hash
     
-    # Kiểm tra truncation bằng audit_roots.log
-    audit_roots_path = os.path.join(os.path.dirname(audit_log_path), "audit_roots.log")
-    try:
-        with open(audit_roots_path, 'r') as f:
-            roots = f.readlines()
-        
-        if roots:
-            last_root = roots[-1].strip().split()
-            if len(last_root) >= 2:
-                expected_count = int(last_root[0])
-                expected_hash = last_root[1]
-                current_count = len([l for l in lines if l.strip()])
-                
-                if current_count < expected_count:
-                    print(f"AUDIT CORRUPTED: Truncation detected")
-                    print(f"  Expected {expected_count} entries, found {current_count}")
-                    return STATUS_FAIL
-                
-                if current_count == expected_count and prev_hash != expected_hash:
-                    print(f"AUDIT CORRUPTED: Last entry hash mismatch")
-                    print(f"  Expected: {expected_hash}")
-                    print(f"  Got: {prev_hash}")
-                    return STATUS_FAIL
-    except FileNotFoundError:
-        pass  # audit_roots.log chưa tồn tại, bỏ qua kiểm tra truncation
+    # Lưu checkpoint để lần sau chỉ kiểm tra các entry mới
+    if offset > start:
+        AuditLogger(audit_log_path).save_checkpoint(entries, prev_hash, offset)
     
-    print(f"✓ Audit log valid ({len(lines)} entries)")
+    if start > 0:
+        print(f"Resumed from checkpoint at entry {checkpoint[0]} ({entries - checkpoint[0]} new entries checked)")
+    print(f"✓ Audit log valid ({entries} entries)")
     return STATUS_OK
 
+def make_throttle(args, policy, rate=None):
+    """
+    Dựng Throttle cho lệnh từ policy.yaml (mục io) và cờ --io-* (cờ ghi đè policy)
+    Trả về None nếu không có giới hạn nào
+    """
+    limits = policy.io_limits(args.command)
+    rate = rate or args.io_rate or limits.get("rate_mib") or 0
+    iops = args.io_iops or limits.get("iops") or 0
+    adaptive = args.io_adaptive or bool(limits.get("adaptive"))
+    idle = args.io_idle or bool(limits.get("idle"))
+    if not (rate or iops or adaptive or idle):
+        return None
+    return Throttle(int(rate * MIB) or None, iops or None, adaptive, idle)
+
 def main():
     parser = argparse.ArgumentParser()
+    # Object store cho chunk/manifest (mặc định: store/ cục bộ, hoặc $LABCLI_STORE_URL)
+    parser.add_argument("--store-url")
     sub = parser.add_subparsers(dest="command")
 
-    b = sub.add_parser("backup")
-    b.add_argument("source")
+    # Cờ giới hạn I/O dùng chung (mặc định lấy từ mục io trong policy.yaml)
+    io = argparse.ArgumentParser(add_help=False)
+    io.add_argument("--io-rate", type=float, help="I/O rate limit in MiB/s")
+    io.add_argument("--io-iops", type=float, help="I/O operations per second limit")
+    io.add_argument("--io-adaptive", action="store_true", help="back off when read latency rises")
+    io.add_argument("--io-idle", action="store_true", help="run with idle CPU/I/O priority")
+
+    b = sub.add_parser("backup", parents=[io])
+    b.add_argument("source", nargs="?")
     b.add_argument("--label", required=True)
+    b.add_argument("--stdin", action="store_true")
+    b.add_argument("--name", default="stdin")
+    b.add_argument("--hash", choices=sorted(HASH_SUITES), default=DEFAULT_HASH_SUITE)
+    b.add_argument("--delta", action="store_true")
 
-    v = sub.add_parser("verify")
+    v = sub.add_parser("verify", parents=[io])
     v.add_argument("snapshot")
 
-    r = sub.add_parser("restore")
+    r = sub.add_parser("restore", parents=[io])
     r.add_argument("snapshot")
     r.add_argument("target")
+    r.add_argument("--name")
+    
+    d = sub.add_parser("diff")
+    d.add_argument("snapshot_a")
+    d.add_argument("snapshot_b")
+    d.add_argument("--ranges", action="store_true")
+    
+    e = sub.add_parser("export")
+    e.add_argument("snapshot")
+    e.add_argument("-o", "--output", default="-")
+    
+    i = sub.add_parser("import")
+    i.add_argument("input", nargs="?", default="-")
+    
+    ls = sub.add_parser("ls")
+    ls.add_argument("snapshot")
+    ls.add_argument("prefix", nargs="?", default="")
+    
+    c = sub.add_parser("cat")
+    c.add_argument("snapshot")
+    c.add_argument("path")
+    
+    sc = sub.add_parser("scrub", parents=[io])
+    sc.add_argument("--rate", type=float, help="I/O rate limit in MiB/s")
+    sc.add_argument("--time-limit", type=float, help="pause after this many seconds")
+    sc.add_argument("--restart", action="store_true")
+    
+    t = sub.add_parser("tier")
+    t.add_argument("--cold-dir", help="cold tier directory (saved for the store)")
+    t.add_argument("--keep-recent", type=int, default=2, help="newest snapshots kept on the hot tier")
+    t.add_argument("--window-days", type=int, default=30, help="access statistics window")
+    t.add_argument("--promote-reads", type=int, default=2,
+                   help="restores/verifies within the window that keep a snapshot hot")
     
     # Lệnh audit-verify
-    sub.add_parser("audit-verify")
+    av = sub.add_parser("audit-verify")
+    av.add_argument("--full", action="store_true")
+    av.add_argument("--jobs", type=int, default=1)
     
     # Các lệnh phụ khác để test policy
     sub.add_parser("init")
-    sub.add_parser("purge")
     sub.add_parser("cleanup")
+    
+    # Retention: xoá snapshot theo quy tắc giữ lại, một lượt prune
+    pg = sub.add_parser("purge")
+    pg.add_argument("--keep-last", type=int, default=0)
+    pg.add_argument("--keep-hourly", type=int, default=0)
+    pg.add_argument("--keep-daily", type=int, default=0)
+    pg.add_argument("--keep-weekly", type=int, default=0)
+    pg.add_argument("--keep-monthly", type=int, default=0)
+    pg.add_argument("--dry-run", action="store_true", help="only report what would be deleted")
     ds = sub.add_parser("delete-snapshot")
     ds.add_argument("snapshot")
+    ds.add_argument("--dry-run", action="store_true", help="only report what would be deleted")
     sub.add_parser("list-snapshots")
 
     args = parser.parse_args()
+    if args.command == "backup" and args.source is None and not args.stdin:
+        parser.error("backup: source is required (use '-' or --stdin to read from stdin)")
+
+    # Lệnh stream dữ liệu ra stdout: giữ stdout cho dữ liệu, mọi thông báo chuyển sang stderr
+    data_stdout = sys.stdout.buffer
+    if ((args.command == "export" and args.output == "-") or args.command == "cat"
+            or (args.command == "restore" and args.target == "-")):
+        sys.stdout = sys.stderr
 
     # Xử lý audit-verify đặc biệt (không cần policy check cho lệnh này trong một số trường hợp)
     if args.command == "audit-verify":
@@ -131,7 +259,7 @@ def main():
             return
         
         # Chạy audit-verify
-        status = audit_verify_command("store/audit.log")
+        status = audit_verify_command("store/audit.log", args.full, args.jobs)
         audit.log(user, args.command, args_str, status)
         return
 
@@ -143,13 +271,35 @@ def main():
 
     # Tạo args_str từ command arguments
     if args.command == "backup":
-        args_str = f"{args.source} {args.label}"
+        if args.stdin or args.source == "-":
+            args_str = f"- {args.name} {args.label}"
+        else:
+            args_str = f"{args.source} {args.label}"
     elif args.command == "verify":
         args_str = args.snapshot
     elif args.command == "restore":
         args_str = f"{args.snapshot} {args.target}"
     elif args.command == "delete-snapshot":
-        args_str = args.snapshot
+        args_str = f"{args.snapshot} dry_run={args.dry_run}"
+    elif args.command == "purge":
+        args_str = (f"keep_last={args.keep_last} keep_hourly={args.keep_hourly} "
+                    f"keep_daily={args.keep_daily} keep_weekly={args.keep_weekly} "
+                    f"keep_monthly={args.keep_monthly} dry_run={args.dry_run}")
+    elif args.command == "diff":
+        args_str = f"{args.snapshot_a} {args.snapshot_b}"
+    elif args.command == "export":
+        args_str = f"{args.snapshot} {args.output}"
+    elif args.command == "import":
+        args_str = args.input
+    elif args.command == "ls":
+        args_str = f"{args.snapshot} {args.prefix}"
+    elif args.command == "cat":
+        args_str = f"{args.snapshot} {args.path}"
+    elif args.command == "scrub":
+        args_str = f"rate={args.rate} time_limit={args.time_limit} restart={args.restart}"
+    elif args.command == "tier":
+        args_str = (f"cold_dir={args.cold_dir} keep_recent={args.keep_recent} "
+                    f"window_days={args.window_days} promote_reads={args.promote_reads}")
     else:
         args_str = args.command
 
@@ -159,29 +309,74 @@ def main():
         print("DENY by policy")
         return
 
+    # Backend lưu chunk/manifest cho backup/verify/restore
+    try:
+        backend = open_backend("store", args.store_url)
+    except ValueError as e:
+        print("Storage error:", e)
+        audit.log(user, args.command, args_str, STATUS_FAIL)
+        return
+
+    # Giới hạn I/O: ghi/đọc store qua backend bọc throttle, backup còn giới hạn đọc nguồn
+    throttle = None
+    if args.command in ("backup", "verify", "restore", "scrub"):
+        throttle = make_throttle(args, policy, args.rate if args.command == "scrub" else None)
+        if throttle is not None and args.command != "scrub":
+            backend = ThrottledBackend(backend, throttle)
+
     # Execute command
     if args.command == "backup":
-        status = backup(args.source, "store", args.label)
+        if args.stdin or args.source == "-":
+            status = backup("-", "store", args.label, stream=sys.stdin.buffer, stream_name=args.name,
+                            backend=backend, hash_suite=args.hash, delta=args.delta, throttle=throttle)
+        else:
+            status = backup(args.source, "store", args.label, backend=backend, hash_suite=args.hash,
+                            delta=args.delta, throttle=throttle)
     elif args.command == "verify":
-        status = verify(args.snapshot, "store")
+        status = verify(args.snapshot, "store", backend)
     elif args.command == "restore":
-        status = restore(args.snapshot, "store", args.target)
+        if args.target == "-":
+            status = restore(args.snapshot, "store", None, out=data_stdout, file_path=args.name,
+                             backend=backend)
+        else:
+            status = restore(args.snapshot, "store", args.target, backend=backend)
+    elif args.command == "diff":
+        status = diff_snapshots(args.snapshot_a, args.snapshot_b, "store", args.ranges)
+    elif args.command == "export":
+        if args.output == "-":
+            status = export_snapshot(args.snapshot, "store", data_stdout)
+        else:
+            with open(args.output, "wb", buffering=4 * 1024 * 1024) as out:
+                status = export_snapshot(args.snapshot, "store", out)
+    elif args.command == "import":
+        if args.input == "-":
+            status = import_snapshot("store", sys.stdin.buffer)
+        else:
+            with open(args.input, "rb", buffering=4 * 1024 * 1024) as src:
+                status = import_snapshot("store", src)
+    elif args.command == "ls":
+        status = ls_snapshot(args.snapshot, "store", args.prefix)
+    elif args.command == "cat":
+        status = cat_snapshot_file(args.snapshot, "store", args.path, data_stdout)
+    elif args.command == "scrub":
+        status = scrub("store", time_limit=args.time_limit, restart=args.restart, throttle=throttle)
+    elif args.command == "tier":
+        status = tier("store", args.cold_dir, args.keep_recent, args.window_days, args.promote_reads)
     elif args.command == "init":
         print("Init command executed")
         status = STATUS_OK
     elif args.command == "purge":
-        print("Purge command executed")
-        status = STATUS_OK
+        status = purge("store", args.keep_last, args.keep_hourly, args.keep_daily,
+                       args.keep_weekly, args.keep_monthly, args.dry_run)
     elif args.command == "cleanup":
-        cleaned = cleanup_incomplete_snapshots("store")
+        cleaned = cleanup_incomplete_snapshots("store", backend)
         if cleaned > 0:
             print(f"Cleaned up {cleaned} incomplete snapshot(s)")
         else:
             print("No incomplete snapshots found")
         status = STATUS_OK
     elif args.command == "delete-snapshot":
-        print(f"Delete snapshot: {args.snapshot}")
-        status = STATUS_OK
+        status = delete_snapshot("store", args.snapshot, args.dry_run)
     elif args.command == "list-snapshots":
         snapshots = list_snapshots("store")
         if snapshots:
@@ -198,6 +393,9 @@ def main():
         print(f"Unknown command: {args.command}")
         return
 
+    if throttle is not None and args.command != "scrub":
+        print(throttle.report())
+    backend.close()
     audit.log(user, args.command, args_str, status)
 
 if __name__ == "__main__":
@@ -1,8 +1,16 @@
 from .backup import backup, list_snapshots, cleanup_incomplete_snapshots
 from .verify import verify
 from .restore import restore
+from .diff import diff_snapshots
+from .archive import export_snapshot, import_snapshot
+from .reader import SnapshotReader, ls_snapshot, cat_snapshot_file
+from .scrub import scrub
+from .tiering import tier
+from .retention import purge, delete_snapshot, prune, select_snapshots
 from .wal import WAL
 from .rollback import RollbackProtector
+from .lock import StoreLock
+from .chunk_index import ChunkIndex
 
 __all__ = [
     "backup",
@@ -10,6 +18,20 @@ __all__ = [
     "cleanup_incomplete_snapshots",
     "verify",
     "restore",
+    "diff_snapshots",
+    "export_snapshot",
+    "import_snapshot",
+    "SnapshotReader",
+    "ls_snapshot",
+    "cat_snapshot_file",
+    "scrub",
+    "tier",
+    "purge",
+    "delete_snapshot",
+    "prune",
+    "select_snapshots",
     "WAL",
     "RollbackProtector",
+    "StoreLock",
+    "ChunkIndex",
 ]
@@ -0,0 +1,254 @@
+import os
+import time
+import struct
+from utils.constants import STATUS_OK, STATUS_FAIL
+from utils.fs import ensure_dir, remove_dir
+from utils.hash import get_hash_suite
+from core.wal import WAL
+from core.lock import StoreLock
+from core.chunk_index import ChunkIndex
+from core.manifest import iter_manifest_files, iter_file_chunks, is_valid_snapshot_id, normalize_file_path
+from core.backup import MerkleTree, cleanup_incomplete_snapshots, commit_snapshot, link_known_chunk
+from storage import read_chunk_file
+
+# Định dạng archive (tự mô tả, đọc/ghi tuần tự):
+#   MAGIC
+#   "M" len  <manifest.json>
+#   "C" len  <digest 32 byte> <dữ liệu chunk>      (theo thứ tự xuất hiện trong manifest)
+#   "E" len  <merkle root (ascii)>
+ARCHIVE_MAGIC = b"LCARC001"
+RECORD_HEADER = struct.Struct("<cQ")
+REC_MANIFEST = b"M"
+REC_CHUNK = b"C"
+REC_END = b"E"
+
+# Kích thước block cho I/O tuần tự
+IO_BLOCK = 4 * 1024 * 1024
+
+
+def _read_exact(stream, n):
+    """Đọc đúng n byte (stdin/pipe có thể trả về ít hơn)"""
+    parts = []
+    while n > 0:
+        data = stream.read(n)
+        if not data:
+            raise ValueError("Unexpected end of archive")
+        parts.append(data)
+        n -= len(data)
+    return b"".join(parts)
+
+
+def _copy_exact(src, dst, n, hasher=None):
+    """Copy đúng n byte theo block, hash on-the-fly nếu có hasher; dst=None để bỏ qua dữ liệu"""
+    while n > 0:
+        data = src.read(min(n, IO_BLOCK))
+        if not data:
+            raise ValueError("Unexpected end of archive")
+        if hasher is not None:
+            hasher.update(data)
+        if dst is not None:
+            dst.write(data)
+        n -= len(data)
+
+
+def export_snapshot(snapshot_id, store_path, out):
+    """
+    Stream snapshot ra một archive duy nhất (file hoặc stdout)
+    Bộ nhớ không phụ thuộc kích thước dữ liệu: manifest và chunk được copy theo block,
+    chỉ giữ set hash các chunk đã ghi để không ghi trùng
+    """
+    try:
+        wal = WAL(os.path.join(store_path, "wal.log"))
+        snap_dir = os.path.join(store_path, snapshot_id)
+        manifest_path = os.path.join(snap_dir, "manifest.json")
+        chunks_dir = os.path.join(snap_dir, "chunks")
+
+        if not wal.is_committed(snapshot_id) or not os.path.exists(manifest_path):
+            print(f"Snapshot not found or not committed: {snapshot_id}")
+            return STATUS_FAIL
+
+        out.write(ARCHIVE_MAGIC)
+
+        with open(manifest_path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            out.write(RECORD_HEADER.pack(REC_MANIFEST, size))
+            _copy_exact(f, out, size)
+
+        meta = {}
+        exported = set()
+        base_cache = {}
+        total_bytes = 0
+        for file_info in iter_manifest_files(manifest_path, meta):
+            for chunk_hash, _, _, is_zero in iter_file_chunks(meta, file_info):
+                if is_zero or chunk_hash in exported:
+                    continue
+                exported.add(chunk_hash)
+
+                if os.path.exists(os.path.join(chunks_dir, f"{chunk_hash}.chunk")):
+                    with open(os.path.join(chunks_dir, f"{chunk_hash}.chunk"), "rb") as f:
+                        size = os.fstat(f.fileno()).st_size
+                        out.write(RECORD_HEADER.pack(REC_CHUNK, size))
+                        out.write(bytes.fromhex(chunk_hash))
+                        _copy_exact(f, out, size)
+                else:
+                    # Chunk delta: archive luôn mang nội dung thật
+                    data = read_chunk_file(chunks_dir, chunk_hash, base_cache)
+                    size = len(data)
+                    out.write(RECORD_HEADER.pack(REC_CHUNK, size))
+                    out.write(bytes.fromhex(chunk_hash))
+                    out.write(data)
+                total_bytes += size
+
+        root = meta.get("merkle_root", "").encode("ascii")
+        out.write(RECORD_HEADER.pack(REC_END, len(root)))
+        out.write(root)
+        out.flush()
+
+        print(f"Export completed: {snapshot_id}")
+        print(f"Chunks exported: {len(exported)} ({total_bytes} bytes)")
+        return STATUS_OK
+
+    except Exception as e:
+        print("Export error:", e)
+        return STATUS_FAIL
+
+
+def import_snapshot(store_path, src):
+    """
+    Nạp archive vào store, hash từng chunk on-the-fly khi ghi
+    Chunk đã có trong store (tra qua chỉ mục) được hard link, dữ liệu trong archive bị bỏ qua
+    Snapshot chỉ được commit (WAL + roots.log) sau khi mọi chunk và Merkle root đều khớp
+    """
+    store_lock = StoreLock(store_path)
+    lock_ids = []
+    temp_dir = None
+    chunk_index = None
+
+    try:
+        cleanup_incomplete_snapshots(store_path)
+        ensure_dir(store_path)
+
+        if _read_exact(src, len(ARCHIVE_MAGIC)) != ARCHIVE_MAGIC:
+            print("Invalid archive: bad magic")
+            return STATUS_FAIL
+
+        # Nhận manifest vào temp directory tạm (chưa biết snapshot_id)
+        staging_id = f"import-{int(time.time() * 1000)}-{os.getpid()}"
+        lock_ids.append((staging_id, store_lock.acquire_snapshot(staging_id)))
+        temp_dir = os.path.join(store_path, f".tmp_{staging_id}")
+        ensure_dir(os.path.join(temp_dir, "chunks"))
+
+        rec_type, length = RECORD_HEADER.unpack(_read_exact(src, RECORD_HEADER.size))
+        if rec_type != REC_MANIFEST:
+            print("Invalid archive: manifest record missing")
+            return STATUS_FAIL
+        manifest_path = os.path.join(temp_dir, "manifest.json")
+        with open(manifest_path, "wb", buffering=IO_BLOCK) as f:
+            _copy_exact(src, f, length)
+
+        # Một lượt streaming qua manifest: tập chunk cần nhận + Merkle root
+        # hash_suite đứng trước "files" trong manifest -> biết suite trước khi duyệt chunk
+        meta = {}
+        needed = set()
+        merkle = None
+        for file_info in iter_manifest_files(manifest_path, meta):
+            try:
+                normalize_file_path(file_info.get("path"))
+            except ValueError as e:
+                print(f"Invalid archive: {e}")
+                return STATUS_FAIL
+            if merkle is None:
+                merkle = MerkleTree(get_hash_suite(meta.get("hash_suite")))
+            for chunk_hash, _, _, is_zero in iter_file_chunks(meta, file_info):
+                merkle.add_leaf(chunk_hash)
+                if not is_zero:
+                    needed.add(chunk_hash)
+
+        suite = get_hash_suite(meta.get("hash_suite"))
+        if merkle is None:
+            merkle = MerkleTree(suite)
+        snap_id = meta.get("snapshot_id")
+        merkle_root = meta.get("merkle_root")
+        if not is_valid_snapshot_id(snap_id):
+            print(f"Invalid archive: bad snapshot id {snap_id!r}")
+            return STATUS_FAIL
+        if merkle.compute_root() != merkle_root:
+            print("Invalid archive: manifest Merkle root mismatch")
+            return STATUS_FAIL
+
+        wal = WAL(os.path.join(store_path, "wal.log"))
+        if wal.is_committed(snap_id) or os.path.exists(os.path.join(store_path, snap_id)):
+            print(f"Snapshot already exists in store: {snap_id}")
+            return STATUS_FAIL
+
+        # Đổi temp directory sang tên chuẩn của snapshot
+        lock_ids.append((snap_id, store_lock.acquire_snapshot(snap_id)))
+        final_temp_dir = os.path.join(store_path, f".tmp_{snap_id}")
+        os.rename(temp_dir, final_temp_dir)
+        temp_dir = final_temp_dir
+        chunks_dir = os.path.join(temp_dir, "chunks")
+        wal.begin(snap_id)
+
+        chunk_index = ChunkIndex(store_path).open()
+        received = set()
+        written = linked = 0
+
+        while True:
+            rec_type, length = RECORD_HEADER.unpack(_read_exact(src, RECORD_HEADER.size))
+
+            if rec_type == REC_END:
+                trailer_root = _read_exact(src, length).decode("ascii")
+                break
+            if rec_type != REC_CHUNK:
+                print(f"Invalid archive: unknown record type {rec_type!r}")
+                return STATUS_FAIL
+
+            chunk_hash = _read_exact(src, 32).hex()
+            if chunk_hash not in needed or chunk_hash in received:
+                print(f"Invalid archive: unexpected chunk {chunk_hash}")
+                return STATUS_FAIL
+
+            chunk_path = os.path.join(chunks_dir, f"{chunk_hash}.chunk")
+            if link_known_chunk(store_path, chunk_index, chunk_hash, chunk_path):
+                _copy_exact(src, None, length)
+                linked += 1
+            else:
+                hasher = suite.new()
+                with open(chunk_path, "wb") as f:
+                    _copy_exact(src, f, length, hasher)
+                if hasher.hexdigest() != chunk_hash:
+                    print(f"Corrupted chunk in archive: {chunk_hash}")
+                    return STATUS_FAIL
+                written += 1
+            received.add(chunk_hash)
+
+        if trailer_root != merkle_root:
+            print("Invalid archive: Merkle root trailer mismatch")
+            return STATUS_FAIL
+        if received != needed:
+            print(f"Invalid archive: missing {len(needed - received)} chunk(s)")
+            return STATUS_FAIL
+
+        if not commit_snapshot(store_path, store_lock, wal, snap_id, merkle_root,
+                               chunk_index, received, hash_suite=suite.name):
+            temp_dir = None
+            return STATUS_FAIL
+        temp_dir = None
+
+        print(f"Import completed: {snap_id}")
+        print(f"Merkle root: {merkle_root}")
+        print(f"Chunks written: {written}, linked from store: {linked}")
+        return STATUS_OK
+
+    except Exception as e:
+        print("Import error:", e)
+        return STATUS_FAIL
+
+    finally:
+        # Import thất bại -> xoá temp directory (WAL không có COMMIT)
+        if temp_dir and os.path.exists(temp_dir):
+            remove_dir(temp_dir)
+        if chunk_index is not None:
+            chunk_index.close()
+        for lock_id, fd in lock_ids:
+            store_lock.release_snapshot(lock_id, fd)
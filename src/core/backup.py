@@ -1,18 +1,29 @@
 import os
 import json
 import time
-from utils.constants import STATUS_OK, STATUS_FAIL, CHUNK_SIZE
-from utils.fs import ensure_dir, list_files, read_chunks, write_file, remove_dir
-from utils.hash import sha256_bytes, sha256_str
+from utils.constants import STATUS_OK, STATUS_FAIL, CHUNK_SIZE, DEFAULT_HASH_SUITE
+from utils.fs import (ensure_dir, list_files, read_sparse_chunks, read_stream_chunks,
+                      is_zero_block, remove_dir)
+from utils.hash import get_hash_suite, zero_chunk_hash, LEGACY_HASH_SUITE
 from core.wal import WAL
 from core.rollback import RollbackProtector
+from core.lock import StoreLock
+from core.chunk_index import ChunkIndex
+from core.similarity import SketchIndex, chunk_sketch
+from core.file_index import FileIndex
+from core.manifest import normalize_file_path
+from storage import LocalBackend
+from storage.local import link_chunk_chain
+from storage.delta import encode_delta, MAX_DELTA_DEPTH
 
 class MerkleTree:
-    def __init__(self):
+    def __init__(self, suite=None):
+        # Mặc định suite legacy (sha256-hex) cho snapshot cũ
+        self.suite = suite or get_hash_suite()
         self.leaves = []
     
     def add_leaf(self, data_hash: str):
-        self.leaves.append(data_hash)
+        self.leaves.append(self.suite.leaf(data_hash))
     
     def compute_root(self) -> str:
         if not self.leaves:
@@ -25,55 +36,211 @@ class MerkleTree:
             for i in range(0, len(level), 2):
                 left = level[i]
                 right = level[i + 1] if i + 1 < len(level) else left
-                parent = sha256_str(left + right)
+                parent = self.suite.node(left, right)
                 next_level.append(parent)
             level = next_level
         
-        return level[0]
+        return self.suite.root_hex(level[0])
 
-def backup(source_path, store_path, label):
-    temp_dir = None
+def link_known_chunk(store_path, chunk_index, chunk_hash, dst_path):
+    """
+    Hard link chunk đã commit trong store (tra qua chỉ mục) sang dst_path
+    (chunk delta: link file .delta cùng chuỗi base vào thư mục của dst_path)
+    Trả về False nếu chunk chưa biết hoặc không link được -> caller tự ghi dữ liệu
+    """
+    owner = chunk_index.locate(chunk_hash)
+    if owner is None:
+        return False
+    return link_chunk_chain(os.path.join(store_path, owner, "chunks"), os.path.dirname(dst_path), chunk_hash)
+
+
+def put_similar_chunk(backend, snap_id, chunk_hash, data, sketch_index, chunk_index, written_chunks):
+    """
+    Ghi chunk mới, dạng delta nếu tìm được chunk tương tự làm base (qua sketch)
+    Base phải nằm trong snapshot đang build hoặc trong một snapshot đã commit,
+    chuỗi delta không vượt quá MAX_DELTA_DEPTH
+    Trả về số byte tiết kiệm được (0 nếu ghi nguyên vẹn)
+    """
+    sketch = chunk_sketch(data)
+    saved = 0
+    base_hash = sketch_index.find(sketch) if sketch else None
+    if base_hash is not None:
+        base_owner = None if base_hash in written_chunks else chunk_index.locate(base_hash)
+        if base_hash in written_chunks or base_owner is not None:
+            base = backend.get_delta_base(snap_id, base_hash, base_owner)
+            if base is not None and base[1] < MAX_DELTA_DEPTH:
+                blob = encode_delta(base[0], data, base_hash, base[1] + 1)
+                if blob is not None and backend.put_delta(snap_id, chunk_hash, blob, base_hash, base_owner):
+                    saved = len(data) - len(blob)
+    if not saved:
+        backend.put_chunk(snap_id, chunk_hash, data)
+    if sketch:
+        sketch_index.add(sketch, chunk_hash)
+    return saved
+
+
+def reuse_file_chunks(backend, snap_id, abs_path, size, chunks, suite, chunk_index, written_chunks):
+    """
+    Đưa các chunk của một file đã biết (qua FileIndex) vào snapshot mà không hash lại file
+    Chunk đã có trong snapshot hoặc toàn 0 được bỏ qua, còn lại link từ snapshot đang giữ;
+    backend không link được thì đọc đúng vùng đó của file và ghi
+    Trả về False (chưa ghi gì) nếu có chunk không còn trong store -> caller đi đường thường
+    """
+    if len(chunks) != (size + CHUNK_SIZE - 1) // CHUNK_SIZE:
+        return False
+
+    owners = {}
+    for i, chunk_hash in enumerate(chunks):
+        length = min(CHUNK_SIZE, size - i * CHUNK_SIZE)
+        if (chunk_hash in written_chunks or chunk_hash in owners
+                or chunk_hash == zero_chunk_hash(length, suite.name)):
+            continue
+        owner = chunk_index.locate(chunk_hash)
+        if owner is None:
+            return False
+        owners[chunk_hash] = (owner, i * CHUNK_SIZE, length)
+
+    for chunk_hash, (owner, offset, length) in owners.items():
+        if not backend.link_chunk(snap_id, chunk_hash, owner):
+            with open(abs_path, "rb") as f:
+                f.seek(offset)
+                backend.put_chunk(snap_id, chunk_hash, f.read(length), owner)
+        written_chunks.add(chunk_hash)
+    return True
+
+
+def commit_snapshot(store_path, store_lock, wal, snap_id, merkle_root, chunk_index, written_chunks,
+                    backend=None, hash_suite=LEGACY_HASH_SUITE, sketch_index=None, file_index=None):
+    """
+    Commit snapshot đã build xong (local: trong .tmp_<snap_id>)
+    Trả về False nếu publish thất bại (WAL đã commit, cleanup sẽ retry rename)
+    """
+    if backend is None:
+        backend = LocalBackend(store_path)
+    
+    # Critical section: roots.log, WAL COMMIT và rename phải được serialize
+    # giữa các backup chạy song song (index trong roots.log và thứ tự COMMIT
+    # phải khớp nhau). Phần ghi chunk trước đó không cần khoá toàn store.
+    with store_lock.exclusive():
+        # QUAN TRỌNG: Chỉ ghi vào roots.log SAU KHI tất cả đã hoàn tất
+        rollback_protector = RollbackProtector(os.path.join(store_path, "roots.log"))
+        rollback_protector.append_root(merkle_root, hash_suite)
+        
+        # QUAN TRỌNG: Chỉ rename temp directory thành snapshot directory SAU KHI đã commit WAL
+        # Nếu bị kill trước đây, temp directory sẽ không được rename và sẽ bị cleanup
+        wal.commit(snap_id)
+        
+        # Chỉ sau khi commit WAL thành công, mới rename temp directory thành snapshot directory
+        # Đây là atomic operation - nếu rename thành công, snapshot đã sẵn sàng
+        # Nếu rename thất bại (ví dụ: disk full), temp directory vẫn còn và có thể retry sau
+        try:
+            backend.publish_snapshot(snap_id)
+        except Exception as rename_error:
+            # Nếu rename thất bại, WAL đã commit nhưng snapshot directory chưa tồn tại
+            # Cleanup sẽ tự động retry rename khi chạy list-snapshots hoặc cleanup
+            print(f"Warning: Failed to rename temp directory to snapshot: {rename_error}")
+            print(f"Snapshot will be recovered automatically on next cleanup")
+            # Không raise exception, để cleanup có thể retry sau
+            return False
+        
+        # Cập nhật chỉ mục chunk (chỉ là gợi ý, lỗi ở đây không làm hỏng snapshot)
+        try:
+            chunk_index.add_snapshot(snap_id, written_chunks)
+        except Exception as index_error:
+            print(f"Warning: Failed to update chunk index: {index_error}")
+        if sketch_index is not None:
+            try:
+                sketch_index.save()
+            except Exception as index_error:
+                print(f"Warning: Failed to update sketch index: {index_error}")
+        if file_index is not None:
+            try:
+                file_index.save()
+            except Exception as index_error:
+                print(f"Warning: Failed to update file index: {index_error}")
+    
+    return True
+
+
+def backup(source_path, store_path, label, stream=None, stream_name="stdin", backend=None,
+           hash_suite=DEFAULT_HASH_SUITE, delta=False, throttle=None):
+    """
+    Backup source_path vào store
+    Nếu truyền stream (ví dụ stdin của pg_dump), dữ liệu được chunk/hash/dedup
+    trong một lượt với buffer giới hạn và lưu thành một file tên stream_name trong manifest
+    Chunk và manifest được ghi qua backend (mặc định filesystem cục bộ tại store_path);
+    WAL, roots.log và khoá luôn nằm ở store_path
+    hash_suite chọn thuật toán hash chunk/Merkle (xem utils.hash.HASH_SUITES)
+    delta: chunk mới gần giống một chunk đã có được lưu dạng delta so với chunk đó
+    (hash chunk và Merkle root vẫn tính trên nội dung thật)
+    throttle: utils.throttle.Throttle giới hạn I/O đọc nguồn (ghi store được giới hạn
+    bằng cách bọc backend trong storage.ThrottledBackend)
+    """
+    if backend is None:
+        backend = LocalBackend(store_path)
+    snap_id = None
     snap_dir = None
-    rollback_protector = None
     merkle_root = None
+    store_lock = None
+    snap_lock_fd = None
+    chunk_index = None
     
     try:
         # Tự động cleanup các snapshot không commit và temp directory trước khi backup
-        cleaned = cleanup_incomplete_snapshots(store_path)
+        cleaned = cleanup_incomplete_snapshots(store_path, backend)
         if cleaned > 0:
             print(f"Cleaned up {cleaned} incomplete snapshot(s) and temp directory(ies)\n")
         
+        suite = get_hash_suite(hash_suite)
+        
+        if delta and not backend.supports_delta:
+            print("Delta compression is not supported by this storage backend, storing full chunks")
+            delta = False
+        
         # Kiểm tra source tồn tại
-        if not os.path.exists(source_path):
+        if stream is None and not os.path.exists(source_path):
             print(f"Source path not found: {source_path}")
             return STATUS_FAIL
         
+        # Tên file của stream nằm trong manifest -> restore ghi theo tên này
+        if stream is not None:
+            try:
+                stream_name = normalize_file_path(stream_name.replace("\\", "/").lstrip("/"))
+            except ValueError as e:
+                print(e)
+                return STATUS_FAIL
+        
         # Tạo snapshot ID từ timestamp + label
         timestamp = int(time.time() * 1000)
         snap_id = f"{timestamp}_{label}"
         
-        # Tạo temp directory với prefix để dễ cleanup nếu bị kill
-        temp_dir = os.path.join(store_path, f".tmp_{snap_id}")
-        temp_chunks_dir = os.path.join(temp_dir, "chunks")
-        
         # Snapshot directory cuối cùng (chỉ tạo sau khi commit)
         snap_dir = os.path.join(store_path, snap_id)
         
         # Khởi tạo WAL
         ensure_dir(store_path)
+        
+        # Khoá temp directory của snapshot này trước khi tạo, để cleanup
+        # của các backup chạy song song không xoá nhầm
+        store_lock = StoreLock(store_path)
+        snap_lock_fd = store_lock.acquire_snapshot(snap_id)
+        
         wal = WAL(os.path.join(store_path, "wal.log"))
         wal.begin(snap_id)
         
         try:
-            # Tạo temp directory để build snapshot
-            ensure_dir(temp_chunks_dir)
+            # Tạo vùng ghi tạm của snapshot (local: .tmp_<snap_id>, dễ cleanup nếu bị kill)
+            backend.begin_snapshot(snap_id)
             
             # Thu thập tất cả files
-            files = list_files(source_path)
+            if stream is not None:
+                files = [(stream_name, None)]
+            else:
+                files = list_files(source_path)
             
             if not files:
                 print("No files to backup")
-                remove_dir(temp_dir)
+                backend.abort_snapshot(snap_id)
                 return STATUS_FAIL
             
             # Chuẩn bị manifest và merkle tree
@@ -81,70 +248,114 @@ def backup(source_path, store_path, label):
                 "snapshot_id": snap_id,
                 "label": label,
                 "timestamp": timestamp,
+                "chunk_size": CHUNK_SIZE,
+                "hash_suite": suite.name,
                 "files": []
             }
             
-            merkle = MerkleTree()
+            merkle = MerkleTree(suite)
+            
+            # Dedup lookup hoàn toàn trong RAM: set các chunk đã ghi trong snapshot này
+            # và chỉ mục (mmap) các chunk đã commit trên cùng backend
+            written_chunks = set()
+            chunk_index = ChunkIndex(store_path, backend.location).open()
+            sketch_index = SketchIndex(store_path).open() if delta else None
+            file_index = FileIndex(store_path)
+            reused_files = 0
+            delta_chunks = 0
+            delta_saved = 0
             
             # Xử lý từng file - ghi vào temp directory
             for rel_path, abs_path in files:
                 file_info = {
                     "path": rel_path,
+                    "size": 0,
                     "chunks": []
                 }
                 
-                # Chia file thành chunks
+                # File đã biết (cùng fingerprint và identity đã xác nhận, ví dụ hard link
+                # ở đường dẫn khác hoặc file không đổi từ lần trước) -> dùng lại danh sách chunk
+                fingerprint = file_index.fingerprint(abs_path) if abs_path is not None else None
+                if fingerprint is not None:
+                    known_chunks = file_index.match(fingerprint, suite.name)
+                    if known_chunks is not None and reuse_file_chunks(
+                            backend, snap_id, abs_path, fingerprint.size, known_chunks, suite,
+                            chunk_index, written_chunks):
+                        file_info["size"] = fingerprint.size
+                        file_info["chunks"] = list(known_chunks)
+                        for chunk_hash in known_chunks:
+                            merkle.add_leaf(chunk_hash)
+                        manifest["files"].append(file_info)
+                        reused_files += 1
+                        continue
+                
+                # Chia file thành chunks (hole của sparse file không cần đọc)
                 chunk_idx = 0
-                for chunk_data in read_chunks(abs_path, CHUNK_SIZE):
-                    chunk_hash = sha256_bytes(chunk_data)
-                    chunk_filename = f"{chunk_hash}.chunk"
-                    temp_chunk_path = os.path.join(temp_chunks_dir, chunk_filename)
+                if abs_path is None:
+                    chunk_source = read_stream_chunks(stream, CHUNK_SIZE)
+                else:
+                    chunk_source = read_sparse_chunks(abs_path, CHUNK_SIZE)
+                if throttle is not None:
+                    chunk_source = throttle.iter_reads(
+                        chunk_source, size=lambda item: len(item[1]) if item[1] is not None else 0)
+                
+                for chunk_len, chunk_data in chunk_source:
+                    file_info["size"] += chunk_len
+                    
+                    # Chunk toàn 0: dùng hash dựng sẵn, không hash dữ liệu, không lưu file
+                    if chunk_data is None or is_zero_block(chunk_data):
+                        chunk_hash = zero_chunk_hash(chunk_len, suite.name)
+                        file_info["chunks"].append(chunk_hash)
+                        merkle.add_leaf(chunk_hash)
+                        chunk_idx += 1
+                        continue
                     
-                    # Ghi chunk vào temp directory (deduplicate trong cùng snapshot)
-                    # Chỉ ghi nếu chưa tồn tại trong temp directory
-                    if not os.path.exists(temp_chunk_path):
-                        write_file(temp_chunk_path, chunk_data)
+                    chunk_hash = suite.chunk_hash(chunk_data)
+                    
+                    # Ghi chunk vào snapshot đang build (deduplicate trong cùng snapshot)
+                    # Chunk đã có trong store -> backend dùng lại từ snapshot đang giữ nó
+                    if chunk_hash not in written_chunks:
+                        owner = chunk_index.locate(chunk_hash)
+                        if sketch_index is None or owner is not None:
+                            backend.put_chunk(snap_id, chunk_hash, chunk_data, owner)
+                        else:
+                            saved = put_similar_chunk(backend, snap_id, chunk_hash, chunk_data,
+                                                      sketch_index, chunk_index, written_chunks)
+                            if saved:
+                                delta_chunks += 1
+                                delta_saved += saved
+                        written_chunks.add(chunk_hash)
                     
                     file_info["chunks"].append(chunk_hash)
                     merkle.add_leaf(chunk_hash)
                     chunk_idx += 1
                 
+                # Chỉ ghi nhận khi file không đổi trong lúc đọc và không "racy"
+                if (fingerprint is not None and file_info["size"] == fingerprint.size
+                        and file_index.unchanged(abs_path, fingerprint)):
+                    file_index.record(fingerprint, suite.name, file_info["chunks"])
                 manifest["files"].append(file_info)
             
             # Tính merkle root
             merkle_root = merkle.compute_root()
             manifest["merkle_root"] = merkle_root
             
-            # Ghi manifest vào temp directory
-            temp_manifest_path = os.path.join(temp_dir, "manifest.json")
-            with open(temp_manifest_path, "w") as f:
-                json.dump(manifest, f, indent=2)
-            
-            # QUAN TRỌNG: Chỉ ghi vào roots.log SAU KHI tất cả đã hoàn tất
-            rollback_protector = RollbackProtector(os.path.join(store_path, "roots.log"))
-            rollback_protector.append_root(merkle_root)
+            # Ghi manifest và chờ mọi chunk ghi xong trước khi commit
+            backend.put_manifest(snap_id, json.dumps(manifest, indent=2).encode("utf-8"))
+            backend.flush()
             
-            # QUAN TRỌNG: Chỉ rename temp directory thành snapshot directory SAU KHI đã commit WAL
-            # Nếu bị kill trước đây, temp directory sẽ không được rename và sẽ bị cleanup
-            wal.commit(snap_id)
-            
-            # Chỉ sau khi commit WAL thành công, mới rename temp directory thành snapshot directory
-            # Đây là atomic operation - nếu rename thành công, snapshot đã sẵn sàng
-            # Nếu rename thất bại (ví dụ: disk full), temp directory vẫn còn và có thể retry sau
-            if os.path.exists(temp_dir):
-                try:
-                    os.rename(temp_dir, snap_dir)
-                except Exception as rename_error:
-                    # Nếu rename thất bại, WAL đã commit nhưng snapshot directory chưa tồn tại
-                    # Cleanup sẽ tự động retry rename khi chạy list-snapshots hoặc cleanup
-                    print(f"Warning: Failed to rename temp directory to snapshot: {rename_error}")
-                    print(f"Snapshot will be recovered automatically on next cleanup")
-                    # Không raise exception, để cleanup có thể retry sau
-                    return STATUS_FAIL
+            if not commit_snapshot(store_path, store_lock, wal, snap_id, merkle_root,
+                                   chunk_index, written_chunks, backend, suite.name, sketch_index,
+                                   file_index):
+                return STATUS_FAIL
             
             print(f"Backup completed: {snap_id}")
             print(f"Merkle root: {merkle_root}")
             print(f"Files backed up: {len(files)}")
+            if reused_files:
+                print(f"Files reused from file index: {reused_files}")
+            if delta:
+                print(f"Delta chunks: {delta_chunks} ({delta_saved} bytes saved)")
             
             return STATUS_OK
             
@@ -152,9 +363,8 @@ def backup(source_path, store_path, label):
             # Rollback nếu có lỗi
             print(f"Backup failed, rolling back: {e}")
             
-            # Xóa temp directory
-            if temp_dir and os.path.exists(temp_dir):
-                remove_dir(temp_dir)
+            # Xóa dữ liệu đã ghi dở
+            backend.abort_snapshot(snap_id)
             
             # QUAN TRỌNG: Không commit WAL nếu failed
             # roots.log cũng không được ghi nếu exception xảy ra trước đó
@@ -165,73 +375,118 @@ def backup(source_path, store_path, label):
         print("Backup error:", e)
         
         # Cleanup nếu có exception ở outer level
-        if temp_dir and os.path.exists(temp_dir):
-            remove_dir(temp_dir)
+        if snap_lock_fd is not None:
+            try:
+                backend.abort_snapshot(snap_id)
+            except Exception:
+                pass
         if snap_dir and os.path.exists(snap_dir):
             remove_dir(snap_dir)
         
         return STATUS_FAIL
+    
+    finally:
+        if chunk_index is not None:
+            chunk_index.close()
+        if snap_lock_fd is not None:
+            store_lock.release_snapshot(snap_id, snap_lock_fd)
 
 
-def cleanup_incomplete_snapshots(store_path):
+def cleanup_incomplete_snapshots(store_path, backend=None):
     """
     Xóa các snapshot không được commit (incomplete/corrupted)
     Chỉ giữ lại các snapshot có COMMIT trong WAL
     Cũng xóa các temp directory (.tmp_*) còn sót lại
     Nếu WAL có COMMIT nhưng snapshot directory không tồn tại và có temp directory tương ứng,
     sẽ thử retry rename (trường hợp rename thất bại do crash)
+    Temp directory đang bị khoá bởi một backup khác (đang chạy) sẽ được giữ nguyên
+    backend ngoài store (object store): upload của snapshot không commit cũng bị xoá
     """
     try:
         if not os.path.exists(store_path):
             return 0
         
-        wal = WAL(os.path.join(store_path, "wal.log"))
-        committed_snapshots = wal.get_committed_snapshots()
-        
-        # Kiểm tra các snapshot đã commit nhưng directory chưa tồn tại
-        # (có thể do rename thất bại sau khi commit WAL)
-        for snap_id in committed_snapshots:
-            snap_dir = os.path.join(store_path, snap_id)
-            temp_dir = os.path.join(store_path, f".tmp_{snap_id}")
-            
-            # Nếu snapshot directory không tồn tại nhưng có temp directory
-            if not os.path.exists(snap_dir) and os.path.exists(temp_dir):
-                try:
-                    print(f"Retrying rename for committed snapshot: {snap_id}")
-                    os.rename(temp_dir, snap_dir)
-                    print(f"Successfully recovered snapshot: {snap_id}")
-                except Exception as e:
-                    print(f"Failed to recover snapshot {snap_id}: {e}")
-                    # Nếu không thể recover, xóa temp directory
-                    remove_dir(temp_dir)
-        
-        # Tìm tất cả thư mục snapshot trong store
-        cleaned_count = 0
-        for item in os.listdir(store_path):
-            # Bỏ qua các file log
-            if item.endswith('.log'):
-                continue
-            
-            item_path = os.path.join(store_path, item)
-            # Chỉ xử lý thư mục
-            if os.path.isdir(item_path):
-                # Xóa temp directories (bắt đầu bằng .tmp_) còn sót lại
-                if item.startswith('.tmp_'):
-                    print(f"Cleaning up temp directory: {item}")
-                    remove_dir(item_path)
-                    cleaned_count += 1
-                # Nếu snapshot này không có trong danh sách committed -> xóa
-                elif item not in committed_snapshots:
-                    print(f"Cleaning up incomplete snapshot: {item}")
-                    remove_dir(item_path)
-                    cleaned_count += 1
-        
-        return cleaned_count
+        store_lock = StoreLock(store_path)
+        with store_lock.exclusive():
+            cleaned = _cleanup_locked(store_path, store_lock)
+        if backend is not None and backend.location is not None:
+            cleaned += _cleanup_remote(store_path, store_lock, backend)
+        return cleaned
     except Exception as e:
         print(f"Error during cleanup: {e}")
         return 0
 
 
+def _cleanup_remote(store_path, store_lock, backend):
+    """
+    Xoá upload mồ côi trên backend (backup bị kill trước COMMIT, snapshot đã bị prune)
+    Chạy ngoài khoá toàn store: backup đang chạy giữ khoá snapshot đến sau COMMIT nên được bỏ qua
+    WAL được đọc sau khi kiểm tra khoá -> backup vừa commit xong không bị xoá nhầm
+    """
+    idle = [s for s in sorted(backend.list_snapshots()) if not store_lock.is_active(s)]
+    committed = WAL(os.path.join(store_path, "wal.log")).get_committed_snapshots()
+    cleaned_count = 0
+    for snap_id in idle:
+        if snap_id in committed:
+            continue
+        print(f"Cleaning up orphaned upload: {snap_id}")
+        backend.abort_snapshot(snap_id)
+        cleaned_count += 1
+    return cleaned_count
+
+
+def _cleanup_locked(store_path, store_lock):
+    """Phần thân của cleanup, chạy khi đã giữ khoá toàn store"""
+    wal = WAL(os.path.join(store_path, "wal.log"))
+    committed_snapshots = wal.get_committed_snapshots()
+    
+    # Kiểm tra các snapshot đã commit nhưng directory chưa tồn tại
+    # (có thể do rename thất bại sau khi commit WAL)
+    for snap_id in committed_snapshots:
+        snap_dir = os.path.join(store_path, snap_id)
+        temp_dir = os.path.join(store_path, f".tmp_{snap_id}")
+        
+        # Nếu snapshot directory không tồn tại nhưng có temp directory
+        if not os.path.exists(snap_dir) and os.path.exists(temp_dir):
+            try:
+                print(f"Retrying rename for committed snapshot: {snap_id}")
+                os.rename(temp_dir, snap_dir)
+                print(f"Successfully recovered snapshot: {snap_id}")
+            except Exception as e:
+                print(f"Failed to recover snapshot {snap_id}: {e}")
+                # Nếu không thể recover, xóa temp directory
+                remove_dir(temp_dir)
+    
+    # Tìm tất cả thư mục snapshot trong store
+    cleaned_count = 0
+    for item in os.listdir(store_path):
+        # Bỏ qua các file log
+        if item.endswith('.log'):
+            continue
+        
+        item_path = os.path.join(store_path, item)
+        # Chỉ xử lý thư mục
+        if os.path.isdir(item_path):
+            # Xóa temp directories (bắt đầu bằng .tmp_) còn sót lại
+            if item.startswith('.tmp_'):
+                # Backup khác đang ghi vào temp directory này -> bỏ qua
+                if store_lock.is_active(item[len('.tmp_'):]):
+                    continue
+                print(f"Cleaning up temp directory: {item}")
+                remove_dir(item_path)
+                cleaned_count += 1
+            # Thư mục nội bộ của store (.locks, ...) không phải snapshot
+            elif item.startswith('.'):
+                continue
+            # Nếu snapshot này không có trong danh sách committed -> xóa
+            elif item not in committed_snapshots:
+                print(f"Cleaning up incomplete snapshot: {item}")
+                remove_dir(item_path)
+                cleaned_count += 1
+    
+    return cleaned_count
+
+
 def list_snapshots(store_path):
     """
     Liệt kê tất cả snapshot đã được commit (hợp lệ)
@@ -0,0 +1,272 @@
+import os
+import json
+import mmap
+import heapq
+import struct
+import hashlib
+
+# Chỉ mục chunk toàn store, nằm trong store/.chunk_index/
+# Mỗi segment là một file bất biến:
+#   header | bảng snapshot (JSON) | records đã sort | Bloom filter
+# record = digest 32 byte + u32 chỉ số snapshot sở hữu chunk (trong bảng snapshot)
+INDEX_DIR = ".chunk_index"
+SEGMENT_MAGIC = b"LCIDX001"
+HEADER = struct.Struct("<8sIQQI")  # magic, k, count, bloom_nbytes, table_len
+RECORD = struct.Struct("<32sI")
+BLOOM_BITS_PER_KEY = 10
+BLOOM_HASHES = 7
+
+# Số segment tối đa trước khi gộp lại thành một
+MAX_SEGMENTS = 8
+
+
+def _bloom_positions(digest, nbits):
+    """Double hashing trên chính digest (đã là hash mật mã, phân bố đều)"""
+    h1 = int.from_bytes(digest[0:8], "little")
+    h2 = int.from_bytes(digest[8:16], "little") | 1
+    return [(h1 + i * h2) % nbits for i in range(BLOOM_HASHES)]
+
+
+def _bloom_nbytes(count):
+    return max(64, (count * BLOOM_BITS_PER_KEY + 7) // 8)
+
+
+class _Segment:
+    """Một segment đã mmap, chỉ đọc"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, k, self.count, bloom_nbytes, table_len = HEADER.unpack_from(self.mm, 0)
+        if magic != SEGMENT_MAGIC or k != BLOOM_HASHES:
+            raise ValueError(f"Invalid chunk index segment: {path}")
+
+        table_start = HEADER.size
+        self.snapshots = json.loads(bytes(self.mm[table_start:table_start + table_len]))
+        self.records_start = table_start + table_len
+        self.bloom_start = self.records_start + self.count * RECORD.size
+        self.bloom_nbits = bloom_nbytes * 8
+
+    def close(self):
+        self.mm.close()
+
+    def _maybe_contains(self, digest):
+        mm = self.mm
+        for pos in _bloom_positions(digest, self.bloom_nbits):
+            if not mm[self.bloom_start + (pos >> 3)] & (1 << (pos & 7)):
+                return False
+        return True
+
+    def find(self, digest):
+        """Trả về snapshot sở hữu digest, hoặc None"""
+        if not self.count or not self._maybe_contains(digest):
+            return None
+
+        # Binary search trên mảng record đã sort
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            off = self.records_start + mid * RECORD.size
+            key = self.mm[off:off + 32]
+            if key < digest:
+                lo = mid + 1
+            elif key > digest:
+                hi = mid
+            else:
+                _, owner = RECORD.unpack_from(self.mm, off)
+                return self.snapshots[owner]
+        return None
+
+    def records(self):
+        """Duyệt (digest, snapshot_id) theo thứ tự đã sort"""
+        for i in range(self.count):
+            digest, owner = RECORD.unpack_from(self.mm, self.records_start + i * RECORD.size)
+            yield digest, self.snapshots[owner]
+
+
+def _write_segment(path, snapshots, records, upper_count):
+    """
+    Ghi segment từ iterator records (digest, owner_idx) đã sort, không trùng
+    upper_count là cận trên số record để cấp phát Bloom filter
+    Ghi vào file tạm rồi rename để reader không bao giờ thấy segment dở dang
+    """
+    table = json.dumps(snapshots).encode("utf-8")
+    bloom_nbytes = _bloom_nbytes(upper_count)
+    bloom = bytearray(bloom_nbytes)
+    nbits = bloom_nbytes * 8
+
+    tmp_path = path + ".tmp"
+    count = 0
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(SEGMENT_MAGIC, BLOOM_HASHES, 0, bloom_nbytes, len(table)))
+        f.write(table)
+        for digest, owner in records:
+            f.write(RECORD.pack(digest, owner))
+            for pos in _bloom_positions(digest, nbits):
+                bloom[pos >> 3] |= 1 << (pos & 7)
+            count += 1
+        f.write(bloom)
+
+        # Cập nhật số record thật vào header
+        f.seek(0)
+        f.write(HEADER.pack(SEGMENT_MAGIC, BLOOM_HASHES, count, bloom_nbytes, len(table)))
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.rename(tmp_path, path)
+
+
+class ChunkIndex:
+    """
+    Chỉ mục các chunk đã commit trong store: chunk_hash -> snapshot đang giữ chunk đó
+
+    Segment được mmap khi mở, nên phần lớn lookup (đặc biệt là chunk chưa có,
+    bị Bloom filter loại ngay) không cần syscall nào tới filesystem.
+    Chỉ mục chỉ là gợi ý để tăng tốc: mất hoặc thiếu chỉ mục không ảnh hưởng tính đúng đắn.
+    Ghi (add_snapshot/compact) phải được gọi khi đang giữ StoreLock.exclusive()
+    location: backend giữ dữ liệu (StorageBackend.location); mỗi backend ngoài store có
+    chỉ mục riêng trong store/.chunk_index/<tên>, để owner luôn là snapshot của cùng backend
+    """
+
+    def __init__(self, store_path, location=None):
+        self.dir = os.path.join(store_path, INDEX_DIR)
+        if location is not None:
+            name = hashlib.sha256(location.encode("utf-8")).hexdigest()[:16]
+            self.dir = os.path.join(self.dir, f"remote-{name}")
+        self.segments = None
+
+    def _segment_files(self):
+        if not os.path.isdir(self.dir):
+            return []
+        names = [n for n in os.listdir(self.dir) if n.startswith("seg-") and n.endswith(".idx")]
+        return sorted(names)
+
+    def open(self):
+        """mmap tất cả segment hiện có (segment hỏng bị bỏ qua)"""
+        self.close()
+        self.segments = []
+        for name in self._segment_files():
+            try:
+                self.segments.append(_Segment(os.path.join(self.dir, name)))
+            except (OSError, ValueError) as e:
+                print(f"Warning: Ignoring chunk index segment {name}: {e}")
+        return self
+
+    def close(self):
+        if self.segments:
+            for seg in self.segments:
+                seg.close()
+        self.segments = None
+
+    def locate(self, chunk_hash):
+        """Trả về snapshot_id đang giữ chunk, hoặc None nếu chưa biết"""
+        if self.segments is None:
+            self.open()
+        try:
+            digest = bytes.fromhex(chunk_hash)
+        except ValueError:
+            return None
+        # Segment mới nhất trước: snapshot mới nhất giữ chunk ít có khả năng đã bị xoá
+        for seg in reversed(self.segments):
+            owner = seg.find(digest)
+            if owner is not None:
+                return owner
+        return None
+
+    def contains(self, chunk_hash):
+        return self.locate(chunk_hash) is not None
+
+    def add_snapshot(self, snap_id, chunk_hashes):
+        """
+        Ghi một segment mới cho các chunk của snapshot vừa commit
+        Snapshot này trở thành nơi giữ (owner) mới nhất của các chunk đó
+        """
+        # Mở lại để thấy segment do các process khác vừa ghi
+        self.open()
+
+        new_digests = set()
+        for h in chunk_hashes:
+            try:
+                digest = bytes.fromhex(h)
+            except ValueError:
+                continue
+            if len(digest) == 32:
+                new_digests.add(digest)
+
+        if new_digests:
+            os.makedirs(self.dir, exist_ok=True)
+            files = self._segment_files()
+            seq = int(files[-1][4:-4]) + 1 if files else 1
+            path = os.path.join(self.dir, f"seg-{seq:08d}.idx")
+            records = ((d, 0) for d in sorted(new_digests))
+            _write_segment(path, [snap_id], records, len(new_digests))
+            self.open()
+
+        if len(self.segments) > MAX_SEGMENTS:
+            self.compact()
+
+    def rebuild(self, owners):
+        """
+        Ghi lại toàn bộ chỉ mục thành một segment từ {chunk_hash: snapshot_id}
+        (sau khi xoá snapshot: mỗi chunk còn sống trỏ tới một snapshot còn giữ nó)
+        """
+        self.open()
+        snapshots = sorted(set(owners.values()))
+        slot = {snap_id: i for i, snap_id in enumerate(snapshots)}
+        records = sorted((bytes.fromhex(h), slot[snap_id]) for h, snap_id in owners.items())
+
+        old_files = [seg.path for seg in self.segments]
+        os.makedirs(self.dir, exist_ok=True)
+        files = self._segment_files()
+        seq = int(files[-1][4:-4]) + 1 if files else 1
+        _write_segment(os.path.join(self.dir, f"seg-{seq:08d}.idx"), snapshots, records, len(records))
+
+        self.close()
+        for old in old_files:
+            os.remove(old)
+        self.open()
+
+    def compact(self, live_snapshots=None):
+        """
+        Gộp toàn bộ segment thành một bằng merge streaming (không nạp hết vào RAM)
+        Nếu truyền live_snapshots, bỏ các record có snapshot sở hữu không còn sống
+        """
+        self.open()
+        if not self.segments:
+            return
+
+        snapshots = []
+        slot = {}
+        for seg in self.segments:
+            for snap_id in seg.snapshots:
+                if snap_id not in slot and (live_snapshots is None or snap_id in live_snapshots):
+                    slot[snap_id] = len(snapshots)
+                    snapshots.append(snap_id)
+
+        def merged():
+            # heapq.merge ổn định: với cùng digest, record của segment mới hơn đến sau
+            # -> giữ owner còn sống cuối cùng (mới nhất) của mỗi digest
+            pending = None
+            for digest, owner in heapq.merge(*(seg.records() for seg in self.segments),
+                                             key=lambda r: r[0]):
+                if pending is not None and pending[0] != digest:
+                    yield pending
+                    pending = None
+                if owner in slot:
+                    pending = (digest, slot[owner])
+            if pending is not None:
+                yield pending
+
+        old_files = [seg.path for seg in self.segments]
+        upper = sum(seg.count for seg in self.segments)
+        files = self._segment_files()
+        seq = int(files[-1][4:-4]) + 1
+        path = os.path.join(self.dir, f"seg-{seq:08d}.idx")
+        _write_segment(path, snapshots, merged(), upper)
+
+        self.close()
+        for old in old_files:
+            os.remove(old)
+        self.open()
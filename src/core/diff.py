@@ -0,0 +1,165 @@
+import os
+from utils.constants import STATUS_OK, STATUS_FAIL, CHUNK_SIZE
+from utils.hash import LEGACY_HASH_SUITE
+from core.wal import WAL
+from core.manifest import iter_manifest_files
+
+ADDED = "A"
+REMOVED = "D"
+MODIFIED = "M"
+
+
+def _sorted_files(manifest_path, meta):
+    """Stream file_info, kiểm tra manifest đúng thứ tự canonical (sort theo path)"""
+    prev = None
+    for file_info in iter_manifest_files(manifest_path, meta):
+        path = file_info["path"]
+        if prev is not None and path <= prev:
+            raise ValueError(f"Manifest is not sorted by path: {manifest_path}")
+        prev = path
+        yield file_info
+
+
+def _hash_suite(manifest_path):
+    """Hash suite của snapshot (trường top-level đứng trước "files" -> chỉ đọc tới file đầu tiên)"""
+    meta = {}
+    next(iter_manifest_files(manifest_path, meta), None)
+    return meta.get("hash_suite") or LEGACY_HASH_SUITE
+
+
+def _file_size(file_info, chunk_size):
+    """Kích thước file; manifest cũ không có "size" thì ước lượng theo số chunk"""
+    if "size" in file_info:
+        return file_info["size"]
+    return len(file_info["chunks"]) * chunk_size
+
+
+def _chunk_lengths(file_info, chunk_size):
+    size = _file_size(file_info, chunk_size)
+    for i in range(len(file_info["chunks"])):
+        yield min(chunk_size, size - i * chunk_size)
+
+
+def _changed_ranges(old_info, new_info, old_chunk_size, new_chunk_size):
+    """
+    So sánh danh sách chunk theo vị trí, trả về các khoảng byte (start, end)
+    bị thay đổi trong file mới (gộp các chunk thay đổi liền kề)
+    Khác chunk_size giữa hai snapshot thì coi cả file là thay đổi
+    """
+    new_size = _file_size(new_info, new_chunk_size)
+    if old_chunk_size != new_chunk_size:
+        return [(0, new_size)] if new_size else []
+
+    old_chunks = old_info["chunks"]
+    ranges = []
+    offset = 0
+    for i, length in enumerate(_chunk_lengths(new_info, new_chunk_size)):
+        if i >= len(old_chunks) or old_chunks[i] != new_info["chunks"][i]:
+            if ranges and ranges[-1][1] == offset:
+                ranges[-1] = (ranges[-1][0], offset + length)
+            else:
+                ranges.append((offset, offset + length))
+        offset += length
+    return ranges
+
+
+def diff_manifests(old_manifest_path, new_manifest_path, sizes_only=False):
+    """
+    Merge-join hai manifest đã sort theo path, không đọc dữ liệu chunk
+    Yield (status, path, old_size, new_size, changed_ranges)
+    Bộ nhớ chỉ giữ một entry của mỗi manifest tại một thời điểm
+    sizes_only: chỉ so kích thước (hai snapshot khác hash suite -> hash chunk không so được),
+    file khác kích thước được coi là thay đổi toàn bộ
+    """
+    old_meta, new_meta = {}, {}
+    old_iter = _sorted_files(old_manifest_path, old_meta)
+    new_iter = _sorted_files(new_manifest_path, new_meta)
+    old_info = next(old_iter, None)
+    new_info = next(new_iter, None)
+
+    while old_info is not None or new_info is not None:
+        old_cs = old_meta.get("chunk_size", CHUNK_SIZE)
+        new_cs = new_meta.get("chunk_size", CHUNK_SIZE)
+
+        if new_info is None or (old_info is not None and old_info["path"] < new_info["path"]):
+            yield REMOVED, old_info["path"], _file_size(old_info, old_cs), 0, []
+            old_info = next(old_iter, None)
+        elif old_info is None or new_info["path"] < old_info["path"]:
+            size = _file_size(new_info, new_cs)
+            yield ADDED, new_info["path"], 0, size, [(0, size)] if size else []
+            new_info = next(new_iter, None)
+        else:
+            old_size = _file_size(old_info, old_cs)
+            new_size = _file_size(new_info, new_cs)
+            if sizes_only:
+                if old_size != new_size:
+                    yield MODIFIED, new_info["path"], old_size, new_size, [(0, new_size)] if new_size else []
+            elif old_info["chunks"] != new_info["chunks"] or old_size != new_size:
+                ranges = _changed_ranges(old_info, new_info, old_cs, new_cs)
+                yield MODIFIED, new_info["path"], old_size, new_size, ranges
+            old_info = next(old_iter, None)
+            new_info = next(new_iter, None)
+
+
+def diff_snapshots(old_snapshot_id, new_snapshot_id, store_path, show_ranges=False):
+    """
+    So sánh hai snapshot đã commit dựa trên manifest và danh sách chunk
+    In các file thêm/xoá/sửa và tổng số byte, không cần restore
+    File bị thu nhỏ: phần đuôi bị cắt (old_size - new_size) được tính vào số byte thay đổi
+    Hai snapshot khác hash suite: cảnh báo và chỉ so kích thước file
+    """
+    try:
+        wal = WAL(os.path.join(store_path, "wal.log"))
+        committed = wal.get_committed_snapshots()
+
+        manifest_paths = []
+        for snap_id in (old_snapshot_id, new_snapshot_id):
+            manifest_path = os.path.join(store_path, snap_id, "manifest.json")
+            if snap_id not in committed or not os.path.exists(manifest_path):
+                print(f"Snapshot not found or not committed: {snap_id}")
+                return STATUS_FAIL
+            manifest_paths.append(manifest_path)
+
+        # Cùng nội dung nhưng khác suite -> mọi hash chunk đều khác, không so theo chunk được
+        old_suite, new_suite = (_hash_suite(p) for p in manifest_paths)
+        sizes_only = old_suite != new_suite
+        if sizes_only:
+            print(f"Warning: snapshots use different hash suites ({old_suite} vs {new_suite}), "
+                  f"comparing file sizes only\n")
+
+        counts = {ADDED: 0, REMOVED: 0, MODIFIED: 0}
+        added_bytes = removed_bytes = changed_bytes = truncated_bytes = 0
+
+        for status, path, old_size, new_size, ranges in diff_manifests(*manifest_paths, sizes_only):
+            counts[status] += 1
+            if status == ADDED:
+                added_bytes += new_size
+                print(f"{status} {path} (+{new_size} bytes)")
+            elif status == REMOVED:
+                removed_bytes += old_size
+                print(f"{status} {path} (-{old_size} bytes)")
+            else:
+                # Phần đuôi bị cắt không nằm trong ranges (ranges chỉ phủ file mới)
+                truncated = max(0, old_size - new_size)
+                changed = sum(end - start for start, end in ranges) + truncated
+                changed_bytes += changed
+                truncated_bytes += truncated
+                line = f"{status} {path} ({old_size} -> {new_size} bytes, {changed} bytes changed"
+                print(line + (f", {truncated} bytes truncated)" if truncated else ")"))
+                if show_ranges:
+                    for start, end in ranges:
+                        print(f"    [{start}, {end})")
+                    if truncated:
+                        print(f"    [{new_size}, {old_size}) truncated")
+
+        print(f"\nDiff {old_snapshot_id} -> {new_snapshot_id}")
+        print(f"Added: {counts[ADDED]} file(s), {added_bytes} bytes")
+        print(f"Removed: {counts[REMOVED]} file(s), {removed_bytes} bytes")
+        line = f"Modified: {counts[MODIFIED]} file(s), {changed_bytes} bytes changed"
+        print(line + (f" ({truncated_bytes} bytes truncated)" if truncated_bytes else ""))
+
+        return STATUS_OK
+
+    except Exception as e:
+        print("Diff error:", e)
+        return STATUS_FAIL
@@ -0,0 +1,163 @@
+import os
+import json
+import time
+import hashlib
+from collections import namedtuple
+from utils.constants import CHUNK_SIZE
+from utils.hash import get_hash_suite
+from core.manifest import iter_file_chunks
+
+# Chỉ mục file nguyên vẹn, nằm trong store/.file_index/
+# Mỗi entry là một file JSON tên <fingerprint>.json:
+#   {"size", "hash_suite", "digest", "chunks", "identities"}
+# fingerprint = sha256(size | SAMPLE_SIZE byte đầu | SAMPLE_SIZE byte cuối)
+# digest      = hash (theo hash suite) của danh sách chunk -> digest của toàn bộ nội dung file
+# identities  = các (dev, inode, size, mtime_ns, ctime_ns) đã xác nhận có đúng nội dung này
+FILE_INDEX_DIR = ".file_index"
+SAMPLE_SIZE = 64 * 1024
+
+# File nhỏ hơn một chunk đọc/hash đủ nhanh, không cần chỉ mục
+MIN_FILE_SIZE = CHUNK_SIZE
+
+# Số entry tối đa; vượt quá thì bỏ các entry lâu không dùng nhất (theo mtime của file entry)
+MAX_FILE_ENTRIES = 8192
+MAX_IDENTITIES = 16
+
+# File có mtime/ctime trong khoảng này trước lúc lấy fingerprint là "racy" (như racy entry của git):
+# filesystem timestamp thô (NFS, FAT, kernel cũ) -> lần ghi cùng tick không làm đổi identity
+RACY_MARGIN_NS = 2 * 10**9
+
+# checked_ns: thời điểm lấy fingerprint (trước khi đọc nội dung file)
+FileFingerprint = namedtuple("FileFingerprint", ["key", "size", "identity", "checked_ns"])
+
+
+def _file_digest(suite_name, chunks):
+    return get_hash_suite(suite_name).chunk_hash("".join(chunks).encode("ascii"))
+
+
+class FileIndex:
+    """
+    Chỉ mục fingerprint file -> danh sách chunk đã biết
+    File (ở bất kỳ đường dẫn nào) có fingerprint khớp và cùng identity đã được xác nhận
+    (hard link, file không đổi giữa các lần backup) dùng lại danh sách chunk mà không cần đọc lại.
+    Chỉ là gợi ý: entry hỏng/thiếu chỉ làm backup đi đường chậm
+    Ghi (save) phải được gọi khi đang giữ StoreLock.exclusive()
+    """
+
+    def __init__(self, store_path):
+        self.dir = os.path.join(store_path, FILE_INDEX_DIR)
+        self.entries = {}
+        self.dirty = set()
+        self.used = set()
+
+    def fingerprint(self, path):
+        """Fingerprint rẻ (đọc tối đa 2 * SAMPLE_SIZE byte), None nếu file nhỏ hoặc không đọc được"""
+        checked_ns = time.time_ns()
+        try:
+            with open(path, "rb") as f:
+                st = os.fstat(f.fileno())
+                if st.st_size < MIN_FILE_SIZE:
+                    return None
+                head = f.read(SAMPLE_SIZE)
+                f.seek(max(0, st.st_size - SAMPLE_SIZE))
+                tail = f.read(SAMPLE_SIZE)
+        except OSError:
+            return None
+        h = hashlib.sha256(st.st_size.to_bytes(8, "little"))
+        h.update(head)
+        h.update(tail)
+        identity = [st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns, st.st_ctime_ns]
+        return FileFingerprint(h.hexdigest(), st.st_size, identity, checked_ns)
+
+    def unchanged(self, path, fp):
+        """
+        Gọi sau khi đã đọc hết file: True nếu danh sách chunk vừa tính được phép record
+        - stat lại: identity phải giống lúc lấy fingerprint (file không bị ghi trong lúc đọc)
+        - mtime/ctime không được nằm trong RACY_MARGIN_NS trước lúc lấy fingerprint, nếu không
+          một lần ghi cùng tick timestamp có thể giữ nguyên identity mà đổi nội dung
+        """
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+        identity = [st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns, st.st_ctime_ns]
+        if identity != fp.identity:
+            return False
+        return max(st.st_mtime_ns, st.st_ctime_ns) < fp.checked_ns - RACY_MARGIN_NS
+
+    def _load(self, key):
+        if key in self.entries:
+            return self.entries[key]
+        entry = None
+        try:
+            with open(os.path.join(self.dir, f"{key}.json"), "r") as f:
+                entry = json.load(f)
+            if entry["digest"] != _file_digest(entry["hash_suite"], entry["chunks"]):
+                entry = None
+        except (OSError, ValueError, KeyError, TypeError):
+            entry = None
+        self.entries[key] = entry
+        return entry
+
+    def match(self, fp, suite_name):
+        """Danh sách chunk đã biết của file, None nếu chưa xác nhận được"""
+        entry = self._load(fp.key)
+        if (entry is None or entry["size"] != fp.size or entry["hash_suite"] != suite_name
+                or fp.identity not in entry["identities"]):
+            return None
+        self.used.add(fp.key)
+        return entry["chunks"]
+
+    def record(self, fp, suite_name, chunks):
+        """Ghi nhận danh sách chunk vừa tính cho file (trong RAM, ghi ra ở save())"""
+        digest = _file_digest(suite_name, chunks)
+        entry = self._load(fp.key)
+        if entry is None or entry["hash_suite"] != suite_name or entry["digest"] != digest:
+            entry = {"size": fp.size, "hash_suite": suite_name, "digest": digest,
+                     "chunks": list(chunks), "identities": []}
+            self.entries[fp.key] = entry
+        if fp.identity not in entry["identities"]:
+            entry["identities"] = (entry["identities"] + [fp.identity])[-MAX_IDENTITIES:]
+            self.dirty.add(fp.key)
+        self.used.add(fp.key)
+
+    def save(self):
+        """Ghi các entry mới/đổi (file tạm + rename), đánh dấu entry vừa dùng, evict nếu quá giới hạn"""
+        if not self.dirty and not self.used:
+            return
+        os.makedirs(self.dir, exist_ok=True)
+        for key in self.dirty:
+            path = os.path.join(self.dir, f"{key}.json")
+            with open(path + ".tmp", "w") as f:
+                json.dump(self.entries[key], f)
+            os.replace(path + ".tmp", path)
+        for key in self.used - self.dirty:
+            try:
+                os.utime(os.path.join(self.dir, f"{key}.json"))
+            except OSError:
+                pass
+        self.dirty = set()
+        self.used = set()
+
+        names = [n for n in os.listdir(self.dir) if n.endswith(".json")]
+        if len(names) > MAX_FILE_ENTRIES:
+            names.sort(key=lambda n: os.path.getmtime(os.path.join(self.dir, n)))
+            for name in names[:len(names) - MAX_FILE_ENTRIES]:
+                os.remove(os.path.join(self.dir, name))
+
+    def prune(self, live_chunks):
+        """Xoá các entry có chunk (khác 0) không còn trong store (sau khi xoá snapshot)"""
+        if not os.path.isdir(self.dir):
+            return
+        for name in os.listdir(self.dir):
+            if not name.endswith(".json"):
+                continue
+            entry = self._load(name[:-len(".json")])
+            if entry is None or not all(
+                    is_zero or h in live_chunks
+                    for h, _, _, is_zero in iter_file_chunks({"hash_suite": entry["hash_suite"]}, entry)):
+                try:
+                    os.remove(os.path.join(self.dir, name))
+                except FileNotFoundError:
+                    pass
+        self.entries = {}
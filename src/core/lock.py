@@ -0,0 +1,115 @@
+import os
+import fcntl
+from contextlib import contextmanager
+from utils.fs import ensure_dir
+
+# File khoá toàn store và thư mục chứa khoá của từng backup đang chạy
+# (bắt đầu bằng "." để không lẫn với snapshot directory)
+STORE_LOCK_FILE = ".lock"
+SNAPSHOT_LOCKS_DIR = ".locks"
+
+# Khoá của các job bảo trì chạy nền (scrub, tier, retention), mỗi job một file
+JOB_LOCKS_DIR = ".jobs"
+
+
+class StoreLock:
+    """
+    Quản lý khoá advisory (fcntl.flock) cho một store dùng chung giữa nhiều process
+
+    - exclusive(): khoá độc quyền toàn store, chỉ giữ trong critical section ngắn
+      (append roots.log, WAL COMMIT, rename temp directory) và khi cleanup
+    - acquire_snapshot(): khoá riêng cho temp directory của một backup đang chạy,
+      giữ suốt quá trình ghi chunk để các backup khác chạy song song
+    - is_active(): cleanup dùng để bỏ qua temp directory đang bị khoá
+    - acquire_job(): chỉ một job bảo trì cùng tên chạy trên store tại một thời điểm
+
+    Khoá tự nhả khi process bị kill nên không cần dọn khoá "treo"
+    """
+
+    def __init__(self, store_path):
+        self.store_path = store_path
+        self.lock_path = os.path.join(store_path, STORE_LOCK_FILE)
+        self.locks_dir = os.path.join(store_path, SNAPSHOT_LOCKS_DIR)
+        self.jobs_dir = os.path.join(store_path, JOB_LOCKS_DIR)
+
+    @contextmanager
+    def exclusive(self):
+        """Critical section độc quyền trên toàn store"""
+        ensure_dir(self.store_path)
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+    def _snapshot_lock_path(self, snap_id):
+        return os.path.join(self.locks_dir, f"{snap_id}.lock")
+
+    def acquire_snapshot(self, snap_id):
+        """
+        Khoá temp directory của snap_id
+        Trả về file descriptor, phải giữ đến khi gọi release_snapshot
+        """
+        ensure_dir(self.locks_dir)
+        fd = os.open(self._snapshot_lock_path(snap_id), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            raise RuntimeError(f"Snapshot {snap_id} is locked by another process")
+        return fd
+
+    def release_snapshot(self, snap_id, fd):
+        """Nhả khoá temp directory (xoá file khoá trước khi đóng fd)"""
+        try:
+            os.unlink(self._snapshot_lock_path(snap_id))
+        except FileNotFoundError:
+            pass
+        os.close(fd)
+
+    def acquire_job(self, name):
+        """
+        Khoá job bảo trì name (không chờ: job đang chạy ở process khác -> RuntimeError)
+        Trả về file descriptor, phải giữ đến khi gọi release_job
+        """
+        ensure_dir(self.jobs_dir)
+        fd = os.open(os.path.join(self.jobs_dir, f"{name}.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            raise RuntimeError(f"Job {name} is already running on this store")
+        return fd
+
+    def release_job(self, fd):
+        """
+        Nhả khoá job; file khoá được giữ lại (tên cố định, xoá đi thì process đang mở
+        file cũ và process tạo file mới có thể cùng lấy được khoá)
+        """
+        os.close(fd)
+
+    def is_active(self, snap_id):
+        """
+        Kiểm tra temp directory của snap_id có đang được một process khác giữ không
+        File khoá còn sót lại (process đã chết) sẽ được xoá luôn
+        """
+        path = self._snapshot_lock_path(snap_id)
+        try:
+            fd = os.open(path, os.O_RDWR)
+        except FileNotFoundError:
+            return False
+
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return True
+
+        # Lấy được khoá -> không ai giữ, file khoá là của process đã chết
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        os.close(fd)
+        return False
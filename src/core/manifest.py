@@ -0,0 +1,144 @@
+import re
+import json
+from utils.constants import CHUNK_SIZE
+from utils.hash import zero_chunk_hash, LEGACY_HASH_SUITE
+
+# snapshot_id: "<timestamp_ms>_<label>", label không chứa dấu phân cách thư mục hay khoảng trắng
+# (snapshot_id được ghép vào đường dẫn trong store và vào từng dòng của wal.log)
+_SNAPSHOT_ID = re.compile(r"[0-9]+_[^/\\\s]+")
+
+
+def is_valid_snapshot_id(snap_id):
+    return isinstance(snap_id, str) and _SNAPSHOT_ID.fullmatch(snap_id) is not None
+
+
+def normalize_file_path(path):
+    """
+    Chuẩn hoá đường dẫn tương đối của file trong snapshot về dạng "a/b/c"
+    ValueError nếu rỗng, tuyệt đối hoặc có thành phần ".." (restore sẽ ghi ra ngoài thư mục đích)
+    """
+    if not isinstance(path, str) or "\0" in path:
+        raise ValueError(f"Unsafe file path: {path!r}")
+    unified = path.replace("\\", "/")
+    parts = [p for p in unified.split("/") if p not in ("", ".")]
+    if unified.startswith("/") or re.match(r"[A-Za-z]:/", unified) or not parts or ".." in parts:
+        raise ValueError(f"Unsafe file path: {path!r}")
+    return "/".join(parts)
+
+
+def iter_file_chunks(manifest, file_info):
+    """
+    Duyệt các chunk của một file trong manifest
+    Yield (chunk_hash, offset, length, is_zero)
+
+    Chunk toàn byte 0 không được lưu thành file trong chunks/, nhận diện bằng
+    hash cố định của khối 0 cùng độ dài. Manifest cũ (không có "size") không
+    biết độ dài chunk nên length là None và không có chunk nào được coi là zero.
+    """
+    chunk_size = manifest.get("chunk_size", CHUNK_SIZE)
+    hash_suite = manifest.get("hash_suite", LEGACY_HASH_SUITE)
+    size = file_info.get("size")
+    offset = 0
+
+    for chunk_hash in file_info["chunks"]:
+        if size is None:
+            yield chunk_hash, None, None, False
+            continue
+
+        length = min(chunk_size, size - offset)
+        yield chunk_hash, offset, length, chunk_hash == zero_chunk_hash(length, hash_suite)
+        offset += length
+
+
+_WHITESPACE = " \t\r\n"
+_READ_BLOCK = 1024 * 1024
+
+
+class _StreamBuffer:
+    """Buffer trượt trên file text, chỉ giữ phần chưa parse"""
+
+    def __init__(self, f):
+        self.f = f
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        data = self.f.read(_READ_BLOCK)
+        if not data:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def skip_ws(self):
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf) or not self.fill():
+                return
+
+    def expect(self, chars):
+        self.skip_ws()
+        if self.pos >= len(self.buf) or self.buf[self.pos] not in chars:
+            raise ValueError(f"Invalid manifest: expected one of {chars!r}")
+        ch = self.buf[self.pos]
+        self.pos += 1
+        return ch
+
+    def peek(self):
+        self.skip_ws()
+        return self.buf[self.pos] if self.pos < len(self.buf) else ""
+
+    def decode(self, decoder):
+        """Decode một giá trị JSON, đọc thêm nếu giá trị bị cắt ở cuối buffer"""
+        self.skip_ws()
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.buf, self.pos)
+                # Số ở cuối buffer có thể còn chữ số chưa đọc
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            if not self.fill():
+                self.eof = True
+
+
+def iter_manifest_files(manifest_path, meta=None):
+    """
+    Đọc manifest dạng streaming, yield từng file_info trong mảng "files"
+    Bộ nhớ chỉ phụ thuộc kích thước một entry, không phụ thuộc số file
+    Nếu truyền meta (dict), các trường top-level khác (chunk_size, merkle_root, ...)
+    được ghi vào đó khi gặp
+    """
+    decoder = json.JSONDecoder()
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        stream = _StreamBuffer(f)
+        stream.expect("{")
+        if stream.peek() == "}":
+            return
+
+        while True:
+            key = stream.decode(decoder)
+            stream.expect(":")
+
+            if key == "files":
+                stream.expect("[")
+                if stream.peek() == "]":
+                    stream.pos += 1
+                else:
+                    while True:
+                        yield stream.decode(decoder)
+                        if stream.expect(",]") == "]":
+                            break
+            else:
+                value = stream.decode(decoder)
+                if meta is not None:
+                    meta[key] = value
+
+            if stream.expect(",}") == "}":
+                return
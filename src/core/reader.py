@@ -0,0 +1,252 @@
+import io
+import os
+import bisect
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from utils.constants import STATUS_OK, STATUS_FAIL, CHUNK_SIZE
+from utils.hash import get_hash_suite
+from core.wal import WAL
+from core.manifest import iter_manifest_files, iter_file_chunks
+from storage import read_chunk_file
+
+# Số chunk giải mã được giữ trong cache mặc định (chunk 1 MiB -> ~64 MiB)
+DEFAULT_CACHE_CHUNKS = 64
+
+# Khối 0 dùng chung: chunk toàn 0 được zero-fill thẳng vào buffer của caller, không cấp phát mỗi lần đọc
+_ZERO_BLOCK = memoryview(bytes(CHUNK_SIZE))
+
+
+class ChunkCache:
+    """
+    LRU cache các chunk đã đọc và kiểm tra hash, dùng chung cho mọi file của một snapshot
+    Có thể đọc trước (readahead) bằng một thread nền
+    """
+
+    def __init__(self, chunks_dir, capacity=DEFAULT_CACHE_CHUNKS, readahead=0, suite=None):
+        self.chunks_dir = chunks_dir
+        self.suite = suite or get_hash_suite()
+        self.capacity = max(1, capacity)
+        self.readahead = readahead
+        self.entries = OrderedDict()
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1) if readahead > 0 else None
+
+    def _load(self, chunk_hash):
+        try:
+            data = read_chunk_file(self.chunks_dir, chunk_hash)
+        except ValueError:
+            raise IOError(f"Corrupted chunk: {chunk_hash}")
+        if self.suite.chunk_hash(data) != chunk_hash:
+            raise IOError(f"Corrupted chunk: {chunk_hash}")
+        return data
+
+    def _put(self, chunk_hash, data):
+        with self.lock:
+            self.entries[chunk_hash] = data
+            self.entries.move_to_end(chunk_hash)
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+
+    def get(self, chunk_hash):
+        with self.lock:
+            data = self.entries.get(chunk_hash)
+            if data is not None:
+                self.entries.move_to_end(chunk_hash)
+                return data
+            future = self.pending.pop(chunk_hash, None)
+
+        data = future.result() if future is not None else self._load(chunk_hash)
+        self._put(chunk_hash, data)
+        return data
+
+    def prefetch(self, chunk_hashes):
+        """Đưa các chunk sắp đọc vào hàng đợi đọc trước"""
+        if self.executor is None:
+            return
+        with self.lock:
+            # Chunk đọc trước nhưng không được dùng (do seek đi chỗ khác) -> bỏ
+            if len(self.pending) >= self.readahead * 4:
+                self.pending.clear()
+            for chunk_hash in chunk_hashes[:self.readahead]:
+                if chunk_hash not in self.entries and chunk_hash not in self.pending:
+                    self.pending[chunk_hash] = self.executor.submit(self._load, chunk_hash)
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+        self.entries.clear()
+        self.pending.clear()
+
+
+class SnapshotFile(io.RawIOBase):
+    """
+    File-like object chỉ đọc trên danh sách chunk của một file trong snapshot
+    Vị trí -> chunk tìm bằng bisect trên prefix sum kích thước chunk
+    """
+
+    def __init__(self, cache, chunks, size):
+        super().__init__()
+        self.cache = cache
+        self.hashes = [c[0] for c in chunks]
+        self.starts = [c[1] for c in chunks]
+        self.zero = [c[2] for c in chunks]
+        self.lengths = [c[3] for c in chunks]
+        self.size = size
+        self.pos = 0
+        self.last_chunk = None
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self.pos + offset
+        elif whence == io.SEEK_END:
+            pos = self.size + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+        if pos < 0:
+            raise ValueError("Negative seek position")
+        self.pos = pos
+        return pos
+
+    def _chunk_data(self, i):
+        # Đọc tuần tự -> đọc trước các chunk tiếp theo
+        if self.last_chunk == i - 1 and self.cache.readahead:
+            end = min(len(self.hashes), i + 1 + self.cache.readahead)
+            self.cache.prefetch([self.hashes[j] for j in range(i + 1, end) if not self.zero[j]])
+        self.last_chunk = i
+        return self.cache.get(self.hashes[i])
+
+    def readinto(self, buffer):
+        if self.pos >= self.size:
+            return 0
+
+        i = bisect.bisect_right(self.starts, self.pos) - 1
+        start = self.pos - self.starts[i]
+        if self.zero[i]:
+            n = min(len(buffer), self.lengths[i] - start)
+            view = memoryview(buffer).cast("B")
+            done = 0
+            while done < n:
+                step = min(n - done, len(_ZERO_BLOCK))
+                view[done:done + step] = _ZERO_BLOCK[:step]
+                done += step
+        else:
+            data = self._chunk_data(i)
+            n = min(len(buffer), len(data) - start)
+            buffer[:n] = data[start:start + n]
+        self.pos += n
+        return n
+
+
+class SnapshotReader:
+    """
+    Đọc trực tiếp file trong snapshot mà không cần restore toàn bộ
+
+        with SnapshotReader(snap_id, "store") as snap:
+            with snap.open("logs/app.log") as f:
+                f.seek(1 << 20)
+                data = f.read(4096)
+    """
+
+    def __init__(self, snapshot_id, store_path, cache_chunks=DEFAULT_CACHE_CHUNKS, readahead=0):
+        snap_dir = os.path.join(store_path, snapshot_id)
+        self.manifest_path = os.path.join(snap_dir, "manifest.json")
+
+        wal = WAL(os.path.join(store_path, "wal.log"))
+        if not wal.is_committed(snapshot_id) or not os.path.exists(self.manifest_path):
+            raise FileNotFoundError(f"Snapshot not found or not committed: {snapshot_id}")
+
+        # Đọc phần đầu manifest (các trường đứng trước "files") để biết hash suite
+        meta = {}
+        next(iter_manifest_files(self.manifest_path, meta), None)
+        suite = get_hash_suite(meta.get("hash_suite"))
+        
+        self.chunks_dir = os.path.join(snap_dir, "chunks")
+        self.cache = ChunkCache(self.chunks_dir, cache_chunks, readahead, suite)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.cache.close()
+
+    def list(self, prefix=""):
+        """Duyệt (path, size) các file có path bắt đầu bằng prefix (streaming manifest)"""
+        meta = {}
+        for file_info in iter_manifest_files(self.manifest_path, meta):
+            if file_info["path"].startswith(prefix):
+                size = file_info.get("size")
+                if size is None:
+                    size = self._chunk_layout(meta, file_info)[1]
+                yield file_info["path"], size
+
+    def _chunk_layout(self, meta, file_info):
+        """Danh sách (hash, offset, is_zero, length) và kích thước file"""
+        chunks = []
+        offset = 0
+        for chunk_hash, _, length, is_zero in iter_file_chunks(meta, file_info):
+            # Manifest cũ không có size -> lấy độ dài từ file chunk
+            if length is None:
+                length = len(read_chunk_file(self.chunks_dir, chunk_hash))
+            chunks.append((chunk_hash, offset, is_zero, length))
+            offset += length
+        return chunks, offset
+
+    def open(self, path):
+        """Mở file trong snapshot, trả về file-like object hỗ trợ seek/read"""
+        meta = {}
+        for file_info in iter_manifest_files(self.manifest_path, meta):
+            if file_info["path"] == path:
+                chunks, size = self._chunk_layout(meta, file_info)
+                return io.BufferedReader(SnapshotFile(self.cache, chunks, size))
+            # Manifest đã sort theo path -> dừng sớm
+            if file_info["path"] > path:
+                break
+        raise FileNotFoundError(f"File not found in snapshot: {path}")
+
+
+def ls_snapshot(snapshot_id, store_path, prefix=""):
+    """Liệt kê file trong snapshot"""
+    try:
+        with SnapshotReader(snapshot_id, store_path) as snap:
+            count = 0
+            for path, size in snap.list(prefix):
+                print(f"{size:>12}  {path}")
+                count += 1
+        print(f"\n{count} file(s)")
+        return STATUS_OK
+    except Exception as e:
+        print("List error:", e)
+        return STATUS_FAIL
+
+
+def cat_snapshot_file(snapshot_id, store_path, path, out, readahead=4):
+    """Stream nội dung một file trong snapshot ra out (không restore)"""
+    try:
+        with SnapshotReader(snapshot_id, store_path, readahead=readahead) as snap:
+            with snap.open(path) as f:
+                while True:
+                    data = f.read(1024 * 1024)
+                    if not data:
+                        break
+                    out.write(data)
+        out.flush()
+        return STATUS_OK
+    except Exception as e:
+        print("Cat error:", e)
+        return STATUS_FAIL
@@ -13,52 +13,101 @@ import json
 from utils.constants import STATUS_OK, STATUS_FAIL
 from utils.fs import ensure_dir, write_file
 from core.verify import verify
+from core.manifest import iter_file_chunks
+from storage import LocalBackend
+from storage.tiers import record_access
 
-def restore(snapshot_id, store_path, target_path):
+def _chunk_stream(backend, snapshot_id, manifest, files):
+    """
+    Dữ liệu các chunk (khác 0) của files theo đúng thứ tự ghi ra
+    Một stream duy nhất cho cả snapshot để backend tải trước qua ranh giới file
+    """
+    hashes = (chunk_hash for file_info in files
+              for chunk_hash, _, _, is_zero in iter_file_chunks(manifest, file_info) if not is_zero)
+    for chunk_hash, data in backend.get_chunks(snapshot_id, hashes):
+        if data is None:
+            raise IOError(f"Missing chunk: {chunk_hash}")
+        yield data
+
+
+def _stream_file(manifest, file_info, chunk_data, out):
+    """Ghi nội dung một file ra stream (stdout), mỗi lần tối đa một chunk"""
+    for chunk_hash, _, length, is_zero in iter_file_chunks(manifest, file_info):
+        out.write(bytes(length) if is_zero else next(chunk_data))
+    out.flush()
+
+
+def restore(snapshot_id, store_path, target_path, out=None, file_path=None, backend=None):
+    """
+    Restore snapshot vào target_path
+    Nếu truyền out (ví dụ stdout), chỉ stream một file (file_path, hoặc file duy nhất
+    của snapshot backup từ stdin) ra out thay vì ghi ra thư mục
+    Chunk và manifest được đọc qua backend (mặc định filesystem cục bộ tại store_path)
+    """
     try:
+        if backend is None:
+            backend = LocalBackend(store_path)
+        
         # Bước 1: Verify trước khi restore
         print("Verifying snapshot before restore...")
-        verify_status = verify(snapshot_id, store_path)
+        verify_status = verify(snapshot_id, store_path, backend, track_access=False)
         
         if verify_status == STATUS_FAIL:
             print("Snapshot verification failed. Restore aborted.")
             return STATUS_FAIL
         
         print("Snapshot verified successfully. Starting restore...")
+        record_access(store_path, snapshot_id, "restore")
         
         # Bước 2: Đọc manifest
-        snap_dir = os.path.join(store_path, snapshot_id)
-        manifest_path = os.path.join(snap_dir, "manifest.json")
+        manifest = json.loads(backend.get_manifest(snapshot_id))
         
-        with open(manifest_path, "r") as f:
-            manifest = json.load(f)
+        # Stream một file ra out (restore về stdout)
+        if out is not None:
+            files = manifest["files"]
+            if file_path is not None:
+                files = [fi for fi in files if fi["path"] == file_path]
+            if len(files) != 1:
+                print(f"Cannot select a single file to stream ({len(files)} candidate(s)); use --name")
+                return STATUS_FAIL
+            _stream_file(manifest, files[0], _chunk_stream(backend, snapshot_id, manifest, files), out)
+            print(f"Restored to stdout: {files[0]['path']}")
+            return STATUS_OK
         
         # Bước 3: Tạo target directory
         ensure_dir(target_path)
+        target_root = os.path.realpath(target_path)
         
         # Bước 4: Restore từng file
-        chunks_dir = os.path.join(snap_dir, "chunks")
+        chunk_data = _chunk_stream(backend, snapshot_id, manifest, manifest["files"])
         
         for file_info in manifest["files"]:
             rel_path = file_info["path"]
             target_file_path = os.path.join(target_path, rel_path)
             
+            # Manifest (import từ archive, snapshot cũ) không được ghi ra ngoài thư mục đích
+            real_path = os.path.realpath(target_file_path)
+            if os.path.commonpath([target_root, real_path]) != target_root or real_path == target_root:
+                print(f"Unsafe path in snapshot, restore aborted: {rel_path}")
+                return STATUS_FAIL
+            
             # Tạo thư mục cha nếu cần
             target_file_dir = os.path.dirname(target_file_path)
             if target_file_dir:
                 ensure_dir(target_file_dir)
             
-            # Ghép các chunks lại thành file
-            file_data = b""
-            for chunk_hash in file_info["chunks"]:
-                chunk_path = os.path.join(chunks_dir, f"{chunk_hash}.chunk")
+            # Ghép các chunks lại thành file, ghi từng chunk (không gom cả file vào RAM)
+            # Chunk toàn 0 được tạo lại thành hole bằng seek thay vì ghi byte 0
+            with open(target_file_path, "wb") as out:
+                for chunk_hash, _, length, is_zero in iter_file_chunks(manifest, file_info):
+                    if is_zero:
+                        out.seek(length, os.SEEK_CUR)
+                        continue
+                    out.write(next(chunk_data))
                 
-                with open(chunk_path, "rb") as f:
-                    file_data += f.read()
-            
-            # Ghi file
-            with open(target_file_path, "wb") as f:
-                f.write(file_data)
+                # Đặt đúng kích thước (hole ở cuối file chỉ là seek, chưa ghi gì)
+                if "size" in file_info:
+                    out.truncate(file_info["size"])
             
             print(f"Restored: {rel_path}")
         
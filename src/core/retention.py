@@ -0,0 +1,247 @@
+import os
+import time
+import datetime
+from utils.constants import STATUS_OK, STATUS_FAIL
+from utils.fs import remove_dir
+from core.wal import WAL
+from core.lock import StoreLock
+from core.rollback import RollbackProtector
+from core.chunk_index import ChunkIndex
+from core.similarity import SketchIndex
+from core.file_index import FileIndex
+from core.tiering import TIER_JOB, hot_chunk_files, snapshot_chunks, sweep_cold
+from storage.tiers import ColdTier, load_tier_config, write_cold_index
+
+# Khoá job xoá snapshot (chỉ một lượt prune trên một store tại một thời điểm)
+RETENTION_JOB = "retention"
+
+
+def _week(t):
+    year, week, _ = datetime.date(t.tm_year, t.tm_mon, t.tm_mday).isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+# Quy tắc theo khoảng thời gian: giữ snapshot mới nhất của mỗi khoảng (giờ địa phương)
+PERIOD_RULES = (
+    ("hourly", lambda t: time.strftime("%Y-%m-%d %H", t)),
+    ("daily", lambda t: time.strftime("%Y-%m-%d", t)),
+    ("weekly", _week),
+    ("monthly", lambda t: time.strftime("%Y-%m", t)),
+)
+
+
+def snapshot_time(snap_id):
+    """Thời điểm tạo snapshot (ms) lấy từ snapshot_id "<timestamp_ms>_<label>", None nếu không có"""
+    prefix = snap_id.split("_", 1)[0]
+    return int(prefix) if prefix.isdigit() else None
+
+
+def select_snapshots(snapshots, latest=None, keep_last=0, keep_hourly=0, keep_daily=0,
+                     keep_weekly=0, keep_monthly=0):
+    """
+    Áp quy tắc giữ lại lên các snapshot đã commit trong WAL
+    - keep_last: N snapshot mới nhất
+    - keep_hourly/daily/weekly/monthly: snapshot mới nhất của mỗi khoảng, cho N khoảng gần nhất có snapshot
+    Snapshot latest (COMMIT cuối trong WAL, verify chống rollback dựa vào nó) và snapshot
+    không đọc được thời điểm luôn được giữ
+    Trả về {snap_id: [lý do giữ]}; snapshot không có trong kết quả sẽ bị xoá
+    """
+    ordered = sorted(snapshots, key=lambda s: (snapshot_time(s) or 0, s), reverse=True)
+    keep = {}
+
+    for snap_id in ordered[:max(keep_last, 0)]:
+        keep.setdefault(snap_id, []).append("last")
+
+    counts = {"hourly": keep_hourly, "daily": keep_daily, "weekly": keep_weekly, "monthly": keep_monthly}
+    for name, period in PERIOD_RULES:
+        if counts[name] <= 0:
+            continue
+        seen = set()
+        for snap_id in ordered:
+            ts = snapshot_time(snap_id)
+            if ts is None:
+                continue
+            key = period(time.localtime(ts / 1000))
+            if key in seen:
+                continue
+            seen.add(key)
+            keep.setdefault(snap_id, []).append(name)
+            if len(seen) >= counts[name]:
+                break
+
+    for snap_id in ordered:
+        if snapshot_time(snap_id) is None:
+            keep.setdefault(snap_id, []).append("no timestamp")
+    if latest is not None:
+        keep.setdefault(latest, []).append("latest")
+    return keep
+
+
+def _reclaimable(store_path, dropped):
+    """Số byte giải phóng khi xoá các thư mục snapshot: file mà mọi hard link đều nằm trong đó"""
+    links = {}
+    for snap_id in dropped:
+        for base, _, files in os.walk(os.path.join(store_path, snap_id)):
+            for name in files:
+                try:
+                    st = os.lstat(os.path.join(base, name))
+                except FileNotFoundError:
+                    continue
+                entry = links.setdefault((st.st_dev, st.st_ino), [0, st.st_nlink, st.st_size])
+                entry[0] += 1
+    return sum(size for seen, nlink, size in links.values() if seen >= nlink)
+
+
+def _mark(store_path, survivors, cold):
+    """
+    Một lượt streaming qua manifest các snapshot còn lại
+    Trả về ({chunk_hash: snapshot mới nhất giữ chunk}, {merkle_root})
+    """
+    owners = {}
+    live_roots = set()
+    for snap_id in survivors:
+        meta = {}
+        hot_files = hot_chunk_files(os.path.join(store_path, snap_id, "chunks"))
+        for chunk_hash in snapshot_chunks(store_path, snap_id, cold, hot_files, meta):
+            owners[chunk_hash] = snap_id
+        if meta.get("merkle_root"):
+            live_roots.add(meta["merkle_root"])
+    return owners, live_roots
+
+
+def prune(store_path, dropped, dry_run=False):
+    """
+    Xoá một lô snapshot trong một lượt
+
+    1. Mark: streaming manifest các snapshot còn lại một lần -> tập chunk còn sống
+    2. Commit: viết lại roots.log rồi wal.log (file tạm + fsync + rename) bỏ các snapshot bị xoá.
+       Crash sau bước này: snapshot không còn COMMIT -> cleanup tự xoá thư mục còn sót
+    3. Sweep: xoá thư mục snapshot (chunk hard link chỉ được giải phóng khi không snapshot nào
+       còn giữ), chunk ở tier lạnh không còn sống, rồi dựng lại chỉ mục chunk/sketch/file
+    dry_run: chỉ báo số byte sẽ giải phóng
+    Backup chạy song song vẫn ghi chunk bình thường, chỉ bước commit của nó phải chờ
+    """
+    store_lock = StoreLock(store_path)
+    lock_fd = None
+    tier_fd = None
+
+    try:
+        if not os.path.exists(store_path):
+            print("Store directory not found")
+            return STATUS_FAIL
+
+        if not dry_run:
+            lock_fd = store_lock.acquire_job(RETENTION_JOB)
+
+        config = load_tier_config(store_path)
+        cold = None
+        if config.get("cold_dir"):
+            # Không chạy song song với job phân tầng (cùng sửa chỉ mục tier lạnh)
+            if not dry_run:
+                tier_fd = store_lock.acquire_job(TIER_JOB)
+            cold = ColdTier(store_path, config["cold_dir"])
+
+        with store_lock.exclusive():
+            wal = WAL(os.path.join(store_path, "wal.log"))
+            committed = wal.get_committed_snapshots()
+            dropped = sorted(set(dropped) & committed)
+            if wal.get_latest_committed_snapshot() in dropped:
+                print("Cannot delete the latest snapshot (rollback protection)")
+                return STATUS_FAIL
+            survivors = sorted(s for s in committed - set(dropped)
+                               if os.path.exists(os.path.join(store_path, s, "manifest.json")))
+
+            owners, live_roots = _mark(store_path, survivors, cold)
+
+            cold_entries = cold.entries() if cold is not None else {}
+            live_cold = {d: k for d, k in cold_entries.items() if d.hex() in owners}
+            reclaimed = _reclaimable(store_path, dropped)
+            for digest, kind in cold_entries.items():
+                if digest not in live_cold:
+                    try:
+                        reclaimed += os.path.getsize(cold.path(digest.hex(), kind))
+                    except FileNotFoundError:
+                        pass
+
+            if dry_run:
+                print(f"Dry run: {len(dropped)} snapshot(s) would be deleted, "
+                      f"{len(survivors)} kept, {reclaimed} bytes reclaimable")
+                return STATUS_OK
+
+            # Commit: sau bước này các snapshot bị xoá không còn hợp lệ
+            roots_dropped = RollbackProtector(os.path.join(store_path, "roots.log")).compact(live_roots)
+            wal_dropped = wal.compact(set(dropped), store_lock.is_active)
+
+            # Sweep
+            for snap_id in dropped:
+                remove_dir(os.path.join(store_path, snap_id))
+            if cold is not None and len(live_cold) != len(cold_entries):
+                write_cold_index(store_path, live_cold)
+                sweep_cold(cold.cold_dir, live_cold)
+
+            # Chỉ mục chỉ là gợi ý: lỗi ở đây không làm hỏng store
+            try:
+                ChunkIndex(store_path).rebuild(owners)
+                SketchIndex(store_path).prune(owners)
+                FileIndex(store_path).prune(owners)
+            except Exception as index_error:
+                print(f"Warning: Failed to rebuild indexes: {index_error}")
+
+        for snap_id in dropped:
+            print(f"Deleted snapshot: {snap_id}")
+        print(f"Pruned {len(dropped)} snapshot(s), {len(survivors)} kept, {reclaimed} bytes reclaimed")
+        print(f"Compacted wal.log ({wal_dropped} line(s) removed) and roots.log ({roots_dropped} line(s) removed)")
+        return STATUS_OK
+
+    except Exception as e:
+        print("Prune error:", e)
+        return STATUS_FAIL
+
+    finally:
+        if tier_fd is not None:
+            store_lock.release_job(tier_fd)
+        if lock_fd is not None:
+            store_lock.release_job(lock_fd)
+
+
+def purge(store_path, keep_last=0, keep_hourly=0, keep_daily=0, keep_weekly=0, keep_monthly=0,
+          dry_run=False):
+    """Xoá mọi snapshot không được quy tắc giữ lại nào chọn (xem select_snapshots) trong một lượt prune"""
+    try:
+        if not any((keep_last, keep_hourly, keep_daily, keep_weekly, keep_monthly)):
+            print("No retention rules given (use --keep-last/--keep-hourly/--keep-daily/"
+                  "--keep-weekly/--keep-monthly)")
+            return STATUS_FAIL
+        if not os.path.exists(store_path):
+            print("Store directory not found")
+            return STATUS_FAIL
+
+        wal = WAL(os.path.join(store_path, "wal.log"))
+        committed = wal.get_committed_snapshots()
+        keep = select_snapshots(committed, wal.get_latest_committed_snapshot(), keep_last,
+                                keep_hourly, keep_daily, keep_weekly, keep_monthly)
+
+        for snap_id in sorted(committed, key=lambda s: (snapshot_time(s) or 0, s), reverse=True):
+            if snap_id in keep:
+                print(f"  keep   {snap_id} ({', '.join(keep[snap_id])})")
+            else:
+                print(f"  delete {snap_id}")
+
+        dropped = [s for s in committed if s not in keep]
+        if not dropped:
+            print("Nothing to prune")
+            return STATUS_OK
+        return prune(store_path, dropped, dry_run)
+
+    except Exception as e:
+        print("Purge error:", e)
+        return STATUS_FAIL
+
+
+def delete_snapshot(store_path, snapshot_id, dry_run=False):
+    """Xoá một snapshot (cùng đường prune với purge)"""
+    wal = WAL(os.path.join(store_path, "wal.log"))
+    if not wal.is_committed(snapshot_id):
+        print(f"Snapshot not found: {snapshot_id}")
+        return STATUS_FAIL
+    return prune(store_path, [snapshot_id], dry_run)
@@ -1,23 +1,32 @@
 import os
 from utils.constants import STATUS_OK, STATUS_FAIL
+from utils.hash import LEGACY_HASH_SUITE
 
 class RollbackProtector:
     def __init__(self, path):
         self.path = path
 
-    def append_root(self, root_hash: str):
-        """Ghi root mới (chỉ append)"""
+    def append_root(self, root_hash: str, hash_suite: str = LEGACY_HASH_SUITE):
+        """
+        Ghi root mới (chỉ append): "index root [hash_suite]"
+        Suite legacy không ghi cột thứ ba để giữ nguyên định dạng cũ
+        """
+        # Index tăng dần, không dùng lại kể cả sau khi compact bỏ bớt dòng
         index = 1
         if os.path.exists(self.path):
             with open(self.path, "r") as f:
                 lines = f.readlines()
-            index = len(lines) + 1
+            if lines and lines[-1].split():
+                index = int(lines[-1].split()[0]) + 1
 
         with open(self.path, "a") as f:
-            f.write(f"{index} {root_hash}\n")
+            if hash_suite == LEGACY_HASH_SUITE:
+                f.write(f"{index} {root_hash}\n")
+            else:
+                f.write(f"{index} {root_hash} {hash_suite}\n")
 
     def load_roots(self):
-        """Đọc toàn bộ root chain"""
+        """Đọc toàn bộ root chain: [(index, root, hash_suite)]"""
         roots = []
         if not os.path.exists(self.path):
             return roots
@@ -25,27 +34,59 @@ class RollbackProtector:
         with open(self.path, "r") as f:
             for line in f:
                 parts = line.strip().split()
-                if len(parts) != 2:
+                if len(parts) == 2:
+                    parts.append(LEGACY_HASH_SUITE)
+                if len(parts) != 3:
                     raise ValueError("Invalid roots.log format")
-                idx, root = parts
-                roots.append((int(idx), root))
+                idx, root, hash_suite = parts
+                roots.append((int(idx), root, hash_suite))
         return roots
 
-    def verify_root(self, root_hash: str):
+    def compact(self, live_roots):
+        """
+        Viết lại roots.log chỉ giữ root của các snapshot còn sống (live_roots) và dòng cuối
+        (root mà verify so sánh), index giữ nguyên. File tạm + fsync + rename,
+        phải gọi khi đang giữ StoreLock.exclusive()
+        Trả về số dòng đã bỏ
+        """
+        if not os.path.exists(self.path):
+            return 0
+
+        with open(self.path, "r") as f:
+            lines = [line for line in f if line.strip()]
+        kept = [line for i, line in enumerate(lines)
+                if i == len(lines) - 1 or line.split()[1] in live_roots]
+
+        if len(kept) == len(lines):
+            return 0
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.writelines(line if line.endswith("\n") else line + "\n" for line in kept)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        return len(lines) - len(kept)
+
+    def verify_root(self, root_hash: str, hash_suite: str = LEGACY_HASH_SUITE):
         """
         Kiểm tra root có hợp lệ không:
         - root phải tồn tại
         - root phải là root cuối cùng (chống rollback)
+        - suite ghi trong roots.log phải khớp suite của manifest (chống hạ cấp thuật toán)
         """
         roots = self.load_roots()
 
         if not roots:
             return STATUS_FAIL
 
-        last_idx, last_root = roots[-1]
+        last_idx, last_root, last_suite = roots[-1]
 
         if root_hash != last_root:
             print("Rollback detected!")
             return STATUS_FAIL
 
+        if hash_suite != last_suite:
+            print(f"Hash suite mismatch: manifest {hash_suite}, roots.log {last_suite}")
+            return STATUS_FAIL
+
         return STATUS_OK
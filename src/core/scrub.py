@@ -0,0 +1,270 @@
+import os
+import json
+import time
+import fcntl
+import struct
+from utils.constants import STATUS_OK, STATUS_FAIL
+from utils.fs import ensure_dir
+from utils.hash import get_hash_suite
+from utils.throttle import Throttle
+from core.wal import WAL
+from core.lock import StoreLock
+from core.manifest import iter_manifest_files, iter_file_chunks
+from storage import read_chunk_file, chunk_file_path
+
+# Trạng thái job scrub (checkpoint) nằm trong thư mục ẩn của store
+SCRUB_DIR = ".scrub"
+SCRUB_STATE = "state.json"
+# Kế hoạch quét của lượt đang chạy (dùng lại khi resume nếu tập snapshot không đổi)
+SCRUB_PLAN = "plan.json"
+
+# Tên khoá job (StoreLock.acquire_job)
+SCRUB_JOB = "scrub"
+
+# Ghi checkpoint sau mỗi khoảng thời gian này (giây)
+CHECKPOINT_INTERVAL = 5.0
+
+# ioctl FIEMAP (Linux): lấy vị trí vật lý extent đầu tiên của file
+_FS_IOC_FIEMAP = 0xC020660B
+_FIEMAP_HEADER = struct.Struct("=QQLLLL")
+_FIEMAP_EXTENT = struct.Struct("=QQQQQLLLL")
+
+
+def _physical_offset(path):
+    """Vị trí byte vật lý của extent đầu tiên (None nếu filesystem không hỗ trợ FIEMAP)"""
+    buf = bytearray(_FIEMAP_HEADER.pack(0, 0xFFFFFFFFFFFFFFFF, 0, 0, 1, 0)
+                    + bytes(_FIEMAP_EXTENT.size))
+    try:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            fcntl.ioctl(fd, _FS_IOC_FIEMAP, buf)
+        finally:
+            os.close(fd)
+    except OSError:
+        return None
+    if _FIEMAP_HEADER.unpack_from(buf)[3] == 0:
+        return None
+    # Một số filesystem (overlay, tmpfs, inline data) trả về 0 -> coi như không biết
+    return _FIEMAP_EXTENT.unpack_from(buf, _FIEMAP_HEADER.size)[1] or None
+
+
+def _load_state(state_path):
+    try:
+        with open(state_path, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _save_state(state_path, state):
+    """Ghi checkpoint atomic (file tạm + rename)"""
+    tmp_path = state_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, state_path)
+
+
+def _build_plan(store_path, snapshots):
+    """
+    Gom tham chiếu chunk của mọi manifest thành các chunk vật lý duy nhất
+    Chunk hard link giữa nhiều snapshot là một file (cùng dev/inode) -> chỉ hash một lần
+    Trả về (plan đã sort theo vị trí vật lý, danh sách chunk thiếu)
+    plan: [(key, path, chunk_hash, suite, [snap_id, ...], chunks_dir)]
+    (path có thể nằm ở tier lạnh, chunks_dir là thư mục chunks của snapshot đầu tiên tham chiếu)
+    """
+    physical = {}
+    missing = {}
+
+    for snap_id in snapshots:
+        manifest_path = os.path.join(store_path, snap_id, "manifest.json")
+        chunks_dir = os.path.join(store_path, snap_id, "chunks")
+        meta = {}
+        seen = set()
+        for file_info in iter_manifest_files(manifest_path, meta):
+            for chunk_hash, _, _, is_zero in iter_file_chunks(meta, file_info):
+                if is_zero or chunk_hash in seen:
+                    continue
+                seen.add(chunk_hash)
+
+                path = chunk_file_path(chunks_dir, chunk_hash)
+                try:
+                    st = os.stat(path or os.path.join(chunks_dir, f"{chunk_hash}.chunk"))
+                except FileNotFoundError:
+                    missing.setdefault(chunk_hash, []).append(snap_id)
+                    continue
+
+                entry = physical.get((st.st_dev, st.st_ino))
+                if entry is None:
+                    entry = [path, chunk_hash, meta.get("hash_suite"), [], chunks_dir]
+                    physical[(st.st_dev, st.st_ino)] = entry
+                entry[3].append(snap_id)
+
+    # Sort theo vị trí vật lý trên đĩa (không có FIEMAP thì theo thứ tự inode)
+    plan = []
+    for (dev, ino), (path, chunk_hash, suite, snaps, chunks_dir) in physical.items():
+        offset = _physical_offset(path)
+        key = [dev, 0 if offset is not None else 1, offset if offset is not None else ino, ino]
+        plan.append((key, path, chunk_hash, suite, snaps, chunks_dir))
+    plan.sort(key=lambda item: item[0])
+    return plan, missing
+
+
+def _affected_files(store_path, bad):
+    """Lượt streaming cuối qua manifest các snapshot bị ảnh hưởng: {snap_id: {hash: [path]}}"""
+    wanted = {}
+    for chunk_hash, _, snaps in bad:
+        for snap_id in snaps:
+            wanted.setdefault(snap_id, set()).add(chunk_hash)
+
+    affected = {}
+    for snap_id, hashes in wanted.items():
+        manifest_path = os.path.join(store_path, snap_id, "manifest.json")
+        files = affected.setdefault(snap_id, {})
+        try:
+            for file_info in iter_manifest_files(manifest_path):
+                for chunk_hash in set(file_info["chunks"]) & hashes:
+                    files.setdefault(chunk_hash, []).append(file_info["path"])
+        except FileNotFoundError:
+            pass
+    return affected
+
+
+def scrub(store_path, rate=None, time_limit=None, restart=False, throttle=None):
+    """
+    Kiểm tra toàn vẹn toàn store: mỗi chunk vật lý duy nhất của mọi snapshot đã commit
+    được đọc và hash đúng một lần, theo thứ tự vật lý trên đĩa
+
+    - rate: giới hạn tốc độ đọc (bytes/s), None = không giới hạn
+    - throttle: utils.throttle.Throttle dùng thay cho rate (IOPS, adaptive, idle)
+    - time_limit: chạy tối đa số giây này rồi lưu checkpoint và dừng (chạy tiếp ở lần sau)
+    - restart: bỏ checkpoint cũ, quét lại từ đầu
+
+    Tiến độ và các chunk lỗi đã tìm thấy được checkpoint vào store/.scrub/state.json,
+    lần chạy sau tiếp tục sau chunk cuối đã kiểm tra. Chunk mới xuất hiện phía trước
+    checkpoint sẽ được kiểm tra ở lượt quét kế tiếp.
+    Kế hoạch đã sort được lưu vào store/.scrub/plan.json: lần resume dùng lại nếu tập snapshot
+    đã commit không đổi, không phải stat + FIEMAP lại toàn store mỗi cửa sổ --time-limit.
+    """
+    store_lock = StoreLock(store_path)
+    lock_fd = None
+
+    try:
+        if not os.path.exists(store_path):
+            print("Store directory not found")
+            return STATUS_FAIL
+
+        # Chỉ một job scrub trên một store tại một thời điểm
+        lock_fd = store_lock.acquire_job(SCRUB_JOB)
+
+        scrub_dir = os.path.join(store_path, SCRUB_DIR)
+        ensure_dir(scrub_dir)
+        state_path = os.path.join(scrub_dir, SCRUB_STATE)
+
+        state = None if restart else _load_state(state_path)
+        resuming = state is not None and not state.get("completed")
+        if resuming:
+            print(f"Resuming scrub after {state['chunks']} chunk(s)")
+        else:
+            state = {"started": int(time.time() * 1000), "last_key": None,
+                     "chunks": 0, "bytes": 0, "bad": [], "completed": False}
+
+        wal = WAL(os.path.join(store_path, "wal.log"))
+        snapshots = sorted(s for s in wal.get_committed_snapshots()
+                           if os.path.exists(os.path.join(store_path, s, "manifest.json")))
+
+        plan_path = os.path.join(scrub_dir, SCRUB_PLAN)
+        cached = _load_state(plan_path) if resuming else None
+        if cached is not None and cached.get("snapshots") == snapshots:
+            plan, missing = cached["plan"], cached["missing"]
+        else:
+            plan, missing = _build_plan(store_path, snapshots)
+            _save_state(plan_path, {"snapshots": snapshots, "plan": plan, "missing": missing})
+
+        bad = {chunk_hash: (reason, snaps) for chunk_hash, reason, snaps in state["bad"]}
+        for chunk_hash, snaps in missing.items():
+            bad[chunk_hash] = ("missing", snaps)
+
+        # Chỉ báo thông lượng khi có giới hạn I/O (rate, IOPS, adaptive hoặc idle)
+        limited = throttle is not None or bool(rate)
+        if throttle is None:
+            throttle = Throttle(rate)
+        started = time.monotonic()
+        last_checkpoint = started
+        last_key = state["last_key"]
+        finished = True
+
+        for key, path, chunk_hash, suite, snaps, chunks_dir in plan:
+            if last_key is not None and key <= last_key:
+                continue
+
+            if time_limit is not None and time.monotonic() - started >= time_limit:
+                finished = False
+                break
+
+            try:
+                # Chunk delta được giải mã qua chuỗi base -> luôn hash nội dung thật
+                read_started = time.monotonic()
+                data = read_chunk_file(chunks_dir, chunk_hash)
+                read_time = time.monotonic() - read_started
+                ok = get_hash_suite(suite).chunk_hash(data) == chunk_hash
+            except FileNotFoundError:
+                if not os.path.exists(os.path.join(os.path.dirname(chunks_dir), "manifest.json")):
+                    # Chunk bị xoá sau khi lập kế hoạch (snapshot đã bị xoá) -> bỏ qua
+                    # (path có thể đã cũ khi dùng lại plan: chunk được chuyển tier)
+                    continue
+                # Chunk hoặc base của chunk delta đã mất
+                data, ok = b"", False
+            except ValueError:
+                data, ok = b"", False
+
+            if not ok:
+                bad[chunk_hash] = ("corrupted", snaps)
+
+            state["chunks"] += 1
+            state["bytes"] += len(data)
+            state["last_key"] = last_key = key
+            throttle.charge(len(data), latency=read_time if data else None)
+
+            if time.monotonic() - last_checkpoint >= CHECKPOINT_INTERVAL:
+                state["bad"] = [[h, r, s] for h, (r, s) in bad.items()]
+                _save_state(state_path, state)
+                last_checkpoint = time.monotonic()
+
+        state["bad"] = [[h, r, s] for h, (r, s) in bad.items()]
+        state["completed"] = finished
+        _save_state(state_path, state)
+
+        if not finished:
+            print(f"Scrub paused after {state['chunks']} chunk(s) ({state['bytes']} bytes); "
+                  f"run scrub again to continue")
+            if limited:
+                print(throttle.report())
+            return STATUS_OK
+
+        print(f"Scrub completed: {len(snapshots)} snapshot(s), "
+              f"{state['chunks']} unique chunk(s) ({state['bytes']} bytes) checked")
+        if limited:
+            print(throttle.report())
+
+        if not bad:
+            print("No bad chunks found")
+            return STATUS_OK
+
+        affected = _affected_files(store_path, state["bad"])
+        print(f"Bad chunks: {len(bad)}")
+        for chunk_hash, (reason, snaps) in sorted(bad.items()):
+            print(f"  {chunk_hash} ({reason})")
+            for snap_id in sorted(snaps):
+                paths = affected.get(snap_id, {}).get(chunk_hash, [])
+                print(f"    {snap_id}: {', '.join(paths)}")
+        return STATUS_FAIL
+
+    except Exception as e:
+        print("Scrub error:", e)
+        return STATUS_FAIL
+
+    finally:
+        if lock_fd is not None:
+            store_lock.release_job(lock_fd)
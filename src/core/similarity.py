@@ -0,0 +1,167 @@
+import os
+import zlib
+import struct
+
+# Chỉ mục độ tương tự (resemblance) của chunk, nằm trong store/.sketch_index
+# Mỗi record = super-features của một chunk + digest chunk, append-only, mới nhất ở cuối
+SKETCH_INDEX_FILE = ".sketch_index"
+SKETCH_MAGIC = b"LCSKT001"
+
+# Sketch: chia chunk thành block 512 byte, crc32 từng block,
+# one-permutation MinHash: FEATURES bin, mỗi bin giữ giá trị nhỏ nhất
+# Mỗi super-feature gộp FEATURES_PER_SF feature liên tiếp; hai chunk được coi là
+# tương tự nếu trùng ít nhất một super-feature
+SKETCH_BLOCK = 512
+FEATURES = 12
+FEATURES_PER_SF = 3
+SUPER_FEATURES = FEATURES // FEATURES_PER_SF
+MIN_SKETCH_BLOCKS = 16
+
+RECORD = struct.Struct(f"<{SUPER_FEATURES}I32s")
+
+# Số record tối đa giữ trong chỉ mục (~256 GiB dữ liệu với chunk 1 MiB)
+MAX_SKETCHES = 1 << 18
+
+_EMPTY = 1 << 32
+_ZERO_BLOCK_CRC = zlib.crc32(bytes(SKETCH_BLOCK))
+
+
+def chunk_sketch(data):
+    """
+    Tính super-features của chunk, None nếu chunk quá nhỏ hoặc gần như toàn 0
+    Chunk sửa tại chỗ (vài block đổi) giữ được phần lớn feature -> trùng super-feature
+    """
+    end = len(data) // SKETCH_BLOCK * SKETCH_BLOCK
+    if end < MIN_SKETCH_BLOCKS * SKETCH_BLOCK:
+        return None
+
+    mv = memoryview(data)
+    crc32 = zlib.crc32
+    mins = [_EMPTY] * FEATURES
+    for off in range(0, end, SKETCH_BLOCK):
+        v = crc32(mv[off:off + SKETCH_BLOCK])
+        if v == _ZERO_BLOCK_CRC:
+            continue
+        # crc32 tuyến tính -> trộn thêm trước khi chia bin
+        v = (v * 0x9E3779B1) & 0xFFFFFFFF
+        b = v % FEATURES
+        if v < mins[b]:
+            mins[b] = v
+
+    sfs = []
+    for j in range(SUPER_FEATURES):
+        group = mins[j * FEATURES_PER_SF:(j + 1) * FEATURES_PER_SF]
+        # Bin rỗng -> super-feature không dùng được (0 = không có)
+        sfs.append(0 if _EMPTY in group else
+                   crc32(struct.pack(f"<{FEATURES_PER_SF}I", *group), j + 1) or 1)
+    return tuple(sfs) if any(sfs) else None
+
+
+class SketchIndex:
+    """
+    Chỉ mục super-feature -> chunk gần nhất có super-feature đó
+    Dùng để tìm chunk base khi lưu chunk mới dạng delta
+    Chỉ là gợi ý: base tìm được vẫn phải tra qua ChunkIndex để biết snapshot đang giữ
+    Ghi (save) phải được gọi khi đang giữ StoreLock.exclusive()
+    """
+
+    def __init__(self, store_path):
+        self.path = os.path.join(store_path, SKETCH_INDEX_FILE)
+        self.table = {}
+        self.pending = []
+
+    def open(self):
+        """Nạp chỉ mục vào RAM (file hỏng/thiếu -> chỉ mục rỗng)"""
+        self.table = {}
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return self
+        if data[:len(SKETCH_MAGIC)] != SKETCH_MAGIC:
+            print("Warning: Ignoring invalid sketch index")
+            return self
+        end = len(data) - (len(data) - len(SKETCH_MAGIC)) % RECORD.size
+        for record in RECORD.iter_unpack(data[len(SKETCH_MAGIC):end]):
+            self._insert(record[:-1], record[-1])
+        return self
+
+    def _insert(self, sketch, digest):
+        for j, sf in enumerate(sketch):
+            if sf:
+                self.table[(j, sf)] = digest
+
+    def find(self, sketch):
+        """Chunk (hash) trùng nhiều super-feature nhất với sketch, None nếu không có"""
+        votes = {}
+        for j, sf in enumerate(sketch):
+            digest = self.table.get((j, sf)) if sf else None
+            if digest is not None:
+                votes[digest] = votes.get(digest, 0) + 1
+        if not votes:
+            return None
+        return max(votes, key=votes.get).hex()
+
+    def add(self, sketch, chunk_hash):
+        """Thêm chunk vào chỉ mục trong RAM (thấy ngay trong backup hiện tại), ghi ở save()"""
+        digest = bytes.fromhex(chunk_hash)
+        self._insert(sketch, digest)
+        self.pending.append(RECORD.pack(*sketch, digest))
+
+    def save(self):
+        """Append các record mới; vượt 2 * MAX_SKETCHES thì viết lại chỉ giữ MAX_SKETCHES mới nhất"""
+        if not self.pending:
+            return
+        with open(self.path, "ab") as f:
+            size = f.tell()
+            if size < len(SKETCH_MAGIC):
+                f.truncate(0)
+                f.write(SKETCH_MAGIC)
+                size = len(SKETCH_MAGIC)
+            # Bỏ record ghi dở (crash giữa lần append trước) để record mới thẳng hàng
+            aligned = size - (size - len(SKETCH_MAGIC)) % RECORD.size
+            if aligned != size:
+                f.truncate(aligned)
+            f.write(b"".join(self.pending))
+            f.flush()
+            os.fsync(f.fileno())
+            count = (f.tell() - len(SKETCH_MAGIC)) // RECORD.size
+        self.pending = []
+
+        if count > 2 * MAX_SKETCHES:
+            self._compact()
+
+    def prune(self, live_chunks):
+        """Viết lại chỉ mục chỉ giữ record của chunk còn sống (sau khi xoá snapshot)"""
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return
+        if data[:len(SKETCH_MAGIC)] != SKETCH_MAGIC:
+            return
+        body = data[len(SKETCH_MAGIC):]
+        body = body[:len(body) - len(body) % RECORD.size]
+        kept = [body[off:off + RECORD.size] for off in range(0, len(body), RECORD.size)
+                if body[off + RECORD.size - 32:off + RECORD.size].hex() in live_chunks]
+
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(SKETCH_MAGIC)
+            f.write(b"".join(kept))
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(tmp_path, self.path)
+
+    def _compact(self):
+        with open(self.path, "rb") as f:
+            data = f.read()
+        body = data[len(SKETCH_MAGIC):]
+        body = body[:len(body) - len(body) % RECORD.size]
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(SKETCH_MAGIC)
+            f.write(body[-MAX_SKETCHES * RECORD.size:])
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(tmp_path, self.path)
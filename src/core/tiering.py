@@ -0,0 +1,245 @@
+import os
+import time
+from utils.constants import STATUS_OK, STATUS_FAIL
+from utils.fs import ensure_dir, link_file, copy_file
+from core.wal import WAL
+from core.lock import StoreLock
+from core.manifest import iter_manifest_files, iter_file_chunks
+from storage.delta import DELTA_HEADER, parse_delta_header
+from storage.tiers import (ACCESS_LOG, KIND_DELTA, KIND_EXT, ColdTier, tiers_dir,
+                           load_tier_config, save_tier_config, read_access_log, write_cold_index)
+
+# Mặc định: N snapshot mới nhất luôn ở tier nóng
+DEFAULT_KEEP_RECENT = 2
+
+# Snapshot được restore/verify ít nhất PROMOTE_READS lần trong WINDOW_DAYS ngày gần nhất
+# cũng được giữ (hoặc đưa lại) ở tier nóng
+DEFAULT_WINDOW_DAYS = 30
+DEFAULT_PROMOTE_READS = 2
+
+DAY_MS = 86400 * 1000
+
+# Tên khoá job (StoreLock.acquire_job)
+TIER_JOB = "tier"
+
+_EXT_KIND = {ext: kind for kind, ext in KIND_EXT.items()}
+
+
+def hot_chunk_files(chunks_dir):
+    """{hash: ext} của các file chunk đang nằm trong thư mục chunks của snapshot"""
+    result = {}
+    try:
+        names = os.listdir(chunks_dir)
+    except FileNotFoundError:
+        return result
+    for name in names:
+        base, ext = os.path.splitext(name)
+        if ext in _EXT_KIND:
+            result[base] = ext
+    return result
+
+
+def snapshot_chunks(store_path, snap_id, cold, hot_files, meta=None):
+    """
+    Chunk mà snapshot cần đọc được: chunk trong manifest cùng chuỗi base của các chunk delta
+    hot_files: kết quả hot_chunk_files của snapshot, cold: ColdTier (None nếu store không phân tầng)
+    meta: nhận các trường top-level của manifest (merkle_root, ...)
+    Chunk không có ở tier nào bị bỏ qua (scrub/verify sẽ báo thiếu)
+    """
+    chunks_dir = os.path.join(store_path, snap_id, "chunks")
+    meta = {} if meta is None else meta
+    needed = set()
+    pending = []
+    for file_info in iter_manifest_files(os.path.join(store_path, snap_id, "manifest.json"), meta):
+        for chunk_hash, _, _, is_zero in iter_file_chunks(meta, file_info):
+            if not is_zero and chunk_hash not in needed:
+                needed.add(chunk_hash)
+                pending.append(chunk_hash)
+
+    while pending:
+        chunk_hash = pending.pop()
+        kind = cold.kind(chunk_hash) if cold is not None else None
+        if kind is not None:
+            path = cold.path(chunk_hash, kind)
+        elif chunk_hash in hot_files:
+            kind = _EXT_KIND[hot_files[chunk_hash]]
+            path = os.path.join(chunks_dir, chunk_hash + hot_files[chunk_hash])
+        else:
+            continue
+        if kind != KIND_DELTA:
+            continue
+        try:
+            with open(path, "rb") as f:
+                base_hash = parse_delta_header(f.read(DELTA_HEADER.size))[0]
+        except (OSError, ValueError):
+            continue
+        if base_hash not in needed:
+            needed.add(base_hash)
+            pending.append(base_hash)
+    return needed
+
+
+def sweep_cold(cold_dir, entries):
+    """Xoá file ở tier lạnh không còn trong chỉ mục (đã đưa lại tier nóng, không còn tham chiếu, file tạm)"""
+    for sub in os.listdir(cold_dir):
+        sub_dir = os.path.join(cold_dir, sub)
+        if not os.path.isdir(sub_dir):
+            continue
+        for name in os.listdir(sub_dir):
+            base, ext = os.path.splitext(name)
+            try:
+                keep = ext in _EXT_KIND and entries.get(bytes.fromhex(base)) == _EXT_KIND[ext]
+            except ValueError:
+                keep = False
+            if not keep:
+                os.remove(os.path.join(sub_dir, name))
+
+
+def _compact_access_log(store_path, records):
+    """Chỉ giữ các lần truy cập còn trong cửa sổ thống kê"""
+    path = os.path.join(tiers_dir(store_path), ACCESS_LOG)
+    with open(path + ".tmp", "w") as f:
+        for ts, snap_id, kind in records:
+            f.write(f"{ts} {snap_id} {kind}\n")
+    os.replace(path + ".tmp", path)
+
+
+def tier(store_path, cold_dir=None, keep_recent=DEFAULT_KEEP_RECENT,
+         window_days=DEFAULT_WINDOW_DAYS, promote_reads=DEFAULT_PROMOTE_READS):
+    """
+    Job phân tầng chạy nền (ví dụ từ cron): đặt mỗi chunk vật lý vào tier nóng hoặc tier lạnh
+
+    - Tier nóng: chunk được keep_recent snapshot mới nhất hoặc một snapshot đọc nhiều
+      (>= promote_reads lần restore/verify trong window_days ngày) tham chiếu
+    - Tier lạnh: mọi chunk còn lại; chunk lạnh lại thuộc tier nóng thì được đưa về
+      (link vào thư mục chunks của mọi snapshot tham chiếu)
+    - cold_dir: đặt thư mục tier lạnh cho store (lưu trong store/.tiers/config.json)
+
+    Thứ tự an toàn khi crash: chép sang tier đích (fsync) -> ghi chỉ mục -> xoá bản ở tier cũ.
+    Reader thấy chỉ mục cũ chỉ cần nạp lại và thử tier còn lại
+    """
+    store_lock = StoreLock(store_path)
+    lock_fd = None
+
+    try:
+        if not os.path.exists(store_path):
+            print("Store directory not found")
+            return STATUS_FAIL
+
+        # Chỉ một job phân tầng trên một store tại một thời điểm
+        lock_fd = store_lock.acquire_job(TIER_JOB)
+
+        config = load_tier_config(store_path)
+        if cold_dir is not None:
+            cold_dir = os.path.abspath(cold_dir)
+            current = config.get("cold_dir")
+            if current not in (None, cold_dir) and ColdTier(store_path, current).count:
+                print(f"Cold tier already configured at {current} and holds chunks")
+                return STATUS_FAIL
+            ensure_dir(cold_dir)
+            config["cold_dir"] = cold_dir
+            save_tier_config(store_path, config)
+        if not config.get("cold_dir"):
+            print("No cold tier configured; use --cold-dir")
+            return STATUS_FAIL
+
+        cold = ColdTier(store_path, config["cold_dir"])
+        ensure_dir(cold.cold_dir)
+        entries = cold.entries()
+
+        wal = WAL(os.path.join(store_path, "wal.log"))
+        snapshots = sorted(s for s in wal.get_committed_snapshots()
+                           if os.path.exists(os.path.join(store_path, s, "manifest.json")))
+        known = set(snapshots)
+
+        # Thống kê truy cập trong cửa sổ
+        cutoff = int(time.time() * 1000) - window_days * DAY_MS
+        recent = [r for r in read_access_log(store_path) if r[0] >= cutoff and r[1] in known]
+        reads = {}
+        for _, snap_id, _ in recent:
+            reads[snap_id] = reads.get(snap_id, 0) + 1
+
+        hot_snaps = set(snapshots[-keep_recent:]) if keep_recent > 0 else set()
+        hot_snaps |= {s for s, n in reads.items() if n >= promote_reads}
+
+        # Một lượt streaming qua manifest mọi snapshot
+        refs = {}        # hash -> snapshot tham chiếu
+        hot_paths = {}   # hash -> file đang ở tier nóng
+        need_hot = set()
+        for snap_id in snapshots:
+            chunks_dir = os.path.join(store_path, snap_id, "chunks")
+            hot_files = hot_chunk_files(chunks_dir)
+            for chunk_hash in snapshot_chunks(store_path, snap_id, cold, hot_files):
+                refs.setdefault(chunk_hash, []).append(snap_id)
+                if snap_id in hot_snaps:
+                    need_hot.add(chunk_hash)
+                if chunk_hash in hot_files:
+                    hot_paths.setdefault(chunk_hash, []).append(
+                        os.path.join(chunks_dir, chunk_hash + hot_files[chunk_hash]))
+
+        # Bước 1: chép chunk không còn thuộc tier nóng sang tier lạnh
+        demoted, demoted_bytes = [], 0
+        for chunk_hash, paths in hot_paths.items():
+            if chunk_hash in need_hot:
+                continue
+            demoted.append(chunk_hash)
+            digest = bytes.fromhex(chunk_hash)
+            if digest in entries:
+                # Đã chép ở lần chạy trước (crash trước khi kịp xoá bản nóng)
+                continue
+            kind = _EXT_KIND[os.path.splitext(paths[0])[1]]
+            dst_path = cold.path(chunk_hash, kind)
+            ensure_dir(os.path.dirname(dst_path))
+            copy_file(paths[0], dst_path)
+            entries[digest] = kind
+            demoted_bytes += os.path.getsize(dst_path)
+
+        # Bước 2: đưa chunk lạnh cần ở tier nóng về thư mục của mọi snapshot tham chiếu
+        promoted, promoted_bytes = 0, 0
+        for chunk_hash in need_hot:
+            digest = bytes.fromhex(chunk_hash)
+            kind = entries.get(digest)
+            if kind is None:
+                continue
+            ext = KIND_EXT[kind]
+            source = hot_paths.get(chunk_hash, [None])[0]
+            for snap_id in refs[chunk_hash]:
+                dst_path = os.path.join(store_path, snap_id, "chunks", chunk_hash + ext)
+                if os.path.exists(dst_path):
+                    continue
+                if source is None or not link_file(source, dst_path):
+                    copy_file(cold.path(chunk_hash, kind), dst_path)
+                    source = dst_path
+            promoted += 1
+            promoted_bytes += os.path.getsize(source)
+            del entries[digest]
+
+        # Bước 3: chỉ mục chỉ giữ chunk lạnh còn được tham chiếu
+        entries = {d: k for d, k in entries.items() if d.hex() in refs}
+        write_cold_index(store_path, entries)
+
+        # Bước 4: xoá bản cũ ở tier nóng và tier lạnh
+        for chunk_hash in demoted:
+            for path in hot_paths[chunk_hash]:
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+        sweep_cold(cold.cold_dir, entries)
+
+        # Lần ghi access.log song song lúc compact có thể mất: thống kê chỉ là gợi ý
+        _compact_access_log(store_path, recent)
+
+        print(f"Tiering completed: {len(snapshots)} snapshot(s), {len(hot_snaps)} kept hot")
+        print(f"Moved to cold tier: {len(demoted)} chunk(s) ({demoted_bytes} bytes)")
+        print(f"Promoted to hot tier: {promoted} chunk(s) ({promoted_bytes} bytes)")
+        print(f"Cold tier: {len(entries)} chunk(s) in {cold.cold_dir}")
+        return STATUS_OK
+
+    except Exception as e:
+        print("Tier error:", e)
+        return STATUS_FAIL
+
+    finally:
+        if lock_fd is not None:
+            store_lock.release_job(lock_fd)
@@ -11,16 +11,21 @@
 import os
 import json
 from utils.constants import STATUS_OK, STATUS_FAIL
-from utils.hash import sha256_bytes, sha256_str
+from utils.hash import get_hash_suite
 from core.rollback import RollbackProtector
 from core.wal import WAL
+from core.manifest import iter_file_chunks
+from storage import LocalBackend
+from storage.tiers import record_access
 
 class MerkleTree:
-    def __init__(self):
+    def __init__(self, suite=None):
+        # Mặc định suite legacy (sha256-hex) cho snapshot cũ
+        self.suite = suite or get_hash_suite()
         self.leaves = []
     
     def add_leaf(self, data_hash: str):
-        self.leaves.append(data_hash)
+        self.leaves.append(self.suite.leaf(data_hash))
     
     def compute_root(self) -> str:
         if not self.leaves:
@@ -33,18 +38,24 @@ class MerkleTree:
             for i in range(0, len(level), 2):
                 left = level[i]
                 right = level[i + 1] if i + 1 < len(level) else left
-                parent = sha256_str(left + right)
+                parent = self.suite.node(left, right)
                 next_level.append(parent)
             level = next_level
         
-        return level[0]
+        return self.suite.root_hex(level[0])
 
-def verify(snapshot_id, store_path):
+def verify(snapshot_id, store_path, backend=None, track_access=True):
+    """
+    Kiểm tra snapshot: WAL commit, rollback, sự tồn tại và hash của từng chunk, Merkle root
+    Chunk và manifest được đọc qua backend (mặc định filesystem cục bộ tại store_path)
+    track_access: ghi nhận lần đọc vào thống kê phân tầng (restore tự ghi nhận riêng)
+    """
     try:
-        snap_dir = os.path.join(store_path, snapshot_id)
+        if backend is None:
+            backend = LocalBackend(store_path)
         
         # Kiểm tra snapshot tồn tại
-        if not os.path.exists(snap_dir):
+        if not backend.has_snapshot(snapshot_id):
             print(f"Snapshot not found: {snapshot_id}")
             return STATUS_FAIL
         
@@ -57,19 +68,20 @@ def verify(snapshot_id, store_path):
             return STATUS_FAIL
         
         # Đọc manifest
-        manifest_path = os.path.join(snap_dir, "manifest.json")
-        if not os.path.exists(manifest_path):
+        try:
+            manifest = json.loads(backend.get_manifest(snapshot_id))
+        except FileNotFoundError:
             print("Manifest not found")
             return STATUS_FAIL
         
-        with open(manifest_path, "r") as f:
-            manifest = json.load(f)
-        
         stored_root = manifest.get("merkle_root")
         if not stored_root:
             print("No merkle root in manifest")
             return STATUS_FAIL
         
+        # Manifest cũ không ghi hash_suite -> sha256-hex
+        suite = get_hash_suite(manifest.get("hash_suite"))
+        
         # Kiểm tra rollback
         # QUAN TRỌNG: Kiểm tra snapshot có phải là snapshot mới nhất không
         latest_snapshot = wal.get_latest_committed_snapshot()
@@ -81,45 +93,40 @@ def verify(snapshot_id, store_path):
         
         # Kiểm tra merkle root có khớp với root cuối cùng không
         rollback = RollbackProtector(os.path.join(store_path, "roots.log"))
-        rollback_status = rollback.verify_root(stored_root)
+        rollback_status = rollback.verify_root(stored_root, suite.name)
         
         if rollback_status == STATUS_FAIL:
             print("Rollback attack detected! Merkle root mismatch.")
             return STATUS_FAIL
         
-        # Tính lại merkle root từ chunks
-        chunks_dir = os.path.join(snap_dir, "chunks")
-        merkle = MerkleTree()
-        
-        missing_chunks = []
-        corrupted_chunks = []
+        # Tính lại merkle root từ danh sách chunk trong manifest
+        # Chunk toàn 0 không có file, hash đã cố định theo độ dài -> chỉ là leaf
+        merkle = MerkleTree(suite)
+        stored_chunks = {}
         
         for file_info in manifest["files"]:
-            for chunk_hash in file_info["chunks"]:
-                chunk_path = os.path.join(chunks_dir, f"{chunk_hash}.chunk")
-                
-                # Kiểm tra chunk tồn tại
-                if not os.path.exists(chunk_path):
-                    missing_chunks.append(chunk_hash)
-                    continue
-                
-                # Kiểm tra hash của chunk
-                with open(chunk_path, "rb") as f:
-                    chunk_data = f.read()
-                    computed_hash = sha256_bytes(chunk_data)
-                
-                if computed_hash != chunk_hash:
-                    corrupted_chunks.append(chunk_hash)
-                
+            for chunk_hash, _, _, is_zero in iter_file_chunks(manifest, file_info):
                 merkle.add_leaf(chunk_hash)
+                if not is_zero:
+                    stored_chunks[chunk_hash] = None
         
-        # Báo lỗi nếu có chunks bị thiếu hoặc sai
+        # Kiểm tra tồn tại theo batch (một lần list thay vì stat/HEAD từng chunk)
+        present = backend.has_chunks(snapshot_id, stored_chunks)
+        missing_chunks = [h for h in stored_chunks if h not in present]
+        
+        # Báo lỗi nếu có chunks bị thiếu
         if missing_chunks:
             print(f"Missing chunks: {len(missing_chunks)}")
             for h in missing_chunks[:5]:
                 print(f"  - {h}")
             return STATUS_FAIL
         
+        # Kiểm tra hash của từng chunk (mỗi chunk một lần, backend có thể tải song song)
+        corrupted_chunks = []
+        for chunk_hash, chunk_data in backend.get_chunks(snapshot_id, stored_chunks):
+            if chunk_data is None or suite.chunk_hash(chunk_data) != chunk_hash:
+                corrupted_chunks.append(chunk_hash)
+        
         if corrupted_chunks:
             print(f"Corrupted chunks: {len(corrupted_chunks)}")
             for h in corrupted_chunks[:5]:
@@ -135,6 +142,9 @@ def verify(snapshot_id, store_path):
             print(f"  Computed: {computed_root}")
             return STATUS_FAIL
         
+        if track_access:
+            record_access(store_path, snapshot_id, "verify")
+
         print(f"Verification passed for snapshot: {snapshot_id}")
         print(f"Merkle root: {computed_root}")
         print(f"Files: {len(manifest['files'])}")
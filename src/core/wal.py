@@ -12,8 +12,13 @@ class WAL:
         self._append(f"COMMIT {snap_id}")
 
     def _append(self, line):
-        with open(self.path, "a") as f:
-            f.write(line + "\n")
+        # Một lần write() duy nhất với O_APPEND để các process chạy song song
+        # không ghi xen kẽ vào giữa dòng của nhau
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, (line + "\n").encode("utf-8"))
+        finally:
+            os.close(fd)
     
     def is_committed(self, snap_id):
         """
@@ -71,4 +76,38 @@ class WAL:
                     snap_id = line[7:].strip()  # Bỏ "COMMIT "
                     latest = snap_id
         
-        return latest
\ No newline at end of file
+        return latest
+
+    def compact(self, dropped, is_active):
+        """
+        Viết lại WAL (file tạm + fsync + rename) bỏ các dòng của snapshot trong dropped
+        và BEGIN của backup bị bỏ dở (không COMMIT, is_active(snap_id) False)
+        Phải gọi khi đang giữ StoreLock.exclusive() (COMMIT luôn được ghi trong khoá đó)
+        Trả về số dòng đã bỏ
+        """
+        if not os.path.exists(self.path):
+            return 0
+
+        with open(self.path, "r") as f:
+            lines = f.readlines()
+        committed = {line.strip()[7:].strip() for line in lines if line.startswith("COMMIT ")}
+
+        kept = []
+        for line in lines:
+            parts = line.split()
+            if len(parts) == 2 and parts[1] in dropped:
+                continue
+            if (len(parts) == 2 and parts[0] == "BEGIN" and parts[1] not in committed
+                    and not is_active(parts[1])):
+                continue
+            kept.append(line if line.endswith("\n") else line + "\n")
+
+        if len(kept) == len(lines):
+            return 0
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.writelines(kept)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        return len(lines) - len(kept)
\ No newline at end of file
@@ -1,7 +1,103 @@
 import time
 import os
+import fcntl
 from utils.hash import sha256_str
 from utils.constants import ZERO_HASH
+from utils.fs import iter_lines_reversed
+
+# Đánh dấu dòng checkpoint do audit-verify ghi sau khi đã kiểm tra tới offset đó
+VERIFIED_MARK = "verified"
+
+
+def parse_audit_root(line):
+    """
+    Parse một dòng audit_roots.log:
+        "count hash"                    (định dạng cũ)
+        "count hash offset"             (logger ghi sau mỗi entry)
+        "count hash offset verified"    (checkpoint của audit-verify)
+    offset là vị trí byte ngay sau entry thứ count trong audit.log
+    Trả về (count, hash, offset hoặc None, verified) hoặc None nếu dòng không hợp lệ
+    """
+    parts = line.split()
+    if len(parts) < 2 or not parts[0].isdigit():
+        return None
+    offset = int(parts[2]) if len(parts) >= 3 and parts[2].isdigit() else None
+    verified = len(parts) >= 4 and parts[3] == VERIFIED_MARK
+    return int(parts[0]), parts[1], offset, verified
+
+
+def find_audit_roots(roots_path):
+    """
+    Đọc ngược audit_roots.log, trả về (root cuối của logger, checkpoint verified cuối)
+    Chỉ đọc tới checkpoint gần nhất nên chi phí theo số entry mới, không theo độ dài log
+    """
+    last_root = None
+    checkpoint = None
+    try:
+        for raw in iter_lines_reversed(roots_path):
+            root = parse_audit_root(raw.decode("utf-8", "replace"))
+            if root is None:
+                continue
+            if root[3]:
+                checkpoint = root
+                break
+            if last_root is None:
+                last_root = root
+    except FileNotFoundError:
+        pass
+    return last_root, checkpoint
+
+
+def entry_hash_at(audit_log_path, offset):
+    """Hash của entry kết thúc ngay tại byte offset (None nếu offset không nằm ở cuối một dòng)"""
+    with open(audit_log_path, "rb") as f:
+        start = max(0, offset - 64 * 1024)
+        f.seek(start)
+        data = f.read(offset - start)
+    if not data.endswith(b"\n"):
+        return None
+    line = data[:-1].rsplit(b"\n", 1)[-1].split()
+    return line[0].decode("utf-8") if line else None
+
+
+def split_ranges(audit_log_path, start, end, parts):
+    """Chia [start, end) thành tối đa parts vùng byte, mỗi vùng bắt đầu ở đầu một dòng"""
+    bounds = [start]
+    with open(audit_log_path, "rb") as f:
+        for i in range(1, parts):
+            f.seek(start + (end - start) * i // parts)
+            f.readline()
+            pos = min(f.tell(), end)
+            if pos > bounds[-1]:
+                bounds.append(pos)
+    if bounds[-1] < end:
+        bounds.append(end)
+    return list(zip(bounds, bounds[1:]))
+
+
+def check_entry_hashes(audit_log_path, start, end):
+    """
+    Kiểm tra hash từng entry trong vùng [start, end) (không kiểm tra liên kết chain)
+    Trả về danh sách offset đầu các dòng không qua được: hash sai, sai định dạng,
+    hoặc không đúng layout "<hash 64> <prev 64> ..." (lượt duyệt chain sẽ parse lại các dòng này)
+    Chạy được trong process riêng
+    """
+    bad = []
+    with open(audit_log_path, "rb") as f:
+        f.seek(start)
+        offset = start
+        while offset < end:
+            raw = f.readline()
+            if not raw:
+                break
+            if raw.strip():
+                parts = raw.decode("utf-8", "replace").split()
+                if (len(parts) < 7 or raw[64:65] != b" " or raw[129:130] != b" "
+                        or sha256_str(" ".join(parts[1:])) != parts[0]):
+                    bad.append(offset)
+            offset += len(raw)
+    return bad
+
 
 class AuditLogger:
     def __init__(self, path):
@@ -12,35 +108,77 @@ class AuditLogger:
         self.roots_path = os.path.join(os.path.dirname(path), "audit_roots.log")
 
     def _last_hash(self):
+        """Hash của entry cuối (chỉ đọc phần cuối file)"""
         try:
-            with open(self.path, "r") as f:
-                lines = f.readlines()
-            if not lines:
-                return ZERO_HASH
-            return lines[-1].split()[0]
+            for line in iter_lines_reversed(self.path):
+                if line.strip():
+                    return line.split()[0].decode("utf-8")
         except FileNotFoundError:
-            return ZERO_HASH
+            pass
+        return ZERO_HASH
+    
+    def _entry_count(self, size):
+        """
+        Số entry trong size byte đầu của audit.log
+        Lấy từ dòng audit_roots.log cuối nếu offset của nó khớp, không thì đếm lại
+        """
+        try:
+            for raw in iter_lines_reversed(self.roots_path):
+                root = parse_audit_root(raw.decode("utf-8", "replace"))
+                if root is not None:
+                    if root[2] == size:
+                        return root[0]
+                    break
+        except FileNotFoundError:
+            pass
+        
+        count = 0
+        remaining = size
+        with open(self.path, "rb") as f:
+            while remaining > 0:
+                block = f.read(min(remaining, 1024 * 1024))
+                if not block:
+                    break
+                count += block.count(b"\n")
+                remaining -= len(block)
+        return count
     
-    def _save_audit_root(self, entry_hash, count):
-        """Lưu audit root hash để phát hiện truncation"""
+    def _save_audit_root(self, entry_hash, count, offset, verified=False):
+        """Lưu audit root hash + offset để phát hiện truncation và resume verify"""
+        mark = f" {VERIFIED_MARK}" if verified else ""
         with open(self.roots_path, "a") as f:
-            f.write(f"{count} {entry_hash}\n")
+            f.write(f"{count} {entry_hash} {offset}{mark}\n")
+    
+    def save_checkpoint(self, count, entry_hash, offset):
+        """
+        Ghi checkpoint sau khi audit-verify đã kiểm tra count entry đầu (tới byte offset)
+        Lần verify sau tiếp tục từ đây thay vì từ genesis
+        """
+        with open(self.path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            self._save_audit_root(entry_hash, count, offset, verified=True)
 
     def log(self, user, command, args_str, status):
-        prev = self._last_hash()
-        ts = int(time.time() * 1000)
-        args_hash = sha256_str(args_str)
-        raw = f"{prev} {ts} {user} {command} {args_hash} {status}"
-        entry_hash = sha256_str(raw)
-        line = f"{entry_hash} {raw}\n"
-
-        with open(self.path, "a") as f:
-            f.write(line)
-        
-        # Đếm số entries và lưu root
-        try:
-            with open(self.path, "r") as f:
-                count = len(f.readlines())
-            self._save_audit_root(entry_hash, count)
-        except:
-            pass
+        # Khoá file audit trong lúc đọc hash cuối và append, để các process
+        # chạy song song không rẽ nhánh hash chain
+        with open(self.path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+            prev = self._last_hash()
+            ts = int(time.time() * 1000)
+            args_hash = sha256_str(args_str)
+            raw = f"{prev} {ts} {user} {command} {args_hash} {status}"
+            entry_hash = sha256_str(raw)
+            line = f"{entry_hash} {raw}\n"
+
+            data = line.encode("utf-8")
+            with open(self.path, "ab") as f:
+                f.write(data)
+                offset = f.tell()
+            
+            # Đếm số entries và lưu root (kèm offset cuối entry)
+            try:
+                count = self._entry_count(offset - len(data)) + 1
+                self._save_audit_root(entry_hash, count, offset)
+            except:
+                pass
@@ -8,9 +8,16 @@ class Policy:
         self.users = data.get("users", {})
         self.roles = data.get("roles", {})
         self.default_role = data.get("default_role")
+        self.io = data.get("io") or {}
 
     def is_allowed(self, user: str, command: str) -> bool:
         role = self.users.get(user, self.default_role)
         if not role:
             return False
         return command in self.roles.get(role, [])
+
+    def io_limits(self, command: str) -> dict:
+        """Giới hạn I/O cho lệnh: mặc định của mục io, ghi đè bởi io.<command> nếu có"""
+        limits = {k: v for k, v in self.io.items() if not isinstance(v, dict)}
+        limits.update(self.io.get(command) or {})
+        return limits
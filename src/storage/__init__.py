@@ -0,0 +1,31 @@
+import os
+from .base import StorageBackend
+from .local import LocalBackend, read_chunk_file, chunk_file_path
+from .throttled import ThrottledBackend
+
+# Biến môi trường chọn backend khi không truyền --store-url
+STORE_URL_ENV = "LABCLI_STORE_URL"
+
+
+def open_backend(store_path, url=None):
+    """
+    Chọn backend theo URL: không có URL -> filesystem cục bộ (store_path),
+    http(s)://host:port/bucket[/prefix] -> object store kiểu S3
+    """
+    url = url or os.environ.get(STORE_URL_ENV)
+    if not url:
+        return LocalBackend(store_path)
+    # Import muộn: http.client/xml chỉ cần khi dùng object store
+    from .objectstore import HTTPBackend
+    return HTTPBackend(url)
+
+
+__all__ = [
+    "StorageBackend",
+    "LocalBackend",
+    "read_chunk_file",
+    "chunk_file_path",
+    "ThrottledBackend",
+    "open_backend",
+    "STORE_URL_ENV",
+]
@@ -0,0 +1,91 @@
+import abc
+
+
+class StorageBackend(abc.ABC):
+    """
+    Giao diện lưu trữ chunk và manifest của snapshot
+
+    Vòng đời ghi một snapshot:
+        begin_snapshot -> put_chunk ... -> put_manifest -> flush
+        -> publish_snapshot (trong critical section commit) hoặc abort_snapshot
+    WAL, roots.log, audit và khoá luôn nằm ở store_path cục bộ, backend chỉ giữ dữ liệu.
+    Các thao tác batch (has_chunks, get_chunks) cho phép backend chạy song song bên dưới.
+    """
+
+    # Backend có lưu được chunk dạng delta so với chunk tương tự (xem storage.delta)
+    supports_delta = False
+
+    # Nơi lưu dữ liệu ngoài store_path (URL object store), None = filesystem cục bộ của store
+    # Chỉ mục chunk được tách theo location: owner trong chỉ mục phải là snapshot của cùng backend
+    location = None
+
+    @abc.abstractmethod
+    def begin_snapshot(self, snap_id):
+        pass
+
+    @abc.abstractmethod
+    def put_chunk(self, snap_id, chunk_hash, data, src_snap_id=None):
+        """
+        Ghi chunk (backend có thể ghi bất đồng bộ, lỗi được báo ở flush)
+        src_snap_id: snapshot đã commit đang giữ chunk này -> dùng lại (link/copy)
+        thay vì truyền dữ liệu nếu được, không được thì ghi data
+        """
+
+    def link_chunk(self, snap_id, chunk_hash, src_snap_id):
+        """
+        Dùng lại chunk của snapshot đã commit mà không cần dữ liệu
+        Trả về False nếu backend không làm được đồng bộ -> caller ghi bằng put_chunk
+        """
+        return False
+
+    def get_delta_base(self, snap_id, base_hash, base_snap_id=None):
+        """
+        Đọc chunk làm base cho delta: (nội dung thật, độ sâu chuỗi delta) hoặc None
+        base_snap_id: snapshot đã commit giữ base, None = base đã ghi trong snapshot đang build
+        """
+        return None
+
+    def put_delta(self, snap_id, chunk_hash, blob, base_hash, base_snap_id=None):
+        """Ghi chunk dạng delta (blob từ storage.delta.encode_delta); False nếu không ghi được"""
+        return False
+
+    @abc.abstractmethod
+    def put_manifest(self, snap_id, data):
+        pass
+
+    def flush(self):
+        """Chờ mọi thao tác ghi đang chạy, raise lỗi đầu tiên nếu có"""
+
+    def publish_snapshot(self, snap_id):
+        """Làm snapshot đang ghi dở hiển thị dưới tên chính thức"""
+
+    @abc.abstractmethod
+    def abort_snapshot(self, snap_id):
+        """Bỏ snapshot đang ghi dở (xoá mọi dữ liệu đã ghi của snap_id)"""
+
+    @abc.abstractmethod
+    def has_snapshot(self, snap_id):
+        pass
+
+    @abc.abstractmethod
+    def get_manifest(self, snap_id):
+        """Trả về bytes của manifest, FileNotFoundError nếu không có"""
+
+    @abc.abstractmethod
+    def list_snapshots(self):
+        """Tập snapshot_id có dữ liệu trên backend, kể cả snapshot ghi dở (cleanup dùng để tìm upload mồ côi)"""
+
+    @abc.abstractmethod
+    def list_chunks(self, snap_id):
+        """Tập hash các chunk đang có của snapshot"""
+
+    def has_chunks(self, snap_id, chunk_hashes):
+        """Kiểm tra tồn tại theo batch, trả về tập hash đang có"""
+        return set(chunk_hashes) & self.list_chunks(snap_id)
+
+    @abc.abstractmethod
+    def get_chunks(self, snap_id, chunk_hashes):
+        """Yield (hash, data) theo đúng thứ tự; data là None nếu chunk không tồn tại"""
+
+    def close(self):
+        pass
@@ -0,0 +1,51 @@
+import zlib
+import struct
+
+# File <hash>.delta: header | zlib(XOR(nội dung, base))
+#   header = magic, digest base (32 byte), độ sâu chuỗi delta, độ dài nội dung thật
+DELTA_MAGIC = b"LCDELTA1"
+DELTA_HEADER = struct.Struct("<8s32sBI")
+
+# Độ sâu tối đa của chuỗi delta -> restore đọc tối đa MAX_DELTA_DEPTH + 1 file cho một chunk
+MAX_DELTA_DEPTH = 3
+
+# Chỉ lưu delta nếu nhỏ hơn tỉ lệ này so với chunk gốc
+MAX_DELTA_RATIO = 0.5
+
+
+def encode_delta(base, data, base_hash, depth):
+    """
+    Mã hoá data thành delta so với base (XOR theo vị trí rồi nén)
+    Hợp với chunk sửa tại chỗ (page database, counter, timestamp cùng độ dài)
+    Trả về None nếu delta không đủ nhỏ
+    """
+    n = len(data)
+    aligned = base[:n].ljust(n, b"\0")
+    diff = (int.from_bytes(data, "little") ^ int.from_bytes(aligned, "little")).to_bytes(n, "little")
+    payload = zlib.compress(diff, 1)
+    if len(payload) + DELTA_HEADER.size > n * MAX_DELTA_RATIO:
+        return None
+    return DELTA_HEADER.pack(DELTA_MAGIC, bytes.fromhex(base_hash), depth, n) + payload
+
+
+def parse_delta_header(blob):
+    """Trả về (base_hash, depth, length); ValueError nếu không phải delta hợp lệ"""
+    if len(blob) < DELTA_HEADER.size:
+        raise ValueError("Truncated delta chunk")
+    magic, base_digest, depth, length = DELTA_HEADER.unpack_from(blob)
+    if magic != DELTA_MAGIC:
+        raise ValueError("Invalid delta chunk")
+    return base_digest.hex(), depth, length
+
+
+def decode_delta(blob, base):
+    """Khôi phục nội dung thật từ delta và nội dung base"""
+    _, _, n = parse_delta_header(blob)
+    try:
+        diff = zlib.decompress(blob[DELTA_HEADER.size:])
+    except zlib.error as e:
+        raise ValueError(f"Corrupted delta chunk: {e}")
+    if len(diff) != n:
+        raise ValueError("Corrupted delta chunk: length mismatch")
+    aligned = base[:n].ljust(n, b"\0")
+    return (int.from_bytes(diff, "little") ^ int.from_bytes(aligned, "little")).to_bytes(n, "little")
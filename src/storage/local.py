@@ -0,0 +1,250 @@
+import os
+from utils.fs import ensure_dir, write_file, link_file, copy_file, remove_dir
+from storage.base import StorageBackend
+from storage.delta import DELTA_HEADER, parse_delta_header, decode_delta
+from storage.tiers import cold_tier, cold_tier_for_chunks, KIND_DELTA, KIND_EXT
+
+CHUNK_EXT = ".chunk"
+DELTA_EXT = ".delta"
+
+# Số base đã giải mã giữ lại khi đọc chuỗi delta (nhiều delta thường chung một base)
+BASE_CACHE_SIZE = 8
+
+
+def _read_hot(chunks_dir, chunk_hash):
+    """(nội dung file, là delta hay không) trong thư mục chunks của snapshot"""
+    try:
+        with open(os.path.join(chunks_dir, chunk_hash + CHUNK_EXT), "rb") as f:
+            return f.read(), False
+    except FileNotFoundError:
+        pass
+    with open(os.path.join(chunks_dir, chunk_hash + DELTA_EXT), "rb") as f:
+        return f.read(), True
+
+
+def _read_stored(chunks_dir, chunk_hash):
+    """
+    Đọc file chunk ở tier đang giữ nó: tier lạnh nếu chỉ mục nói vậy, không thì thư mục snapshot
+    Chỉ mục đã cũ (job phân tầng vừa chuyển chunk) -> nạp lại và thử tier còn lại
+    """
+    cold = cold_tier_for_chunks(chunks_dir)
+    if cold is None:
+        return _read_hot(chunks_dir, chunk_hash)
+
+    kind = cold.kind(chunk_hash)
+    if kind is not None:
+        try:
+            with open(cold.path(chunk_hash, kind), "rb") as f:
+                return f.read(), kind == KIND_DELTA
+        except FileNotFoundError:
+            cold.reload()
+            return _read_hot(chunks_dir, chunk_hash)
+
+    try:
+        return _read_hot(chunks_dir, chunk_hash)
+    except FileNotFoundError:
+        cold.reload()
+        kind = cold.kind(chunk_hash)
+        if kind is None:
+            raise
+        with open(cold.path(chunk_hash, kind), "rb") as f:
+            return f.read(), kind == KIND_DELTA
+
+
+def chunk_file_path(chunks_dir, chunk_hash):
+    """Đường dẫn file đang giữ chunk (<hash>.chunk hoặc <hash>.delta, ở tier nóng hoặc lạnh), None nếu không có"""
+    cold = cold_tier_for_chunks(chunks_dir)
+    path = cold.locate(chunk_hash) if cold is not None else None
+    if path is not None and os.path.exists(path):
+        return path
+    for ext in (CHUNK_EXT, DELTA_EXT):
+        path = os.path.join(chunks_dir, chunk_hash + ext)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def read_chunk_file(chunks_dir, chunk_hash, base_cache=None):
+    """
+    Đọc nội dung thật của chunk của snapshot có thư mục chunks_dir
+    Chunk delta được giải mã theo chuỗi base (nằm cùng thư mục hoặc ở tier lạnh)
+    FileNotFoundError nếu chunk hoặc base không có, ValueError nếu delta hỏng
+    """
+    blob, is_delta = _read_stored(chunks_dir, chunk_hash)
+    if not is_delta:
+        return blob
+    base_hash, _, _ = parse_delta_header(blob)
+
+    base = base_cache.get(base_hash) if base_cache is not None else None
+    if base is None:
+        base = read_chunk_file(chunks_dir, base_hash, base_cache)
+        if base_cache is not None:
+            base_cache[base_hash] = base
+            if len(base_cache) > BASE_CACHE_SIZE:
+                base_cache.pop(next(iter(base_cache)))
+    return decode_delta(blob, base)
+
+
+def chunk_depth(chunks_dir, chunk_hash):
+    """Độ sâu chuỗi delta của chunk (0 = lưu nguyên vẹn)"""
+    path = chunk_file_path(chunks_dir, chunk_hash)
+    if path is None:
+        raise FileNotFoundError(f"Chunk not found: {chunk_hash}")
+    if path.endswith(CHUNK_EXT):
+        return 0
+    with open(path, "rb") as f:
+        return parse_delta_header(f.read(DELTA_HEADER.size))[1]
+
+
+def _unlink_chain(paths):
+    for path in paths:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+def link_chunk_chain(src_dir, dst_dir, chunk_hash):
+    """
+    Hard link chunk cùng chuỗi base của nó (nếu là delta) từ src_dir sang dst_dir
+    để snapshot đích tự đủ dữ liệu. Chunk đã chuyển sang tier lạnh được chép về dst_dir
+    (snapshot mới tham chiếu chunk -> chunk thuộc tier nóng). Trả về False nếu không link được
+
+    Không link được một base (ví dụ snapshot nguồn vừa bị purge) -> gỡ mọi file delta của chuỗi
+    trong dst_dir, không để lại delta mất base; caller sẽ ghi dữ liệu nguyên vẹn
+    """
+    chain = []
+    while True:
+        for ext in (CHUNK_EXT, DELTA_EXT):
+            dst_path = os.path.join(dst_dir, chunk_hash + ext)
+            # Delta đã có chỉ đủ khi cả chuỗi base phía sau cũng có -> vẫn đi tiếp chuỗi
+            if os.path.exists(dst_path) or link_file(os.path.join(src_dir, chunk_hash + ext), dst_path):
+                break
+        else:
+            cold = cold_tier_for_chunks(dst_dir)
+            kind = cold.kind(chunk_hash) if cold is not None else None
+            if kind is None:
+                _unlink_chain(chain)
+                return False
+            ext = KIND_EXT[kind]
+            dst_path = os.path.join(dst_dir, chunk_hash + ext)
+            try:
+                copy_file(cold.path(chunk_hash, kind), dst_path)
+            except FileNotFoundError:
+                # Chỉ mục đã cũ (chunk vừa được đưa lại tier nóng) -> caller tự ghi dữ liệu
+                cold.reload()
+                _unlink_chain(chain)
+                return False
+
+        if ext == CHUNK_EXT:
+            return True
+        chain.append(dst_path)
+        with open(dst_path, "rb") as f:
+            chunk_hash = parse_delta_header(f.read(DELTA_HEADER.size))[0]
+
+
+class LocalBackend(StorageBackend):
+    """
+    Lưu trữ trên filesystem cục bộ theo layout gốc:
+        <store>/<snap_id>/manifest.json
+        <store>/<snap_id>/chunks/<hash>.chunk
+        <store>/<snap_id>/chunks/<hash>.delta   (chunk lưu dạng delta, xem storage.delta)
+    Snapshot đang ghi nằm trong <store>/.tmp_<snap_id>, publish bằng rename (atomic)
+    Base của mọi chunk delta được link vào cùng thư mục chunks nên mỗi snapshot tự đủ dữ liệu
+    Chunk ít dùng có thể được job phân tầng chuyển sang tier lạnh (xem storage.tiers)
+    """
+
+    supports_delta = True
+
+    def __init__(self, store_path):
+        self.store_path = store_path
+
+    def _temp_dir(self, snap_id):
+        return os.path.join(self.store_path, f".tmp_{snap_id}")
+
+    def _snap_dir(self, snap_id):
+        return os.path.join(self.store_path, snap_id)
+
+    def begin_snapshot(self, snap_id):
+        ensure_dir(os.path.join(self._temp_dir(snap_id), "chunks"))
+
+    def put_chunk(self, snap_id, chunk_hash, data, src_snap_id=None):
+        # Chunk đã có trong store -> hard link thay vì ghi lại
+        if src_snap_id is not None and self.link_chunk(snap_id, chunk_hash, src_snap_id):
+            return
+        write_file(os.path.join(self._temp_dir(snap_id), "chunks", chunk_hash + CHUNK_EXT), data)
+
+    def link_chunk(self, snap_id, chunk_hash, src_snap_id):
+        return link_chunk_chain(os.path.join(self._snap_dir(src_snap_id), "chunks"),
+                                os.path.join(self._temp_dir(snap_id), "chunks"), chunk_hash)
+
+    def get_delta_base(self, snap_id, base_hash, base_snap_id=None):
+        chunks_dir = os.path.join(self._temp_dir(snap_id) if base_snap_id is None
+                                  else self._snap_dir(base_snap_id), "chunks")
+        try:
+            return read_chunk_file(chunks_dir, base_hash), chunk_depth(chunks_dir, base_hash)
+        except (OSError, ValueError):
+            return None
+
+    def put_delta(self, snap_id, chunk_hash, blob, base_hash, base_snap_id=None):
+        chunks_dir = os.path.join(self._temp_dir(snap_id), "chunks")
+        if base_snap_id is not None and not link_chunk_chain(
+                os.path.join(self._snap_dir(base_snap_id), "chunks"), chunks_dir, base_hash):
+            return False
+        write_file(os.path.join(chunks_dir, chunk_hash + DELTA_EXT), blob)
+        return True
+
+    def put_manifest(self, snap_id, data):
+        write_file(os.path.join(self._temp_dir(snap_id), "manifest.json"), data)
+
+    def publish_snapshot(self, snap_id):
+        temp_dir = self._temp_dir(snap_id)
+        if os.path.exists(temp_dir):
+            os.rename(temp_dir, self._snap_dir(snap_id))
+
+    def abort_snapshot(self, snap_id):
+        remove_dir(self._temp_dir(snap_id))
+
+    def has_snapshot(self, snap_id):
+        return os.path.exists(self._snap_dir(snap_id))
+
+    def list_snapshots(self):
+        result = set()
+        for name in os.listdir(self.store_path):
+            if not os.path.isdir(os.path.join(self.store_path, name)):
+                continue
+            if name.startswith(".tmp_"):
+                result.add(name[len(".tmp_"):])
+            elif not name.startswith("."):
+                result.add(name)
+        return result
+
+    def get_manifest(self, snap_id):
+        with open(os.path.join(self._snap_dir(snap_id), "manifest.json"), "rb") as f:
+            return f.read()
+
+    def list_chunks(self, snap_id):
+        # Một lần listdir thay vì stat từng chunk
+        try:
+            names = os.listdir(os.path.join(self._snap_dir(snap_id), "chunks"))
+        except FileNotFoundError:
+            return set()
+        return {n[:-len(CHUNK_EXT)] for n in names if n.endswith((CHUNK_EXT, DELTA_EXT))}
+
+    def has_chunks(self, snap_id, chunk_hashes):
+        wanted = set(chunk_hashes)
+        present = wanted & self.list_chunks(snap_id)
+        cold = cold_tier(self.store_path)
+        if cold is not None:
+            present |= {h for h in wanted - present if cold.kind(h) is not None}
+        return present
+
+    def get_chunks(self, snap_id, chunk_hashes):
+        chunks_dir = os.path.join(self._snap_dir(snap_id), "chunks")
+        base_cache = {}
+        for chunk_hash in chunk_hashes:
+            try:
+                yield chunk_hash, read_chunk_file(chunks_dir, chunk_hash, base_cache)
+            except (FileNotFoundError, ValueError):
+                # Chunk không có hoặc delta không giải mã được (base mất/hỏng)
+                yield chunk_hash, None
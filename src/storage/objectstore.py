@@ -0,0 +1,259 @@
+import queue
+import threading
+import http.client
+import xml.etree.ElementTree as ET
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, quote, urlencode
+from storage.base import StorageBackend
+
+# Số request chạy song song mặc định (mỗi worker giữ một connection keep-alive)
+DEFAULT_WORKERS = 8
+
+# Số key tối đa mỗi trang ListObjectsV2
+LIST_PAGE_SIZE = 1000
+
+# Lỗi của connection keep-alive đã bị server đóng -> mở connection mới và gửi lại
+_RETRY_ERRORS = (http.client.RemoteDisconnected, http.client.BadStatusLine,
+                 ConnectionResetError, BrokenPipeError)
+
+
+class _ConnectionPool:
+    """Pool connection HTTP/1.1 keep-alive tới một host, dùng chung giữa các thread"""
+
+    def __init__(self, scheme, host, port, timeout):
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.idle = queue.LifoQueue()
+
+    def _connect(self):
+        cls = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+        return cls(self.host, self.port, timeout=self.timeout)
+
+    def request(self, method, path, body=None, headers=None):
+        """Gửi request, trả về (status, headers, body); connection được trả lại pool"""
+        for attempt in range(2):
+            try:
+                conn = self.idle.get_nowait()
+                reused = True
+            except queue.Empty:
+                conn = self._connect()
+                reused = False
+
+            try:
+                conn.request(method, path, body=body, headers=headers or {})
+                resp = conn.getresponse()
+                data = resp.read()
+            except _RETRY_ERRORS:
+                conn.close()
+                # Chỉ retry khi connection lấy từ pool (server đã đóng connection idle)
+                if reused and attempt == 0:
+                    continue
+                raise
+            except Exception:
+                conn.close()
+                raise
+
+            if resp.will_close:
+                conn.close()
+            else:
+                self.idle.put(conn)
+            return resp.status, resp.headers, data
+
+    def close(self):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class HTTPBackend(StorageBackend):
+    """
+    Lưu trữ trên object store kiểu S3 qua HTTP:
+        PUT/GET/HEAD/DELETE /<bucket>/<prefix>/<snap_id>/chunks/<hash>.chunk
+        GET /<bucket>?list-type=2&prefix=...        (ListObjectsV2)
+        PUT + x-amz-copy-source                     (copy phía server, không truyền dữ liệu)
+
+    Object store không có rename nên chunk được ghi thẳng vào key chính thức;
+    điểm commit vẫn là COMMIT trong WAL cục bộ.
+    Ghi chạy bất đồng bộ trên thread pool (giới hạn số chunk đang bay để chặn bộ nhớ),
+    đọc được prefetch theo cửa sổ và trả về đúng thứ tự.
+    """
+
+    def __init__(self, url, workers=DEFAULT_WORKERS, timeout=60):
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"Invalid store URL: {url}")
+
+        path = parts.path.strip("/")
+        if not path:
+            raise ValueError(f"Store URL must include a bucket: {url}")
+        self.bucket, _, prefix = path.partition("/")
+        self.prefix = f"{prefix}/" if prefix else ""
+        self.location = f"{parts.scheme}://{parts.netloc}/{self.bucket}/{self.prefix}"
+
+        self.workers = max(1, workers)
+        self.pool = _ConnectionPool(parts.scheme, parts.hostname, parts.port, timeout)
+        self.executor = ThreadPoolExecutor(max_workers=self.workers)
+
+        # Giới hạn số thao tác ghi đang chạy + lỗi đầu tiên để báo ở flush()
+        self.inflight = threading.BoundedSemaphore(self.workers * 4)
+        self.pending = 0
+        self.pending_cond = threading.Condition()
+        self.error = None
+
+    # --- Tầng object ---
+
+    def _key(self, snap_id, name):
+        return f"{self.prefix}{snap_id}/{name}"
+
+    def _chunk_key(self, snap_id, chunk_hash):
+        return self._key(snap_id, f"chunks/{chunk_hash}.chunk")
+
+    def _path(self, key):
+        return f"/{self.bucket}/{quote(key)}"
+
+    def _request(self, method, key, body=None, headers=None, ok=(200,)):
+        status, resp_headers, data = self.pool.request(method, self._path(key), body, headers)
+        if status not in ok:
+            raise IOError(f"HTTP {status} on {method} {key}")
+        return status, data
+
+    def _put_object(self, key, data):
+        self._request("PUT", key, data, {"Content-Type": "application/octet-stream"})
+
+    def _get_object(self, key):
+        status, data = self._request("GET", key, ok=(200, 404))
+        return data if status == 200 else None
+
+    def _copy_object(self, src_key, dst_key):
+        """Copy phía server; False nếu object nguồn không còn"""
+        status, _ = self._request("PUT", dst_key, b"",
+                                  {"x-amz-copy-source": self._path(src_key)}, ok=(200, 404))
+        return status == 200
+
+    def _list_keys(self, prefix, delimiter=None):
+        """
+        Duyệt mọi key có prefix (ListObjectsV2, phân trang)
+        delimiter: gộp các key theo phần đứng trước delimiter -> chỉ yield các CommonPrefixes
+        """
+        token = None
+        while True:
+            params = {"list-type": "2", "prefix": prefix, "max-keys": str(LIST_PAGE_SIZE)}
+            if delimiter:
+                params["delimiter"] = delimiter
+            if token:
+                params["continuation-token"] = token
+            status, _, data = self.pool.request("GET", f"/{self.bucket}?{urlencode(params)}")
+            if status != 200:
+                raise IOError(f"HTTP {status} on LIST {prefix}")
+
+            root = ET.fromstring(data)
+            token = None
+            truncated = False
+            for elem in root.iter():
+                tag = elem.tag.rsplit("}", 1)[-1]
+                if tag == "Key" and not delimiter:
+                    yield elem.text
+                elif tag == "CommonPrefixes" and delimiter:
+                    for child in elem:
+                        if child.tag.rsplit("}", 1)[-1] == "Prefix":
+                            yield child.text
+                elif tag == "IsTruncated":
+                    truncated = elem.text == "true"
+                elif tag == "NextContinuationToken":
+                    token = elem.text
+            if not truncated or not token:
+                return
+
+    # --- Ghi bất đồng bộ ---
+
+    def _submit(self, fn, *args):
+        self.inflight.acquire()
+        with self.pending_cond:
+            self.pending += 1
+        future = self.executor.submit(fn, *args)
+        future.add_done_callback(self._done)
+
+    def _done(self, future):
+        error = future.exception()
+        with self.pending_cond:
+            if error is not None and self.error is None:
+                self.error = error
+            self.pending -= 1
+            self.pending_cond.notify_all()
+        self.inflight.release()
+
+    def _put_chunk(self, snap_id, chunk_hash, data, src_snap_id):
+        dst_key = self._chunk_key(snap_id, chunk_hash)
+        if src_snap_id is not None and self._copy_object(self._chunk_key(src_snap_id, chunk_hash), dst_key):
+            return
+        self._put_object(dst_key, data)
+
+    def flush(self):
+        with self.pending_cond:
+            while self.pending:
+                self.pending_cond.wait()
+            error, self.error = self.error, None
+        if error is not None:
+            raise error
+
+    # --- StorageBackend ---
+
+    def begin_snapshot(self, snap_id):
+        pass
+
+    def put_chunk(self, snap_id, chunk_hash, data, src_snap_id=None):
+        if self.error is not None:
+            self.flush()
+        self._submit(self._put_chunk, snap_id, chunk_hash, data, src_snap_id)
+
+    def put_manifest(self, snap_id, data):
+        self._submit(self._put_object, self._key(snap_id, "manifest.json"), data)
+
+    def abort_snapshot(self, snap_id):
+        try:
+            self.flush()
+        except Exception:
+            pass
+        for key in list(self._list_keys(self._key(snap_id, ""))):
+            self._submit(self._request, "DELETE", key, None, None, (200, 204, 404))
+        self.flush()
+
+    def has_snapshot(self, snap_id):
+        status, _ = self._request("HEAD", self._key(snap_id, "manifest.json"), ok=(200, 404))
+        return status == 200
+
+    def get_manifest(self, snap_id):
+        data = self._get_object(self._key(snap_id, "manifest.json"))
+        if data is None:
+            raise FileNotFoundError(f"Manifest not found: {snap_id}")
+        return data
+
+    def list_snapshots(self):
+        # Một request LIST theo delimiter thay vì duyệt mọi chunk
+        return {p[len(self.prefix):].rstrip("/") for p in self._list_keys(self.prefix, "/")}
+
+    def list_chunks(self, snap_id):
+        prefix = self._key(snap_id, "chunks/")
+        return {key[len(prefix):-len(".chunk")]
+                for key in self._list_keys(prefix) if key.endswith(".chunk")}
+
+    def get_chunks(self, snap_id, chunk_hashes):
+        window = deque()
+        for chunk_hash in chunk_hashes:
+            window.append((chunk_hash, self.executor.submit(
+                self._get_object, self._chunk_key(snap_id, chunk_hash))))
+            if len(window) >= self.workers * 2:
+                chunk_hash, future = window.popleft()
+                yield chunk_hash, future.result()
+        while window:
+            chunk_hash, future = window.popleft()
+            yield chunk_hash, future.result()
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.pool.close()
@@ -0,0 +1,170 @@
+"""
+Object store tối giản tương thích S3 (PUT/GET/HEAD/DELETE, ListObjectsV2, copy phía server)
+dùng để chạy/test HTTPBackend cục bộ:
+
+    python src/storage/server.py --root /tmp/objects --port 9000
+    python src/cli.py --store-url http://127.0.0.1:9000/labcli backup data --label x
+"""
+import os
+import argparse
+import tempfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, unquote, parse_qs
+from xml.sax.saxutils import escape
+
+
+class ObjectStoreHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 -> giữ connection keep-alive giữa các request
+    protocol_version = "HTTP/1.1"
+    root = "."
+
+    def log_message(self, format, *args):
+        pass
+
+    def _parse(self):
+        parts = urlsplit(self.path)
+        bucket, _, key = unquote(parts.path).lstrip("/").partition("/")
+        if not bucket or any(seg in ("", ".", "..") for seg in bucket.split("/")):
+            return None, None, None
+        if key and any(seg in ("", ".", "..") for seg in key.split("/")):
+            return None, None, None
+        return bucket, key, parse_qs(parts.query)
+
+    def _file(self, bucket, key):
+        return os.path.join(self.root, bucket, *key.split("/"))
+
+    def _send(self, status, body=b"", content_type="application/octet-stream"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _read_body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def do_PUT(self):
+        bucket, key, _ = self._parse()
+        body = self._read_body()
+        if not key:
+            return self._send(400)
+
+        copy_source = self.headers.get("x-amz-copy-source")
+        if copy_source:
+            src_bucket, _, src_key = unquote(copy_source).lstrip("/").partition("/")
+            if ".." in src_key.split("/") or ".." in src_bucket.split("/"):
+                return self._send(400)
+            try:
+                with open(self._file(src_bucket, src_key), "rb") as f:
+                    body = f.read()
+            except FileNotFoundError:
+                return self._send(404)
+
+        # Ghi file tạm rồi rename -> reader không bao giờ thấy object ghi dở
+        path = self._file(bucket, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".put-")
+        with os.fdopen(fd, "wb") as f:
+            f.write(body)
+        os.replace(tmp_path, path)
+        self._send(200)
+
+    def do_GET(self):
+        bucket, key, query = self._parse()
+        if bucket is None:
+            return self._send(400)
+        if not key:
+            return self._list(bucket, query)
+        try:
+            with open(self._file(bucket, key), "rb") as f:
+                self._send(200, f.read())
+        except (FileNotFoundError, IsADirectoryError):
+            self._send(404)
+
+    def do_HEAD(self):
+        bucket, key, _ = self._parse()
+        if key and os.path.isfile(self._file(bucket, key)):
+            self.send_response(200)
+            self.send_header("Content-Length", str(os.path.getsize(self._file(bucket, key))))
+            self.end_headers()
+        else:
+            self._send(404)
+
+    def do_DELETE(self):
+        bucket, key, _ = self._parse()
+        if not key:
+            return self._send(400)
+        try:
+            os.remove(self._file(bucket, key))
+        except FileNotFoundError:
+            pass
+        self._send(204)
+
+    def _list(self, bucket, query):
+        """
+        ListObjectsV2: key theo thứ tự, phân trang bằng continuation-token (= key cuối)
+        delimiter: key có delimiter sau prefix được gộp thành CommonPrefixes
+        """
+        prefix = query.get("prefix", [""])[0]
+        delimiter = query.get("delimiter", [""])[0]
+        max_keys = int(query.get("max-keys", ["1000"])[0])
+        after = query.get("continuation-token", [""])[0]
+
+        bucket_dir = os.path.join(self.root, bucket)
+        # Chỉ duyệt thư mục chứa prefix thay vì cả bucket
+        walk_dir = os.path.join(bucket_dir, *prefix.split("/")[:-1])
+        keys = []
+        for dirpath, _, filenames in os.walk(walk_dir):
+            rel_dir = os.path.relpath(dirpath, bucket_dir).replace(os.sep, "/")
+            for name in filenames:
+                if name.startswith(".put-"):
+                    continue
+                key = name if rel_dir == "." else f"{rel_dir}/{name}"
+                if not key.startswith(prefix):
+                    continue
+                if delimiter and delimiter in key[len(prefix):]:
+                    key = key[:key.index(delimiter, len(prefix)) + len(delimiter)]
+                if key > after:
+                    keys.append(key)
+        keys = sorted(set(keys))
+
+        page = keys[:max_keys]
+        truncated = len(keys) > max_keys
+        body = ['<?xml version="1.0" encoding="UTF-8"?>',
+                '<ListBucketResult xmlns="http://s3.amazonaws.com/doc/2006-03-01/">',
+                f"<Name>{escape(bucket)}</Name><Prefix>{escape(prefix)}</Prefix>",
+                f"<KeyCount>{len(page)}</KeyCount>",
+                f"<IsTruncated>{'true' if truncated else 'false'}</IsTruncated>"]
+        if truncated:
+            body.append(f"<NextContinuationToken>{escape(page[-1])}</NextContinuationToken>")
+        for key in page:
+            if delimiter and key.endswith(delimiter) and delimiter in key[len(prefix):]:
+                body.append(f"<CommonPrefixes><Prefix>{escape(key)}</Prefix></CommonPrefixes>")
+            else:
+                body.append(f"<Contents><Key>{escape(key)}</Key></Contents>")
+        body.append("</ListBucketResult>")
+        self._send(200, "".join(body).encode("utf-8"), "application/xml")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local S3-compatible object store for LabCLI")
+    parser.add_argument("--root", required=True)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    args = parser.parse_args()
+
+    os.makedirs(args.root, exist_ok=True)
+    ObjectStoreHandler.root = os.path.abspath(args.root)
+    server = ThreadingHTTPServer((args.host, args.port), ObjectStoreHandler)
+    print(f"Object store listening on http://{args.host}:{args.port}/ (root: {args.root})", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import time
+from storage.base import StorageBackend
+
+
+class ThrottledBackend(StorageBackend):
+    """
+    Bọc một backend, tính mọi lần đọc/ghi chunk và manifest vào utils.throttle.Throttle
+    Các thao tác khác chuyển thẳng xuống backend bên dưới
+    """
+
+    def __init__(self, backend, throttle):
+        self.backend = backend
+        self.throttle = throttle
+        self.supports_delta = backend.supports_delta
+        self.location = backend.location
+
+    def begin_snapshot(self, snap_id):
+        self.backend.begin_snapshot(snap_id)
+
+    def put_chunk(self, snap_id, chunk_hash, data, src_snap_id=None):
+        # Chunk link được từ snapshot cũ chỉ tốn một thao tác metadata
+        if src_snap_id is not None and self.backend.link_chunk(snap_id, chunk_hash, src_snap_id):
+            self.throttle.charge(0)
+            return
+        self.throttle.charge(len(data))
+        self.backend.put_chunk(snap_id, chunk_hash, data, src_snap_id)
+
+    def link_chunk(self, snap_id, chunk_hash, src_snap_id):
+        return self.backend.link_chunk(snap_id, chunk_hash, src_snap_id)
+
+    def get_delta_base(self, snap_id, base_hash, base_snap_id=None):
+        started = time.monotonic()
+        base = self.backend.get_delta_base(snap_id, base_hash, base_snap_id)
+        if base is not None:
+            self.throttle.charge(len(base[0]), latency=time.monotonic() - started)
+        return base
+
+    def put_delta(self, snap_id, chunk_hash, blob, base_hash, base_snap_id=None):
+        self.throttle.charge(len(blob))
+        return self.backend.put_delta(snap_id, chunk_hash, blob, base_hash, base_snap_id)
+
+    def put_manifest(self, snap_id, data):
+        self.throttle.charge(len(data))
+        self.backend.put_manifest(snap_id, data)
+
+    def flush(self):
+        self.backend.flush()
+
+    def publish_snapshot(self, snap_id):
+        self.backend.publish_snapshot(snap_id)
+
+    def abort_snapshot(self, snap_id):
+        self.backend.abort_snapshot(snap_id)
+
+    def has_snapshot(self, snap_id):
+        return self.backend.has_snapshot(snap_id)
+
+    def get_manifest(self, snap_id):
+        data = self.backend.get_manifest(snap_id)
+        self.throttle.charge(len(data))
+        return data
+
+    def list_snapshots(self):
+        return self.backend.list_snapshots()
+
+    def list_chunks(self, snap_id):
+        return self.backend.list_chunks(snap_id)
+
+    def has_chunks(self, snap_id, chunk_hashes):
+        return self.backend.has_chunks(snap_id, chunk_hashes)
+
+    def get_chunks(self, snap_id, chunk_hashes):
+        return self.throttle.iter_reads(self.backend.get_chunks(snap_id, chunk_hashes),
+                                        size=lambda item: len(item[1]) if item[1] is not None else 0)
+
+    def close(self):
+        self.backend.close()
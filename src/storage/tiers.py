@@ -0,0 +1,176 @@
+import os
+import json
+import mmap
+import time
+import struct
+
+# Trạng thái phân tầng nằm trong store/.tiers/
+#   config.json  {"cold_dir": "..."}  thư mục tier lạnh (volume chậm, dung lượng lớn)
+#   cold.idx     các chunk đang ở tier lạnh: record (digest 32 byte, 1 byte loại) đã sort
+#   access.log   "<timestamp_ms> <snapshot_id> <restore|verify>" mỗi lần đọc snapshot
+# Tier nóng là chính các thư mục snapshot trong store/ (volume nhanh)
+# Chunk ở tier lạnh: <cold_dir>/<2 ký tự đầu>/<hash>.chunk|.delta
+TIERS_DIR = ".tiers"
+TIERS_CONFIG = "config.json"
+COLD_INDEX = "cold.idx"
+ACCESS_LOG = "access.log"
+
+COLD_MAGIC = b"LCCLD001"
+COLD_RECORD = struct.Struct("<32sB")
+KIND_CHUNK = 0
+KIND_DELTA = 1
+KIND_EXT = {KIND_CHUNK: ".chunk", KIND_DELTA: ".delta"}
+
+
+def tiers_dir(store_path):
+    return os.path.join(store_path, TIERS_DIR)
+
+
+def load_tier_config(store_path):
+    try:
+        with open(os.path.join(tiers_dir(store_path), TIERS_CONFIG), "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def save_tier_config(store_path, config):
+    os.makedirs(tiers_dir(store_path), exist_ok=True)
+    path = os.path.join(tiers_dir(store_path), TIERS_CONFIG)
+    with open(path + ".tmp", "w") as f:
+        json.dump(config, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".tmp", path)
+
+
+def record_access(store_path, snapshot_id, kind):
+    """
+    Ghi nhận một lần restore/verify đọc snapshot (thống kê truy cập cho phân tầng)
+    Store chưa cấu hình tier lạnh thì không ghi gì
+    """
+    if cold_tier(store_path) is None:
+        return
+    try:
+        os.makedirs(tiers_dir(store_path), exist_ok=True)
+        line = f"{int(time.time() * 1000)} {snapshot_id} {kind}\n".encode("utf-8")
+        fd = os.open(os.path.join(tiers_dir(store_path), ACCESS_LOG),
+                     os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+    except OSError:
+        # Thống kê chỉ là gợi ý cho phân tầng, không làm hỏng lệnh đọc
+        pass
+
+
+def read_access_log(store_path):
+    """Yield (timestamp_ms, snapshot_id, kind)"""
+    try:
+        with open(os.path.join(tiers_dir(store_path), ACCESS_LOG), "r") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[0].isdigit():
+                    yield int(parts[0]), parts[1], parts[2]
+    except FileNotFoundError:
+        return
+
+
+def write_cold_index(store_path, entries):
+    """Ghi chỉ mục tier lạnh từ {digest: kind} (file tạm + rename)"""
+    os.makedirs(tiers_dir(store_path), exist_ok=True)
+    path = os.path.join(tiers_dir(store_path), COLD_INDEX)
+    with open(path + ".tmp", "wb") as f:
+        f.write(COLD_MAGIC)
+        f.write(b"".join(COLD_RECORD.pack(d, entries[d]) for d in sorted(entries)))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".tmp", path)
+
+
+class ColdTier:
+    """
+    Tier lạnh của một store: chỉ mục (mmap, binary search) cho biết chunk nào nằm ở tier lạnh
+    nên mỗi lần đọc chunk chỉ mở đúng một file (không stat thử cả hai tier)
+    """
+
+    def __init__(self, store_path, cold_dir):
+        self.store_path = store_path
+        self.cold_dir = cold_dir
+        self.index_path = os.path.join(tiers_dir(store_path), COLD_INDEX)
+        self.mm = None
+        self.count = 0
+        self.reload()
+
+    def reload(self):
+        """Nạp lại chỉ mục (sau khi job phân tầng vừa chuyển chunk)"""
+        if self.mm is not None:
+            self.mm.close()
+        self.mm, self.count = None, 0
+        try:
+            with open(self.index_path, "rb") as f:
+                if os.fstat(f.fileno()).st_size > len(COLD_MAGIC):
+                    self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            return
+        if self.mm is not None:
+            if self.mm[:len(COLD_MAGIC)] != COLD_MAGIC:
+                self.mm.close()
+                self.mm = None
+                return
+            self.count = (len(self.mm) - len(COLD_MAGIC)) // COLD_RECORD.size
+
+    def kind(self, chunk_hash):
+        """Loại file (KIND_CHUNK/KIND_DELTA) nếu chunk ở tier lạnh, None nếu không"""
+        if not self.count:
+            return None
+        try:
+            digest = bytes.fromhex(chunk_hash)
+        except ValueError:
+            return None
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            off = len(COLD_MAGIC) + mid * COLD_RECORD.size
+            key = self.mm[off:off + 32]
+            if key < digest:
+                lo = mid + 1
+            elif key > digest:
+                hi = mid
+            else:
+                return self.mm[off + 32]
+        return None
+
+    def entries(self):
+        """{digest: kind} của toàn bộ chỉ mục"""
+        result = {}
+        for i in range(self.count):
+            digest, kind = COLD_RECORD.unpack_from(self.mm, len(COLD_MAGIC) + i * COLD_RECORD.size)
+            result[digest] = kind
+        return result
+
+    def path(self, chunk_hash, kind):
+        return os.path.join(self.cold_dir, chunk_hash[:2], chunk_hash + KIND_EXT[kind])
+
+    def locate(self, chunk_hash):
+        """Đường dẫn chunk ở tier lạnh theo chỉ mục, None nếu chunk không ở đó"""
+        kind = self.kind(chunk_hash)
+        return None if kind is None else self.path(chunk_hash, kind)
+
+
+# Tier lạnh theo store (None = store không phân tầng), nạp một lần cho mỗi process
+_cold_tiers = {}
+
+
+def cold_tier(store_path):
+    store_path = os.path.abspath(store_path)
+    if store_path not in _cold_tiers:
+        cold_dir = load_tier_config(store_path).get("cold_dir")
+        _cold_tiers[store_path] = ColdTier(store_path, cold_dir) if cold_dir else None
+    return _cold_tiers[store_path]
+
+
+def cold_tier_for_chunks(chunks_dir):
+    """Tier lạnh của store chứa thư mục chunks (<store>/<snapshot>/chunks)"""
+    return cold_tier(os.path.dirname(os.path.dirname(chunks_dir)))
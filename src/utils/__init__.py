@@ -1,15 +1,21 @@
-from .hash import sha256_bytes, sha256_str
+from .hash import sha256_bytes, sha256_str, zero_chunk_hash, HashSuite, get_hash_suite, HASH_SUITES
 from .fs import (
     ensure_dir,
     list_files,
     read_chunks,
+    read_sparse_chunks,
+    read_stream_chunks,
+    iter_lines_reversed,
+    is_zero_block,
     write_file,
+    link_file,
     remove_dir,
     file_exists,
     dir_exists,
 )
 from .constants import (
     CHUNK_SIZE,
+    DEFAULT_HASH_SUITE,
     STATUS_OK,
     STATUS_FAIL,
     STATUS_DENY,
@@ -19,14 +25,24 @@ from .constants import (
 __all__ = [
     "sha256_bytes",
     "sha256_str",
+    "zero_chunk_hash",
+    "HashSuite",
+    "get_hash_suite",
+    "HASH_SUITES",
     "ensure_dir",
     "list_files",
     "read_chunks",
+    "read_sparse_chunks",
+    "read_stream_chunks",
+    "iter_lines_reversed",
+    "is_zero_block",
     "write_file",
+    "link_file",
     "remove_dir",
     "file_exists",
     "dir_exists",
     "CHUNK_SIZE",
+    "DEFAULT_HASH_SUITE",
     "STATUS_OK",
     "STATUS_FAIL",
     "STATUS_DENY",
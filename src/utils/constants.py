@@ -1,5 +1,8 @@
 CHUNK_SIZE = 1024 * 1024  # 1MiB
 
+# Hash suite cho snapshot mới (xem utils.hash.HASH_SUITES)
+DEFAULT_HASH_SUITE = "sha256-hex"
+
 STATUS_OK = "OK"
 STATUS_FAIL = "FAIL"
 STATUS_DENY = "DENY"
@@ -1,4 +1,5 @@
 import os
+import errno
 import shutil
 
 def ensure_dir(path: str):
@@ -42,6 +43,111 @@ def read_chunks(file_path: str, chunk_size: int):
             yield chunk
 
 
+_ZERO_BLOCK = bytes(1024 * 1024)
+
+
+def is_zero_block(data: bytes) -> bool:
+    """Kiểm tra nhanh block toàn byte 0 (memcmp với block 0 dựng sẵn)"""
+    n = len(data)
+    if n == len(_ZERO_BLOCK):
+        return data == _ZERO_BLOCK
+    if n < len(_ZERO_BLOCK):
+        return data == _ZERO_BLOCK[:n]
+    return not data.strip(b"\0")
+
+
+def _next_data(fd: int, offset: int, size: int) -> int:
+    """Vị trí dữ liệu đầu tiên từ offset (size nếu phía sau toàn hole)"""
+    try:
+        return os.lseek(fd, offset, os.SEEK_DATA)
+    except OSError as e:
+        # ENXIO: không còn dữ liệu; lỗi khác: filesystem không hỗ trợ -> coi là dữ liệu
+        return size if e.errno == errno.ENXIO else offset
+
+
+def _next_hole(fd: int, offset: int, size: int) -> int:
+    """Vị trí hole đầu tiên từ offset (cuối file luôn được coi là một hole)"""
+    try:
+        return os.lseek(fd, offset, os.SEEK_HOLE)
+    except OSError:
+        return size
+
+
+def read_sparse_chunks(file_path: str, chunk_size: int):
+    """
+    Đọc file theo từng chunk, bỏ qua các hole của sparse file
+    Yield (length, data); data là None nếu cả chunk nằm trong hole (toàn byte 0, không cần đọc)
+    Ranh giới chunk giữ nguyên như read_chunks nên manifest không phụ thuộc file có sparse hay không
+    """
+    sparse = hasattr(os, "SEEK_DATA") and hasattr(os, "SEEK_HOLE")
+
+    with open(file_path, "rb") as f:
+        fd = f.fileno()
+        size = os.fstat(fd).st_size
+        offset = 0
+
+        # [data_start, hole_start) là extent dữ liệu kế tiếp tính từ offset
+        data_start, hole_start = 0, size
+        if sparse:
+            data_start = _next_data(fd, 0, size)
+            hole_start = _next_hole(fd, data_start, size)
+
+        while offset < size:
+            length = min(chunk_size, size - offset)
+            end = offset + length
+
+            if data_start >= end:
+                yield length, None
+            else:
+                f.seek(offset)
+                yield length, f.read(length)
+
+            offset = end
+            # Đã đi qua hết extent dữ liệu hiện tại -> tìm extent tiếp theo
+            if sparse and offset >= hole_start and offset < size:
+                data_start = _next_data(fd, offset, size)
+                hole_start = _next_hole(fd, data_start, size)
+
+
+def read_stream_chunks(stream, chunk_size: int):
+    """
+    Đọc stream (stdin, pipe) theo từng chunk đủ chunk_size, buffer tối đa một chunk
+    Yield (length, data) giống read_sparse_chunks để backup dùng chung một vòng lặp
+    """
+    while True:
+        buf = bytearray()
+        while len(buf) < chunk_size:
+            data = stream.read(chunk_size - len(buf))
+            if not data:
+                break
+            buf += data
+        if not buf:
+            return
+        yield len(buf), bytes(buf)
+        if len(buf) < chunk_size:
+            return
+
+
+def iter_lines_reversed(path: str, block_size: int = 64 * 1024):
+    """
+    Duyệt các dòng (bytes, không có newline) từ cuối file ngược lên đầu
+    Chỉ đọc phần cuối file cần thiết, không phụ thuộc kích thước file
+    """
+    with open(path, "rb") as f:
+        pos = f.seek(0, os.SEEK_END)
+        tail = b""
+        while pos > 0:
+            step = min(block_size, pos)
+            pos -= step
+            f.seek(pos)
+            lines = (f.read(step) + tail).split(b"\n")
+            # Dòng đầu block có thể còn phần phía trước chưa đọc
+            tail = lines.pop(0)
+            for line in reversed(lines):
+                yield line
+        yield tail
+
+
 def write_file(path: str, data: bytes):
     """Ghi file binary, tự tạo thư mục cha"""
     parent = os.path.dirname(path)
@@ -52,6 +158,31 @@ def write_file(path: str, data: bytes):
         f.write(data)
 
 
+def link_file(src: str, dst: str) -> bool:
+    """
+    Tạo hard link dst -> src (không copy dữ liệu)
+    Trả về False nếu không link được (src không còn, khác filesystem, ...)
+    """
+    try:
+        os.link(src, dst)
+        return True
+    except OSError:
+        return False
+
+
+def copy_file(src: str, dst: str):
+    """
+    Copy src sang dst an toàn khi crash: ghi file tạm, fsync rồi rename
+    (dst không bao giờ là file ghi dở)
+    """
+    tmp_path = dst + ".tmp"
+    with open(src, "rb") as fin, open(tmp_path, "wb") as fout:
+        shutil.copyfileobj(fin, fout, 1024 * 1024)
+        fout.flush()
+        os.fsync(fout.fileno())
+    os.replace(tmp_path, dst)
+
+
 def remove_dir(path: str):
     """Xoá thư mục (dùng khi rollback/crash)"""
     if os.path.exists(path):
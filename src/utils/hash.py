@@ -1,7 +1,67 @@
 import hashlib
+from functools import lru_cache, partial
 
 def sha256_bytes(data: bytes) -> str:
     return hashlib.sha256(data).hexdigest()
 
 def sha256_str(s: str) -> str:
     return sha256_bytes(s.encode("utf-8"))
+
+class HashSuite:
+    """
+    Bộ hàm hash của một snapshot: hash chunk (chunk ID) và hash node Merkle
+    Tên suite được ghi trong manifest ("hash_suite") và roots.log để verify dùng đúng thuật toán
+    """
+
+    def __init__(self, name, new, raw_nodes):
+        self.name = name
+        self.new = new
+        # raw_nodes: node Merkle hash 64 byte digest thô của hai con
+        # (legacy: hash chuỗi hex 128 ký tự ghép lại)
+        self.raw_nodes = raw_nodes
+        # Gắn sẵn hàm node theo kiểu suite (gọi cho mọi node của cây, tránh rẽ nhánh mỗi lần)
+        self.node = self._raw_node if raw_nodes else self._hex_node
+
+    def chunk_hash(self, data: bytes) -> str:
+        return self.new(data).hexdigest()
+
+    def leaf(self, chunk_hash: str):
+        """Biểu diễn leaf trong cây Merkle"""
+        return bytes.fromhex(chunk_hash) if self.raw_nodes else chunk_hash
+
+    def _raw_node(self, left, right):
+        return self.new(left + right).digest()
+
+    def _hex_node(self, left, right):
+        return self.new((left + right).encode("utf-8")).hexdigest()
+
+    def root_hex(self, node) -> str:
+        return node.hex() if self.raw_nodes else node
+
+
+SHA256_HEX = "sha256-hex"
+SHA256_RAW = "sha256-raw"
+BLAKE2B_256_RAW = "blake2b-256-raw"
+
+# Manifest/roots.log không ghi suite là snapshot tạo trước khi có hash suite
+LEGACY_HASH_SUITE = SHA256_HEX
+
+HASH_SUITES = {
+    SHA256_HEX: HashSuite(SHA256_HEX, hashlib.sha256, raw_nodes=False),
+    SHA256_RAW: HashSuite(SHA256_RAW, hashlib.sha256, raw_nodes=True),
+    BLAKE2B_256_RAW: HashSuite(BLAKE2B_256_RAW, partial(hashlib.blake2b, digest_size=32), raw_nodes=True),
+}
+
+
+def get_hash_suite(name=None) -> HashSuite:
+    """Tra suite theo tên; None -> legacy (sha256-hex)"""
+    try:
+        return HASH_SUITES[name or LEGACY_HASH_SUITE]
+    except KeyError:
+        raise ValueError(f"Unknown hash suite: {name}")
+
+
+@lru_cache(maxsize=None)
+def zero_chunk_hash(length: int, suite: str = LEGACY_HASH_SUITE) -> str:
+    """Hash của khối toàn byte 0 dài length (chỉ tính một lần cho mỗi độ dài và suite)"""
+    return get_hash_suite(suite).chunk_hash(bytes(length))
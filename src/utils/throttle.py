@@ -0,0 +1,161 @@
+import os
+import time
+import threading
+
+MIB = 1024 * 1024
+
+# Token bucket cho phép dồn tối đa lượng I/O tương ứng khoảng thời gian này
+BURST_SECONDS = 0.25
+
+# Adaptive backoff: so latency ngắn hạn (EWMA nhanh) với mức nền dài hạn (EWMA chậm)
+LATENCY_FAST_ALPHA = 0.3
+LATENCY_SLOW_ALPHA = 0.02
+LATENCY_FACTOR = 2.0
+LATENCY_WARMUP = 8
+MIN_BACKOFF = 0.01
+MAX_BACKOFF = 0.5
+
+# ioprio_set(2): lớp IDLE chỉ được phục vụ khi đĩa rảnh
+_IOPRIO_WHO_PROCESS = 1
+_IOPRIO_CLASS_IDLE = 3
+_IOPRIO_CLASS_SHIFT = 13
+_SYS_IOPRIO_SET = {"x86_64": 251, "aarch64": 30, "i386": 289, "i686": 289}
+
+
+def set_idle_priority():
+    """
+    Hạ ưu tiên của process: CPU nice 19 và lớp I/O idle (Linux)
+    Trả về True nếu đặt được lớp I/O idle
+    """
+    # Import muộn: ctypes/platform chỉ cần khi bật idle priority
+    import ctypes
+    import ctypes.util
+    import platform
+
+    try:
+        os.nice(19 - os.nice(0))
+    except OSError:
+        pass
+    nr = _SYS_IOPRIO_SET.get(platform.machine())
+    if nr is None:
+        return False
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        return libc.syscall(nr, _IOPRIO_WHO_PROCESS, 0, _IOPRIO_CLASS_IDLE << _IOPRIO_CLASS_SHIFT) == 0
+    except (OSError, AttributeError):
+        return False
+
+
+class TokenBucket:
+    """
+    Token bucket cho phép nợ: lấy vượt số token hiện có thì phải chờ trả nợ theo rate
+    Bắt đầu rỗng (không burst lúc khởi động), token chỉ dồn lại khi I/O tạm dừng
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = 0.0
+        self.last = time.monotonic()
+
+    def consume(self, n):
+        """Lấy n token, trả về số giây cần chờ"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        self.tokens -= n
+        return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+
+class Throttle:
+    """
+    Giới hạn I/O cho một lệnh (backup, restore, verify, scrub)
+
+    - bytes_per_sec / iops: token bucket theo byte và theo số thao tác (None = không giới hạn)
+    - adaptive: latency đọc ngắn hạn vượt LATENCY_FACTOR lần mức nền -> lùi lại (ngủ thêm,
+      tăng gấp đôi khi còn chậm, giảm dần khi latency trở lại bình thường)
+    - idle: hạ ưu tiên CPU/I/O của process (set_idle_priority)
+    """
+
+    def __init__(self, bytes_per_sec=None, iops=None, adaptive=False, idle=False):
+        self.bytes_per_sec = bytes_per_sec
+        self.iops = iops
+        self.adaptive = adaptive
+        self.idle = idle and set_idle_priority()
+        self.byte_bucket = TokenBucket(bytes_per_sec, max(bytes_per_sec * BURST_SECONDS, MIB)) \
+            if bytes_per_sec else None
+        self.op_bucket = TokenBucket(iops, max(iops * BURST_SECONDS, 1)) if iops else None
+        self.lock = threading.Lock()
+
+        self.start = time.monotonic()
+        self.bytes = 0
+        self.ops = 0
+        self.throttled = 0.0
+        self.backed_off = 0.0
+        self.latency_fast = None
+        self.latency_slow = None
+        self.samples = 0
+        self.backoff = 0.0
+
+    def _observe(self, nbytes, latency):
+        """Cập nhật latency (giây cho mỗi MiB) và trả về thời gian lùi lại"""
+        per_mib = latency * MIB / max(nbytes, 4096)
+        if self.latency_fast is None:
+            self.latency_fast = self.latency_slow = per_mib
+        else:
+            self.latency_fast += LATENCY_FAST_ALPHA * (per_mib - self.latency_fast)
+            self.latency_slow += LATENCY_SLOW_ALPHA * (per_mib - self.latency_slow)
+        self.samples += 1
+
+        if self.samples > LATENCY_WARMUP and self.latency_fast > LATENCY_FACTOR * self.latency_slow:
+            self.backoff = min(MAX_BACKOFF, max(MIN_BACKOFF, self.backoff * 2))
+        else:
+            self.backoff = self.backoff / 2 if self.backoff >= MIN_BACKOFF else 0.0
+        return self.backoff
+
+    def charge(self, nbytes, ops=1, latency=None):
+        """Tính một thao tác I/O nbytes (latency: thời gian thao tác đọc đã mất) và chờ nếu cần"""
+        with self.lock:
+            self.bytes += nbytes
+            self.ops += ops
+            wait = 0.0
+            if self.byte_bucket is not None:
+                wait = self.byte_bucket.consume(nbytes)
+            if self.op_bucket is not None:
+                wait = max(wait, self.op_bucket.consume(ops))
+            backoff = self._observe(nbytes, latency) if self.adaptive and latency is not None else 0.0
+            self.throttled += wait
+            self.backed_off += backoff
+        if wait + backoff > 0:
+            time.sleep(wait + backoff)
+
+    def iter_reads(self, chunks, size=len):
+        """Bọc iterator đọc dữ liệu: đo latency mỗi lần đọc và tính vào giới hạn"""
+        chunks = iter(chunks)
+        while True:
+            started = time.monotonic()
+            try:
+                item = next(chunks)
+            except StopIteration:
+                return
+            nbytes = size(item)
+            if nbytes:
+                self.charge(nbytes, latency=time.monotonic() - started)
+            yield item
+
+    def report(self):
+        """Một dòng thông lượng đạt được so với giới hạn"""
+        elapsed = max(time.monotonic() - self.start, 1e-6)
+        rate = f"{self.bytes / MIB / elapsed:.1f} MiB/s"
+        if self.bytes_per_sec:
+            rate += f" (limit {self.bytes_per_sec / MIB:g} MiB/s)"
+        iops = f"{self.ops / elapsed:.1f} IOPS"
+        if self.iops:
+            iops += f" (limit {self.iops:g})"
+        line = (f"I/O: {self.bytes} bytes, {self.ops} ops in {elapsed:.2f}s: {rate}, {iops}, "
+                f"throttled {self.throttled:.2f}s")
+        if self.adaptive:
+            line += f", backoff {self.backed_off:.2f}s"
+        if self.idle:
+            line += ", idle priority"
+        return line
@@ -0,0 +1,822 @@
+#!/bin/bash
+
+# Kiểm thử các tính năng bổ sung (Test 16 trở đi)
+# Mỗi test tự tạo store/dataset riêng, không phụ thuộc trạng thái của test.sh
+
+set -e
+
+cd "$(dirname "$0")/.."
+
+echo "=========================================="
+echo "LabCLI Feature Tests"
+echo "=========================================="
+echo ""
+
+echo "Test 16: Concurrent Backups"
+echo "---------------------------"
+rm -rf store dataset_a dataset_b
+mkdir -p dataset_a dataset_b
+dd if=/dev/urandom of=dataset_a/a.dat bs=1M count=20 2>/dev/null
+dd if=/dev/urandom of=dataset_b/b.dat bs=1M count=20 2>/dev/null
+
+# Hai backup chạy song song vào cùng một store
+python src/cli.py backup dataset_a --label "par-a" > /dev/null &
+PID_A=$!
+python src/cli.py backup dataset_b --label "par-b" > /dev/null &
+PID_B=$!
+wait $PID_A
+wait $PID_B
+
+COMMITS=$(grep -c "^COMMIT" store/wal.log)
+INDICES=$(cut -d' ' -f1 store/roots.log | sort -u | wc -l)
+if [ "$COMMITS" -eq 2 ] && [ "$INDICES" -eq 2 ] && [ -z "$(ls -A store | grep '^.tmp_')" ]; then
+    echo "✓ Both concurrent backups committed with distinct root indices!"
+else
+    echo "✗ Concurrent backups interfered (commits=$COMMITS, indices=$INDICES)"
+    exit 1
+fi
+
+if python src/cli.py audit-verify 2>&1 | grep -q "Audit log valid"; then
+    echo "✓ Audit chain intact after concurrent runs!"
+else
+    echo "✗ Audit chain broken by concurrent runs!"
+    exit 1
+fi
+rm -rf dataset_a dataset_b
+echo ""
+
+echo "Test 17: Cross-snapshot Dedup via Chunk Index"
+echo "----------------------------------------------"
+rm -rf store dataset_idx
+mkdir -p dataset_idx
+dd if=/dev/urandom of=dataset_idx/data.bin bs=1M count=3 2>/dev/null
+
+python src/cli.py backup dataset_idx --label "idx1" > /dev/null
+SNAP_IDX1=$(ls -t store | grep -v ".log" | head -1)
+sleep 0.01
+python src/cli.py backup dataset_idx --label "idx2" > /dev/null
+SNAP_IDX2=$(ls -t store | grep -v ".log" | head -1)
+
+CHUNK=$(ls store/$SNAP_IDX2/chunks | head -1)
+LINKS=$(stat -c %h "store/$SNAP_IDX2/chunks/$CHUNK")
+if [ "$SNAP_IDX1" != "$SNAP_IDX2" ] && [ "$LINKS" -eq 2 ] && [ -d store/.chunk_index ]; then
+    echo "✓ Known chunks are linked instead of rewritten!"
+else
+    echo "✗ Chunk index dedup failed (links=$LINKS)"
+    exit 1
+fi
+
+if python src/cli.py verify "$SNAP_IDX2" 2>&1 | grep -q "passed"; then
+    echo "✓ Deduplicated snapshot verifies!"
+else
+    echo "✗ Deduplicated snapshot failed verification!"
+    exit 1
+fi
+rm -rf dataset_idx
+echo ""
+
+echo "Test 18: Sparse Files and Zero Chunks"
+echo "-------------------------------------"
+rm -rf store dataset_sparse restored_sparse
+mkdir -p dataset_sparse restored_sparse
+# File 64MB chỉ có 1MB dữ liệu ở giữa, còn lại là hole
+truncate -s 64M dataset_sparse/disk.img
+dd if=/dev/urandom of=dataset_sparse/disk.img bs=1M count=1 seek=10 conv=notrunc 2>/dev/null
+# File preallocate toàn 0 (không phải hole)
+dd if=/dev/zero of=dataset_sparse/zeros.bin bs=1M count=4 2>/dev/null
+
+python src/cli.py backup dataset_sparse --label "sparse" > /dev/null
+SNAP_SPARSE=$(ls -t store | grep -v ".log" | head -1)
+
+CHUNK_COUNT=$(ls store/$SNAP_SPARSE/chunks | wc -l)
+if [ "$CHUNK_COUNT" -eq 1 ]; then
+    echo "✓ Zero chunks are not stored!"
+else
+    echo "✗ Expected 1 stored chunk, got $CHUNK_COUNT"
+    exit 1
+fi
+
+python src/cli.py restore "$SNAP_SPARSE" restored_sparse > /dev/null
+USED_KB=$(du -k restored_sparse/disk.img | cut -f1)
+if cmp -s dataset_sparse/disk.img restored_sparse/disk.img && \
+   cmp -s dataset_sparse/zeros.bin restored_sparse/zeros.bin && [ "$USED_KB" -lt 8192 ]; then
+    echo "✓ Sparse file restored with holes (${USED_KB}KB on disk)!"
+else
+    echo "✗ Sparse restore mismatch or holes not recreated (${USED_KB}KB on disk)"
+    exit 1
+fi
+rm -rf dataset_sparse restored_sparse
+echo ""
+
+echo "Test 19: Snapshot Diff"
+echo "----------------------"
+rm -rf store dataset_diff
+mkdir -p dataset_diff/sub
+echo "unchanged" > dataset_diff/keep.txt
+echo "to be removed" > dataset_diff/gone.txt
+dd if=/dev/urandom of=dataset_diff/sub/big.bin bs=1M count=3 2>/dev/null
+dd if=/dev/urandom of=dataset_diff/shrink.bin bs=1M count=2 2>/dev/null
+
+python src/cli.py backup dataset_diff --label "diff1" > /dev/null
+SNAP_D1=$(ls -t store | grep -v ".log" | head -1)
+sleep 0.01
+
+rm dataset_diff/gone.txt
+echo "new file" > dataset_diff/sub/added.txt
+# Sửa đúng chunk thứ 2 của file 3MB
+dd if=/dev/urandom of=dataset_diff/sub/big.bin bs=1M count=1 seek=1 conv=notrunc 2>/dev/null
+# Cắt nửa sau của file 2MB: chunk còn lại không đổi, phần đuôi bị cắt vẫn tính là thay đổi
+truncate -s 1M dataset_diff/shrink.bin
+python src/cli.py backup dataset_diff --label "diff2" > /dev/null
+SNAP_D2=$(ls -t store | grep -v ".log" | head -1)
+
+DIFF_OUT=$(python src/cli.py diff "$SNAP_D1" "$SNAP_D2" --ranges)
+if echo "$DIFF_OUT" | grep -q "^A sub/added.txt" && \
+   echo "$DIFF_OUT" | grep -q "^D gone.txt" && \
+   echo "$DIFF_OUT" | grep -q "^M sub/big.bin (3145728 -> 3145728 bytes, 1048576 bytes changed)" && \
+   echo "$DIFF_OUT" | grep -q "\[1048576, 2097152)" && \
+   echo "$DIFF_OUT" | grep -q "^M shrink.bin (2097152 -> 1048576 bytes, 1048576 bytes changed, 1048576 bytes truncated)" && \
+   echo "$DIFF_OUT" | grep -q "^Modified: 2 file(s), 2097152 bytes changed (1048576 bytes truncated)" && \
+   ! echo "$DIFF_OUT" | grep -q "keep.txt"; then
+    echo "✓ Diff reports added, removed and modified files!"
+else
+    echo "✗ Diff output incorrect:"
+    echo "$DIFF_OUT"
+    exit 1
+fi
+rm -rf dataset_diff
+echo ""
+
+echo "Test 20: Export / Import Archive"
+echo "--------------------------------"
+rm -rf store dataset_arc restored_arc /tmp/labcli_test.arc
+mkdir -p dataset_arc/sub restored_arc
+dd if=/dev/urandom of=dataset_arc/data.bin bs=1M count=3 2>/dev/null
+echo "small file" > dataset_arc/sub/small.txt
+
+python src/cli.py backup dataset_arc --label "arc" > /dev/null
+SNAP_ARC=$(ls -t store | grep -v ".log" | head -1)
+python src/cli.py export "$SNAP_ARC" > /tmp/labcli_test.arc 2>/dev/null
+
+# Import vào một store mới
+rm -rf store
+if python src/cli.py import < /tmp/labcli_test.arc 2>&1 | grep -q "Import completed" && \
+   python src/cli.py restore "$SNAP_ARC" restored_arc > /dev/null && \
+   diff -r dataset_arc restored_arc > /dev/null; then
+    echo "✓ Snapshot moved between stores through a single archive!"
+else
+    echo "✗ Export/import round trip failed!"
+    exit 1
+fi
+
+# Manifest trong archive không được tin: snapshot_id/path độc hại phải bị từ chối
+# (Merkle root chỉ phủ chunk nên sửa các trường này không làm root sai)
+tamper_archive() {
+    python - "$1" "$2" <<'PYEOF'
+import sys, json
+sys.path.insert(0, "src")
+from core.archive import ARCHIVE_MAGIC, RECORD_HEADER
+field, value = sys.argv[1], sys.argv[2]
+data = open("/tmp/labcli_test.arc", "rb").read()
+rec_type, length = RECORD_HEADER.unpack_from(data, len(ARCHIVE_MAGIC))
+start = len(ARCHIVE_MAGIC) + RECORD_HEADER.size
+manifest = json.loads(data[start:start + length])
+if field == "snapshot_id":
+    manifest["snapshot_id"] = value
+else:
+    manifest["files"][0]["path"] = value
+body = json.dumps(manifest).encode()
+with open("/tmp/labcli_evil.arc", "wb") as f:
+    f.write(ARCHIVE_MAGIC + RECORD_HEADER.pack(rec_type, len(body)) + body + data[start + length:])
+PYEOF
+}
+rm -rf store
+tamper_archive snapshot_id "1_x/../../../evil"
+IMPORT_ID=$(python src/cli.py import /tmp/labcli_evil.arc 2>&1 || true)
+tamper_archive path "../../evil.bin"
+IMPORT_PATH=$(python src/cli.py import /tmp/labcli_evil.arc 2>&1 || true)
+if echo "$IMPORT_ID" | grep -q "bad snapshot id" && echo "$IMPORT_PATH" | grep -q "Unsafe file path" \
+    && [ -z "$(ls store | grep -v ".log")" ]; then
+    echo "✓ Archive with unsafe snapshot id or file path rejected!"
+else
+    echo "✗ Unsafe archive manifest was accepted!"
+    echo "$IMPORT_ID"
+    echo "$IMPORT_PATH"
+    exit 1
+fi
+rm -f /tmp/labcli_evil.arc
+
+# Restore không ghi ra ngoài thư mục đích kể cả khi manifest trong store bị sửa
+rm -rf store restored_arc && mkdir -p restored_arc
+python src/cli.py import /tmp/labcli_test.arc > /dev/null 2>&1
+sed -i 's#"path": "sub/small.txt"#"path": "../escaped.txt"#' "store/$SNAP_ARC/manifest.json"
+RESTORE_OUT=$(python src/cli.py restore "$SNAP_ARC" restored_arc 2>&1 || true)
+if echo "$RESTORE_OUT" | grep -q "Unsafe path in snapshot" && [ ! -e escaped.txt ]; then
+    echo "✓ Restore refuses paths outside the target directory!"
+else
+    echo "✗ Restore wrote outside the target directory!"
+    echo "$RESTORE_OUT"
+    exit 1
+fi
+
+# Archive bị sửa 1 byte trong vùng dữ liệu chunk -> import phải từ chối
+rm -rf store
+printf '\xff' | dd of=/tmp/labcli_test.arc bs=1 seek=4000 count=1 conv=notrunc 2>/dev/null
+if python src/cli.py import /tmp/labcli_test.arc 2>&1 | grep -qE "Corrupted|Invalid"; then
+    echo "✓ Corrupted archive rejected!"
+else
+    echo "✗ Corrupted archive was imported!"
+    exit 1
+fi
+rm -rf dataset_arc restored_arc /tmp/labcli_test.arc
+echo ""
+
+echo "Test 21: Read Files Directly from a Snapshot"
+echo "--------------------------------------------"
+rm -rf store dataset_read
+mkdir -p dataset_read/logs
+dd if=/dev/urandom of=dataset_read/logs/app.log bs=1M count=3 2>/dev/null
+echo "needle" > dataset_read/logs/small.txt
+# Chunk toàn 0 (đầu và đuôi lẻ) xen giữa chunk dữ liệu
+truncate -s 3500000 dataset_read/logs/sparse.img
+dd if=/dev/urandom of=dataset_read/logs/sparse.img bs=1M count=1 seek=1 conv=notrunc 2>/dev/null
+
+python src/cli.py backup dataset_read --label "read" > /dev/null
+SNAP_READ=$(ls -t store | grep -v ".log" | head -1)
+
+LS_OUT=$(python src/cli.py ls "$SNAP_READ" logs/)
+if echo "$LS_OUT" | grep -q "3145728  logs/app.log" && \
+   python src/cli.py cat "$SNAP_READ" logs/app.log 2>/dev/null | cmp -s - dataset_read/logs/app.log && \
+   python src/cli.py cat "$SNAP_READ" logs/sparse.img 2>/dev/null | cmp -s - dataset_read/logs/sparse.img && \
+   python src/cli.py cat "$SNAP_READ" logs/small.txt 2>/dev/null | grep -q "needle"; then
+    echo "✓ ls/cat read files without restoring!"
+else
+    echo "✗ ls/cat output incorrect!"
+    exit 1
+fi
+rm -rf dataset_read
+echo ""
+
+echo "Test 22: Streaming Backup from stdin"
+echo "------------------------------------"
+rm -rf store /tmp/labcli_dump.sql
+head -c 3500000 /dev/urandom > /tmp/labcli_dump.sql
+
+cat /tmp/labcli_dump.sql | python src/cli.py backup - --label "stream" --name db/dump.sql > /dev/null
+SNAP_STREAM=$(ls -t store | grep -v ".log" | head -1)
+
+LS_OUT=$(python src/cli.py ls "$SNAP_STREAM")
+if echo "$LS_OUT" | grep -q "3500000  db/dump.sql" && \
+   python src/cli.py restore "$SNAP_STREAM" - 2>/dev/null | cmp -s - /tmp/labcli_dump.sql; then
+    echo "✓ Stream backed up and restored to stdout!"
+else
+    echo "✗ Streaming backup/restore failed!"
+    exit 1
+fi
+
+# --name có ".." sẽ khiến restore ghi ra ngoài thư mục đích -> bị từ chối
+NAME_OUT=$(echo "data" | python src/cli.py backup - --label "evil" --name ../../etc/x 2>&1 || true)
+if echo "$NAME_OUT" | grep -q "Unsafe file path" && ! grep -q "evil" store/wal.log; then
+    echo "✓ Unsafe --name rejected!"
+else
+    echo "✗ Unsafe --name was accepted!"
+    echo "$NAME_OUT"
+    exit 1
+fi
+rm -f /tmp/labcli_dump.sql
+echo ""
+
+echo "Test 23: Object Store Backend over HTTP"
+echo "---------------------------------------"
+rm -rf store dataset_s3 restored_s3 /tmp/labcli_objects
+mkdir -p dataset_s3/sub
+head -c 2500000 /dev/urandom > dataset_s3/blob.bin
+echo "remote" > dataset_s3/sub/note.txt
+OBJ_PORT=$((20000 + RANDOM % 20000))
+python src/storage/server.py --root /tmp/labcli_objects --port $OBJ_PORT > /dev/null 2>&1 &
+OBJ_PID=$!
+sleep 1
+STORE_URL="http://127.0.0.1:$OBJ_PORT/labcli/test"
+
+python src/cli.py --store-url "$STORE_URL" backup dataset_s3 --label "remote" > /dev/null
+SNAP_S3=$(ls /tmp/labcli_objects/labcli/test | head -1)
+
+if [ -n "$SNAP_S3" ] && [ -f "/tmp/labcli_objects/labcli/test/$SNAP_S3/manifest.json" ] && \
+   python src/cli.py --store-url "$STORE_URL" restore "$SNAP_S3" restored_s3 > /dev/null && \
+   diff -r dataset_s3 restored_s3 > /dev/null; then
+    echo "✓ Snapshot stored in and restored from the object store!"
+else
+    echo "✗ Object store backup/restore failed!"
+    kill $OBJ_PID
+    exit 1
+fi
+
+rm -f /tmp/labcli_objects/labcli/test/$SNAP_S3/chunks/*.chunk
+VERIFY_S3=$(python src/cli.py --store-url "$STORE_URL" verify "$SNAP_S3")
+if echo "$VERIFY_S3" | grep -q "Missing chunks"; then
+    echo "✓ Missing remote chunks detected!"
+else
+    echo "✗ Missing remote chunks not detected!"
+    kill $OBJ_PID
+    exit 1
+fi
+
+# Chỉ mục chunk của object store tách khỏi chỉ mục cục bộ
+if ! ls store/.chunk_index/seg-*.idx > /dev/null 2>&1 && \
+   ls store/.chunk_index/remote-*/seg-*.idx > /dev/null 2>&1; then
+    echo "✓ Remote snapshots are indexed separately from the local chunk index!"
+else
+    echo "✗ Remote snapshots leaked into the local chunk index!"
+    kill $OBJ_PID
+    exit 1
+fi
+
+# Upload dở của backup bị kill (không có COMMIT trong WAL) bị cleanup xoá trên object store
+mkdir -p /tmp/labcli_objects/labcli/test/1_orphan/chunks
+echo "partial" > /tmp/labcli_objects/labcli/test/1_orphan/chunks/abc.chunk
+CLEANUP_S3=$(python src/cli.py --store-url "$STORE_URL" cleanup)
+if echo "$CLEANUP_S3" | grep -q "orphaned upload: 1_orphan" && \
+   [ ! -e /tmp/labcli_objects/labcli/test/1_orphan/chunks/abc.chunk ] && \
+   [ -f "/tmp/labcli_objects/labcli/test/$SNAP_S3/manifest.json" ]; then
+    echo "✓ Orphaned remote upload cleaned up!"
+else
+    echo "✗ Orphaned remote upload not cleaned up!"
+    kill $OBJ_PID
+    exit 1
+fi
+kill $OBJ_PID
+rm -rf dataset_s3 restored_s3 /tmp/labcli_objects
+echo ""
+
+echo "Test 24: Selectable Hash Suites"
+echo "-------------------------------"
+rm -rf store dataset_hash restored_hash
+mkdir -p dataset_hash
+head -c 2500000 /dev/urandom > dataset_hash/data.bin
+echo "hash suite" > dataset_hash/note.txt
+
+python src/cli.py backup dataset_hash --label "legacy" > /dev/null
+python src/cli.py backup dataset_hash --label "blake" --hash blake2b-256-raw > /dev/null
+SNAP_HASH=$(ls -t store | grep -v ".log" | head -1)
+
+if grep -q '"hash_suite": "blake2b-256-raw"' "store/$SNAP_HASH/manifest.json" && \
+   tail -1 store/roots.log | grep -q "blake2b-256-raw$" && \
+   python src/cli.py restore "$SNAP_HASH" restored_hash > /dev/null && \
+   diff -r dataset_hash restored_hash > /dev/null; then
+    echo "✓ Snapshot hashed with blake2b-256-raw verifies and restores!"
+else
+    echo "✗ Hash suite backup/restore failed!"
+    exit 1
+fi
+
+# Khác suite -> hash chunk không so được: diff cảnh báo và chỉ so kích thước
+SNAP_LEGACY=$(ls store | grep "_legacy$")
+DIFF_HASH=$(python src/cli.py diff "$SNAP_LEGACY" "$SNAP_HASH")
+if echo "$DIFF_HASH" | grep -q "different hash suites (sha256-hex vs blake2b-256-raw)" && \
+   echo "$DIFF_HASH" | grep -q "^Modified: 0 file(s)"; then
+    echo "✓ Diff across hash suites compares sizes only!"
+else
+    echo "✗ Diff across hash suites reported false changes!"
+    echo "$DIFF_HASH"
+    exit 1
+fi
+
+# Hạ cấp suite trong manifest -> verify phải từ chối
+sed -i 's/"hash_suite": "blake2b-256-raw"/"hash_suite": "sha256-hex"/' "store/$SNAP_HASH/manifest.json"
+if python src/cli.py verify "$SNAP_HASH" | grep -q "Verification passed"; then
+    echo "✗ Hash suite downgrade not detected!"
+    exit 1
+else
+    echo "✓ Hash suite downgrade detected!"
+fi
+rm -rf dataset_hash restored_hash
+echo ""
+
+echo "Test 25: Checkpointed Audit Verification"
+echo "----------------------------------------"
+rm -rf store dataset_audit
+mkdir -p dataset_audit
+echo "audit" > dataset_audit/a.txt
+python src/cli.py backup dataset_audit --label "audit1" > /dev/null
+python src/cli.py audit-verify > /dev/null
+python src/cli.py backup dataset_audit --label "audit2" > /dev/null
+
+AUDIT_OUT=$(python src/cli.py audit-verify)
+if echo "$AUDIT_OUT" | grep -q "Resumed from checkpoint" && echo "$AUDIT_OUT" | grep -q "Audit log valid"; then
+    echo "✓ audit-verify resumes from the last checkpoint!"
+else
+    echo "✗ audit-verify did not resume from checkpoint!"
+    exit 1
+fi
+
+# Dòng giả được append sau khi audit-verify đã lấy kích thước log (giữa pha song song và pha chain)
+# vẫn phải được tính lại hash, không được ghi vào checkpoint như đã verify
+AUDIT_RACE=$(python - <<'PYEOF'
+import sys
+sys.path.insert(0, "src")
+import security.audit as audit
+from cli import audit_verify_command
+
+original = audit.split_ranges
+
+def split_then_append(path, start, end, parts):
+    ranges = original(path, start, end, parts)
+    with open(path, "rb") as f:
+        last = f.read().splitlines()[-1].decode().split()
+    with open(path, "a") as f:
+        f.write(" ".join(["f" * 64, last[0]] + last[2:]) + "\n")
+    return ranges
+
+audit.split_ranges = split_then_append
+audit_verify_command("store/audit.log", full=True, jobs=2)
+PYEOF
+)
+if echo "$AUDIT_RACE" | grep -q "Hash mismatch"; then
+    echo "✓ Entries appended during a parallel audit-verify are fully checked!"
+else
+    echo "✗ Forged entry appended during audit-verify was accepted!"
+    echo "$AUDIT_RACE"
+    exit 1
+fi
+
+# Sửa entry đầu tiên (nằm trước checkpoint) -> chỉ --full phát hiện
+sed -i '1s/^./X/' store/audit.log
+AUDIT_FULL=$(python src/cli.py audit-verify --full --jobs 2)
+if echo "$AUDIT_FULL" | grep -q "AUDIT CORRUPTED"; then
+    echo "✓ --full re-verifies from genesis!"
+else
+    echo "✗ --full missed tampering before the checkpoint!"
+    exit 1
+fi
+rm -rf dataset_audit
+echo ""
+
+echo "Test 26: Store-wide Scrub"
+echo "------------------------"
+rm -rf store dataset_scrub
+mkdir -p dataset_scrub
+for i in 1 2 3; do head -c 1500000 /dev/urandom > dataset_scrub/part$i.bin; done
+python src/cli.py backup dataset_scrub --label "scrub1" > /dev/null
+echo "extra" > dataset_scrub/extra.txt
+python src/cli.py backup dataset_scrub --label "scrub2" > /dev/null
+SNAP_SCRUB=$(ls -t store | grep -v ".log" | head -1)
+
+SCRUB_OUT=$(python src/cli.py scrub)
+if echo "$SCRUB_OUT" | grep -q "7 unique chunk(s)" && echo "$SCRUB_OUT" | grep -q "No bad chunks found" && \
+   ! echo "$SCRUB_OUT" | grep -q "^I/O:"; then
+    echo "✓ Shared chunks scrubbed once across snapshots!"
+else
+    echo "✗ Scrub of clean store failed!"
+    echo "$SCRUB_OUT"
+    exit 1
+fi
+
+# Hỏng chunk của part2.bin (dùng chung bởi cả hai snapshot qua hard link)
+BAD_CHUNK=$(python -c "import json; print([f for f in json.load(open('store/$SNAP_SCRUB/manifest.json'))['files'] if f['path'] == 'part2.bin'][0]['chunks'][0])")
+printf 'X' | dd of="store/$SNAP_SCRUB/chunks/$BAD_CHUNK.chunk" bs=1 seek=100 conv=notrunc 2> /dev/null
+SCRUB_OUT=$(python src/cli.py scrub --rate 100)
+if echo "$SCRUB_OUT" | grep -q "$BAD_CHUNK (corrupted)" && echo "$SCRUB_OUT" | grep -q "^I/O:" && \
+   [ "$(echo "$SCRUB_OUT" | grep -c ": part2.bin")" -eq 2 ]; then
+    echo "✓ Bad chunk reported with affected snapshots and files!"
+else
+    echo "✗ Scrub did not report the corrupted chunk!"
+    echo "$SCRUB_OUT"
+    exit 1
+fi
+
+# Scrub khác đang giữ khoá job -> lần chạy thứ hai bị từ chối
+python -c "
+import sys, time
+sys.path.insert(0, 'src')
+from core.lock import StoreLock
+fd = StoreLock('store').acquire_job('scrub')
+open('store/.jobs/held', 'w').close()
+time.sleep(30)
+" &
+HOLDER_PID=$!
+for i in $(seq 50); do [ -f store/.jobs/held ] && break; sleep 0.1; done
+SCRUB_OUT=$(python src/cli.py scrub)
+kill $HOLDER_PID
+if echo "$SCRUB_OUT" | grep -q "Job scrub is already running"; then
+    echo "✓ Concurrent scrub rejected by the job lock!"
+else
+    echo "✗ Concurrent scrub not rejected!"
+    echo "$SCRUB_OUT"
+    exit 1
+fi
+
+# Resume dùng lại kế hoạch đã lưu (không lập lại plan khi tập snapshot không đổi)
+python src/cli.py scrub --restart --time-limit 0 > /dev/null
+SCRUB_OUT=$(python -c "
+import sys
+sys.path.insert(0, 'src')
+import core.scrub
+s = sys.modules['core.scrub']
+def fail(*args):
+    raise RuntimeError('plan rebuilt')
+s._build_plan = fail
+s.scrub('store')
+")
+if [ -f store/.scrub/plan.json ] && echo "$SCRUB_OUT" | grep -q "Resuming scrub" && \
+   echo "$SCRUB_OUT" | grep -q "7 unique chunk(s)"; then
+    echo "✓ Resumed scrub reuses the saved plan!"
+else
+    echo "✗ Resumed scrub did not reuse the saved plan!"
+    echo "$SCRUB_OUT"
+    exit 1
+fi
+rm -rf dataset_scrub
+echo ""
+
+echo "Test 27: Delta Compression of Similar Chunks"
+echo "----------------------------------------------"
+rm -rf store dataset_delta restored_delta
+mkdir -p dataset_delta
+head -c 3145728 /dev/urandom > dataset_delta/pages.db
+python src/cli.py backup dataset_delta --label "delta1" --delta > /dev/null
+# Sửa tại chỗ 8 byte đầu mỗi page 8 KiB (như counter của page database)
+python -c "
+import os
+d = bytearray(open('dataset_delta/pages.db', 'rb').read())
+for i in range(0, len(d), 8192):
+    d[i:i + 8] = os.urandom(8)
+open('dataset_delta/pages.db', 'wb').write(d)
+"
+DELTA_OUT=$(python src/cli.py backup dataset_delta --label "delta2" --delta)
+SNAP_DELTA=$(ls -t store | grep -v ".log" | head -1)
+if echo "$DELTA_OUT" | grep -q "Delta chunks: 3" && \
+   [ "$(ls store/$SNAP_DELTA/chunks | grep -c '.delta$')" -eq 3 ]; then
+    echo "✓ Near-duplicate chunks stored as deltas!"
+else
+    echo "✗ Similar chunks were not delta-compressed!"
+    echo "$DELTA_OUT"
+    exit 1
+fi
+
+python src/cli.py restore "$SNAP_DELTA" restored_delta > /dev/null
+SCRUB_OUT=$(python src/cli.py scrub --restart)
+if cmp -s dataset_delta/pages.db restored_delta/pages.db && echo "$SCRUB_OUT" | grep -q "No bad chunks found"; then
+    echo "✓ Delta snapshot verifies, restores and scrubs!"
+else
+    echo "✗ Delta snapshot restore/scrub failed!"
+    echo "$SCRUB_OUT"
+    exit 1
+fi
+
+# Base biến mất giữa chừng (snapshot nguồn bị purge) -> không để lại delta mất base ở đích,
+# kể cả khi đích đã có sẵn file delta từ lần link dở trước đó
+LINK_OUT=$(python -c "
+import os, sys, shutil
+sys.path.insert(0, 'src')
+from storage.local import link_chunk_chain
+shutil.rmtree('/tmp/labcli_link', ignore_errors=True)
+src, dst = '/tmp/labcli_link/src/s/chunks', '/tmp/labcli_link/dst/s/chunks'
+shutil.copytree('store/$SNAP_DELTA/chunks', src)
+os.makedirs(dst)
+name = sorted(n for n in os.listdir(src) if n.endswith('.delta'))[0]
+base = open(os.path.join(src, name), 'rb').read()[8:40].hex()
+os.remove(os.path.join(src, base + '.chunk'))
+first = link_chunk_chain(src, dst, name[:-6])
+shutil.copy(os.path.join(src, name), os.path.join(dst, name))
+second = link_chunk_chain(src, dst, name[:-6])
+print(first, second, len(os.listdir(dst)))
+")
+rm -rf /tmp/labcli_link
+if [ "$LINK_OUT" = "False False 0" ]; then
+    echo "✓ Failed chain link leaves no delta without its base!"
+else
+    echo "✗ Delta left behind without its base ($LINK_OUT)"
+    exit 1
+fi
+
+# Hỏng base -> chunk delta phụ thuộc vào nó cũng bị phát hiện
+DELTA_CHUNK=$(ls store/$SNAP_DELTA/chunks | grep '.delta$' | head -1)
+BASE_CHUNK=$(python -c "print(open('store/$SNAP_DELTA/chunks/$DELTA_CHUNK', 'rb').read()[8:40].hex())")
+printf 'X' | dd of="store/$SNAP_DELTA/chunks/$BASE_CHUNK.chunk" bs=1 seek=100 conv=notrunc 2> /dev/null
+VERIFY_OUT=$(python src/cli.py verify "$SNAP_DELTA")
+if echo "$VERIFY_OUT" | grep -q "${DELTA_CHUNK%.delta}"; then
+    echo "✓ Corrupted delta base detected!"
+else
+    echo "✗ Corrupted delta base not detected!"
+    echo "$VERIFY_OUT"
+    exit 1
+fi
+rm -rf dataset_delta restored_delta
+echo ""
+
+echo "Test 28: Whole-file Dedup Fast Path"
+echo "-----------------------------------"
+rm -rf store dataset_files restored_files
+mkdir -p dataset_files/vendor_a dataset_files/vendor_b
+head -c 2500000 /dev/urandom > dataset_files/vendor_a/lib.bin
+ln dataset_files/vendor_a/lib.bin dataset_files/vendor_b/lib.bin
+head -c 1500000 /dev/urandom > dataset_files/data.bin
+# File vừa ghi (mtime/ctime trong khoảng racy) không được ghi nhận vào chỉ mục
+sleep 3
+FILES_OUT=$(python src/cli.py backup dataset_files --label "files1")
+if echo "$FILES_OUT" | grep -q "Files reused from file index: 1"; then
+    echo "✓ Hard-linked copy at another path reused its chunk list!"
+else
+    echo "✗ Hard-linked copy was hashed again!"
+    echo "$FILES_OUT"
+    exit 1
+fi
+
+# Lần chạy sau: file không đổi dùng lại chỉ mục, file bị sửa đi đường thường
+printf 'changed' | dd of=dataset_files/data.bin bs=1 seek=700000 conv=notrunc 2> /dev/null
+FILES_OUT=$(python src/cli.py backup dataset_files --label "files2")
+SNAP_FILES=$(ls -t store | grep -v ".log" | head -1)
+python src/cli.py restore "$SNAP_FILES" restored_files > /dev/null
+if echo "$FILES_OUT" | grep -q "Files reused from file index: 2" && diff -r dataset_files restored_files > /dev/null; then
+    echo "✓ Unchanged files reused across runs, modified file re-read!"
+else
+    echo "✗ File index reused stale or wrong chunks!"
+    echo "$FILES_OUT"
+    exit 1
+fi
+
+# File bị ghi (cùng kích thước) vào vùng đã đọc trong lúc backup -> không ghi nhận,
+# lần backup sau phải đọc lại file
+rm -rf store dataset_race restored_race
+mkdir -p dataset_race
+head -c 2500000 /dev/urandom > dataset_race/race.bin
+sleep 3
+python -c "
+import sys
+sys.path.insert(0, 'src')
+import core.backup
+b = sys.modules['core.backup']
+read_chunks = b.read_sparse_chunks
+def racing(path, chunk_size):
+    for i, item in enumerate(read_chunks(path, chunk_size)):
+        yield item
+        if i == 0:
+            with open(path, 'r+b') as f:
+                f.write(b'raced!!')
+b.read_sparse_chunks = racing
+b.backup('dataset_race', 'store', 'race1')
+" > /dev/null
+RACE_ENTRIES=$(ls store/.file_index 2> /dev/null | grep -c ".json$" || true)
+RACE_OUT=$(python src/cli.py backup dataset_race --label "race2")
+SNAP_RACE=$(ls -t store | grep -v ".log" | head -1)
+python src/cli.py restore "$SNAP_RACE" restored_race > /dev/null
+if [ "$RACE_ENTRIES" -eq 0 ] && ! echo "$RACE_OUT" | grep -q "Files reused from file index" && \
+   cmp -s dataset_race/race.bin restored_race/race.bin; then
+    echo "✓ File modified during backup is not recorded and is re-read next time!"
+else
+    echo "✗ File index recorded a file modified during backup (entries=$RACE_ENTRIES)!"
+    echo "$RACE_OUT"
+    exit 1
+fi
+
+# File vừa sửa (trong khoảng racy) không được ghi nhận
+printf 'again' | dd of=dataset_race/race.bin bs=1 seek=2000000 conv=notrunc 2> /dev/null
+python src/cli.py backup dataset_race --label "race3" > /dev/null
+if [ "$(ls store/.file_index 2> /dev/null | grep -c ".json$" || true)" -eq 0 ]; then
+    echo "✓ Racily modified file is not recorded in the file index!"
+else
+    echo "✗ Racily modified file was recorded in the file index!"
+    exit 1
+fi
+rm -rf dataset_files restored_files dataset_race restored_race
+echo ""
+
+echo "Test 29: I/O Throttling"
+echo "-----------------------"
+rm -rf store dataset_io restored_io
+mkdir -p dataset_io
+head -c 3145728 /dev/urandom > dataset_io/data.bin
+# 3 MiB đọc nguồn + 3 MiB ghi store ở 4 MiB/s -> tối thiểu ~1.5 giây
+IO_START=$(date +%s%N)
+IO_OUT=$(python src/cli.py backup dataset_io --label "io1" --io-rate 4 --io-adaptive)
+IO_MS=$(( ($(date +%s%N) - IO_START) / 1000000 ))
+if echo "$IO_OUT" | grep -q "(limit 4 MiB/s)" && [ "$IO_MS" -ge 1300 ]; then
+    echo "✓ Backup throttled to the configured rate (${IO_MS} ms)!"
+else
+    echo "✗ Backup was not throttled (${IO_MS} ms)!"
+    echo "$IO_OUT"
+    exit 1
+fi
+
+SNAP_IO=$(ls -t store | grep -v ".log" | head -1)
+IO_OUT=$(python src/cli.py restore "$SNAP_IO" restored_io --io-iops 50 --io-idle)
+if echo "$IO_OUT" | grep -q "IOPS (limit 50)" && cmp -s dataset_io/data.bin restored_io/data.bin; then
+    echo "✓ Restore reports throughput against the IOPS limit!"
+else
+    echo "✗ Throttled restore failed!"
+    echo "$IO_OUT"
+    exit 1
+fi
+rm -rf dataset_io restored_io
+echo ""
+
+echo "Test 30: Hot/Cold Tiering"
+echo "-------------------------"
+rm -rf store dataset_tier restored_tier cold_tier
+mkdir -p dataset_tier
+head -c 2097152 /dev/urandom > dataset_tier/a.bin
+cp dataset_tier/a.bin a_v1.bin
+python src/cli.py backup dataset_tier --label "tier1" > /dev/null
+SNAP_T1=$(ls -t store | grep -v ".log" | head -1)
+sleep 1
+head -c 2097152 /dev/urandom > dataset_tier/a.bin
+python src/cli.py backup dataset_tier --label "tier2" > /dev/null
+SNAP_T2=$(ls -t store | grep -v ".log" | head -1)
+
+# Snapshot cũ không được snapshot mới nhất tham chiếu -> chunk chuyển sang tier lạnh
+TIER_OUT=$(python src/cli.py tier --cold-dir cold_tier --keep-recent 1)
+python src/cli.py cat "$SNAP_T1" a.bin > a_cold.bin 2>/dev/null
+if echo "$TIER_OUT" | grep -q "Moved to cold tier: 2 chunk(s)" \
+    && [ -z "$(ls store/$SNAP_T1/chunks)" ] && cmp -s a_v1.bin a_cold.bin; then
+    echo "✓ Old snapshot chunks moved to the cold tier and still readable!"
+else
+    echo "✗ Demotion to the cold tier failed!"
+    echo "$TIER_OUT"
+    exit 1
+fi
+
+# Verify/restore đọc chunk ở tier lạnh và được ghi vào thống kê truy cập
+python src/cli.py tier --keep-recent 0 > /dev/null
+python src/cli.py verify "$SNAP_T2" > /dev/null
+RESTORE_OUT=$(python src/cli.py restore "$SNAP_T2" restored_tier)
+if echo "$RESTORE_OUT" | grep -q "Restore completed" && cmp -s dataset_tier/a.bin restored_tier/a.bin; then
+    echo "✓ Restore reads chunks from the cold tier!"
+else
+    echo "✗ Restore from the cold tier failed!"
+    echo "$RESTORE_OUT"
+    exit 1
+fi
+
+# Snapshot đọc nhiều -> chunk được đưa lại tier nóng
+TIER_OUT=$(python src/cli.py tier --keep-recent 0)
+if echo "$TIER_OUT" | grep -q "Promoted to hot tier: 2 chunk(s)" \
+    && [ "$(ls store/$SNAP_T2/chunks | wc -l)" -eq 2 ] && [ -z "$(ls store/$SNAP_T1/chunks)" ]; then
+    echo "✓ Frequently restored snapshot promoted back to the hot tier!"
+else
+    echo "✗ Promotion to the hot tier failed!"
+    echo "$TIER_OUT"
+    exit 1
+fi
+rm -rf dataset_tier restored_tier cold_tier a_v1.bin a_cold.bin
+echo ""
+
+echo "Test 31: Retention and Batch Pruning"
+echo "-------------------------------------"
+rm -rf store dataset_ret restored_ret
+mkdir -p dataset_ret
+head -c 2097152 /dev/urandom > dataset_ret/a.bin
+head -c 1048576 /dev/urandom > dataset_ret/b.bin
+python src/cli.py backup dataset_ret --label "ret1" > /dev/null
+head -c 1048576 /dev/urandom > dataset_ret/b.bin
+python src/cli.py backup dataset_ret --label "ret2" > /dev/null
+head -c 1048576 /dev/urandom > dataset_ret/b.bin
+python src/cli.py backup dataset_ret --label "ret3" > /dev/null
+SNAP_R3=$(grep "^COMMIT" store/wal.log | tail -1 | cut -d' ' -f2)
+
+# Xoá snapshot chỉ dành cho admin (policy.yaml: alice)
+# Dry run: a.bin dùng chung với snapshot còn lại -> chỉ b.bin cũ (2 MiB) + manifest được giải phóng
+PRUNE_OUT=$(SUDO_USER=alice python src/cli.py purge --keep-last 1 --dry-run)
+RECLAIM=$(echo "$PRUNE_OUT" | grep -o "[0-9]* bytes reclaimable" | cut -d' ' -f1)
+if echo "$PRUNE_OUT" | grep -q "2 snapshot(s) would be deleted" && [ "${RECLAIM:-0}" -ge 2097152 ] \
+    && [ "${RECLAIM:-0}" -lt 3145728 ] && [ "$(grep -c "^COMMIT" store/wal.log)" -eq 3 ]; then
+    echo "✓ Dry run reports reclaimable bytes without deleting!"
+else
+    echo "✗ Retention dry run failed!"
+    echo "$PRUNE_OUT"
+    exit 1
+fi
+
+PRUNE_OUT=$(SUDO_USER=alice python src/cli.py purge --keep-last 1)
+RESTORE_OUT=$(python src/cli.py restore "$SNAP_R3" restored_ret)
+if echo "$PRUNE_OUT" | grep -q "Pruned 2 snapshot(s)" && echo "$RESTORE_OUT" | grep -q "Restore completed" \
+    && diff -r dataset_ret restored_ret > /dev/null && [ "$(grep -c "^COMMIT" store/wal.log)" -eq 1 ] \
+    && [ "$(wc -l < store/roots.log)" -eq 1 ] && [ "$(ls store | grep -v ".log" | wc -l)" -eq 1 ]; then
+    echo "✓ Pruned old snapshots in one pass and compacted wal.log/roots.log!"
+else
+    echo "✗ Pruning failed!"
+    echo "$PRUNE_OUT"
+    echo "$RESTORE_OUT"
+    exit 1
+fi
+
+# Snapshot mới nhất được bảo vệ; backup sau khi compact vẫn verify được
+DELETE_OUT=$(SUDO_USER=alice python src/cli.py delete-snapshot "$SNAP_R3")
+python src/cli.py backup dataset_ret --label "ret4" > /dev/null
+SNAP_R4=$(grep "^COMMIT" store/wal.log | tail -1 | cut -d' ' -f2)
+VERIFY_OUT=$(python src/cli.py verify "$SNAP_R4")
+if echo "$DELETE_OUT" | grep -q "Cannot delete the latest snapshot" \
+    && echo "$VERIFY_OUT" | grep -q "Verification passed" \
+    && [ "$(tail -1 store/roots.log | cut -d' ' -f1)" -eq 4 ]; then
+    echo "✓ Latest snapshot protected and new backups verify after compaction!"
+else
+    echo "✗ Post-prune checks failed!"
+    echo "$DELETE_OUT"
+    exit 1
+fi
+rm -rf dataset_ret restored_ret
+echo ""
+
+echo "=========================================="
+echo "All Feature Tests Passed! ✓"
+echo "=========================================="
+rm -rf store